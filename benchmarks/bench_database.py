@@ -0,0 +1,72 @@
+"""
+Микробенчмарк: отдельное соединение на каждый запрос против долгоживущих соединений ConnectionManager.
+
+Запуск: python -m benchmarks.bench_database [число_запросов]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# config требует переменные окружения; для бенчмарка подойдут заглушки
+os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("WEBHOOK_URL", "http://localhost")
+
+import aiosqlite
+from services.database import ConnectionManager
+
+PROFILE_QUERY = "SELECT name, birth_date, birth_time FROM profiles WHERE chat_id = ?"
+
+
+async def prepare(path: str, rows: int) -> None:
+    async with aiosqlite.connect(path) as conn:
+        await conn.execute(
+            "CREATE TABLE profiles (chat_id INTEGER PRIMARY KEY, name TEXT, birth_date TEXT, birth_time TEXT)"
+        )
+        await conn.executemany(
+            "INSERT INTO profiles VALUES (?, ?, ?, ?)",
+            [(i, f"user{i}", "01.01.1990", "12:00") for i in range(rows)]
+        )
+        await conn.commit()
+
+
+async def per_call_connect(path: str, n: int, rows: int) -> float:
+    started = time.perf_counter()
+    for i in range(n):
+        async with aiosqlite.connect(path) as conn:
+            cursor = await conn.execute(PROFILE_QUERY, (i % rows,))
+            await cursor.fetchone()
+    return time.perf_counter() - started
+
+
+async def pooled(path: str, n: int, rows: int) -> float:
+    manager = ConnectionManager(path)
+    await manager.open()
+    try:
+        started = time.perf_counter()
+        for i in range(n):
+            async with manager.read() as conn:
+                cursor = await conn.execute(PROFILE_QUERY, (i % rows,))
+                await cursor.fetchone()
+        return time.perf_counter() - started
+    finally:
+        await manager.close()
+
+
+async def main(n: int) -> None:
+    rows = 10000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        await prepare(path, rows)
+        results = {
+            "connect на каждый запрос": await per_call_connect(path, n, rows),
+            "ConnectionManager": await pooled(path, n, rows),
+        }
+    for name, elapsed in results.items():
+        print(f"{name:<28} {elapsed * 1000 / n:8.3f} мс/запрос  ({n / elapsed:9.0f} запросов/с)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
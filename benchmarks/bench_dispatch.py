@@ -0,0 +1,94 @@
+"""
+Микробенчмарк: выбор обработчика цепочкой фильтров PTB против таблиц UpdateRouter.
+
+Для каждого числа маршрутов N регистрируются N кнопок и N префиксов callback_data.
+Цепочка проверяется так же, как в Application.process_update: по порядку до первого
+совпадения. Измеряется только выбор обработчика, без вызова самих обработчиков.
+
+Запуск: python -m benchmarks.bench_dispatch [число_повторов]
+"""
+import sys
+import time
+
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, MessageHandler, filters
+
+from utils.router import UpdateRouter
+
+
+async def noop(update, context) -> None:
+    pass
+
+
+def message_update(text: str) -> Update:
+    return Update.de_json({
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 0, "text": text,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "bench"},
+        },
+    }, None)
+
+
+def callback_update(data: str) -> Update:
+    return Update.de_json({
+        "update_id": 1,
+        "callback_query": {
+            "id": "1", "chat_instance": "1", "data": data,
+            "from": {"id": 1, "is_bot": False, "first_name": "bench"},
+        },
+    }, None)
+
+
+def build_chain(n: int) -> list:
+    handlers = [CallbackQueryHandler(noop, pattern=f"^route{i}_") for i in range(n)]
+    handlers += [MessageHandler(filters.Regex(f"^Кнопка {i}$"), noop) for i in range(n)]
+    handlers.append(MessageHandler(filters.TEXT & ~filters.COMMAND, noop))
+    return handlers
+
+
+def build_router(n: int) -> UpdateRouter:
+    router = UpdateRouter()
+    for i in range(n):
+        router.callback_query(f"route{i}_", noop)
+        router.button(f"Кнопка {i}", noop)
+    router.fallback(noop)
+    return router
+
+
+def chain_dispatch(handlers: list, update: Update):
+    for handler in handlers:
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            return handler
+    return None
+
+
+def measure(dispatch, updates: list, repeats: int) -> float:
+    """Возвращает среднее время выбора обработчика в микросекундах."""
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for update in updates:
+            dispatch(update)
+    return (time.perf_counter() - started) * 1e6 / (repeats * len(updates))
+
+
+def main(repeats: int) -> None:
+    print(f"{'маршрутов':>10} {'цепочка PTB, мкс':>18} {'UpdateRouter, мкс':>18}")
+    for n in (10, 50, 200, 1000):
+        # Последний маршрут — худший случай для цепочки; свободный текст проходит её целиком
+        updates = [
+            message_update(f"Кнопка {n - 1}"),
+            callback_update(f"route{n - 1}_data"),
+            message_update("свободный текст"),
+        ]
+        chain = build_chain(n)
+        router = build_router(n)
+        chain_time = measure(lambda update: chain_dispatch(chain, update), updates, max(1, repeats // n))
+        router_time = measure(router.check_update, updates, repeats)
+        print(f"{n:>10} {chain_time:>18.2f} {router_time:>18.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
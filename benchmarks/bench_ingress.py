@@ -0,0 +1,112 @@
+"""
+Микробенчмарк входящего webhook: прежний путь (request.json + de_json для всего)
+против WebhookIngress (секретный токен, orjson, отбор по словарю до de_json).
+
+Поток запросов: обычные сообщения и нажатия кнопок, повторные доставки,
+неподдерживаемые типы обновлений и запросы с неверным секретным токеном.
+Вместо aiohttp-запроса используется объект с тем же интерфейсом (headers, read, json),
+чтобы замер не зависел от стоимости построения mock-запросов.
+
+Запуск: python -m benchmarks.bench_ingress [число_запросов]
+"""
+import asyncio
+import gc
+import json
+import random
+import sys
+import time
+
+from aiohttp import web
+from telegram import Update
+
+from utils.ingress import SECRET_HEADER, WebhookIngress
+from utils.update_dedup import UpdateDeduplicator
+
+SECRET = "benchmark-secret"
+
+
+class BenchRequest:
+    """Минимальный webhook-запрос: заголовки и тело, как у aiohttp.web.Request."""
+
+    def __init__(self, headers: dict, body: bytes):
+        self.headers = headers
+        self._body = body
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def json(self):
+        return json.loads((await self.read()).decode())
+
+
+def sample_updates(n: int) -> list:
+    """Возвращает (заголовки, тело) запросов в случайном порядке."""
+    user = {"id": 1, "is_bot": False, "first_name": "Бенчмарк", "language_code": "ru"}
+    chat = {"id": 1, "type": "private", "first_name": "Бенчмарк"}
+    requests = []
+    for i in range(n):
+        kind = random.random()
+        update_id = i
+        if kind < 0.6:
+            update = {"message": {"message_id": i, "date": 0, "chat": chat, "from": user, "text": "🔮 Гороскоп"}}
+        elif kind < 0.75:
+            update = {"callback_query": {
+                "id": str(i), "chat_instance": "1", "data": "period_today", "from": user,
+                "message": {"message_id": i, "date": 0, "chat": chat, "text": "Выберите период"},
+            }}
+        elif kind < 0.85:
+            update_id = max(0, i - 1)  # повторная доставка
+            update = {"message": {"message_id": i, "date": 0, "chat": chat, "from": user, "text": "повтор"}}
+        else:
+            update = {"edited_message": {"message_id": i, "date": 0, "edit_date": 0, "chat": chat,
+                                         "from": user, "text": "правка"}}
+        update["update_id"] = update_id
+        secret = SECRET if random.random() > 0.05 else "wrong"
+        requests.append(({SECRET_HEADER: secret}, json.dumps(update, ensure_ascii=False).encode()))
+    return requests
+
+
+async def legacy(requests: list) -> float:
+    dedup = UpdateDeduplicator(capacity=len(requests))
+    requests = [BenchRequest(headers, body) for headers, body in requests]
+    gc.collect()
+    started = time.perf_counter()
+    for request in requests:
+        data = await request.json()
+        update_id = data.get("update_id")
+        if update_id is not None and dedup.seen(update_id):
+            continue
+        Update.de_json(data, None)
+    return time.perf_counter() - started
+
+
+async def fast(requests: list) -> float:
+    ingress = WebhookIngress(secret_token=SECRET, dedup=UpdateDeduplicator(capacity=len(requests)))
+    requests = [BenchRequest(headers, body) for headers, body in requests]
+    gc.collect()
+    started = time.perf_counter()
+    for request in requests:
+        try:
+            accepted = await ingress.accept(request)
+        except web.HTTPException:
+            continue
+        if accepted is not None:
+            Update.de_json(accepted[0], None)
+    elapsed = time.perf_counter() - started
+    print(f"WebhookIngress: {ingress.stats()}")
+    return elapsed
+
+
+async def main(n: int) -> None:
+    random.seed(1)
+    requests = sample_updates(n)
+    results = {
+        "request.json + de_json": await legacy(requests),
+        "WebhookIngress": await fast(requests),
+    }
+    for name, elapsed in results.items():
+        print(f"{name:<24} {elapsed * 1e6 / n:8.1f} мкс/запрос  ({n / elapsed:9.0f} запросов/с)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -1,30 +1,45 @@
 import logging
 import os
 import asyncio
+import signal
+import tempfile
 from aiohttp import web
 import telegram
 from telegram import Update
-from telegram.ext import (
-    Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler, ContextTypes
-)
-from telegram.ext.filters import BaseFilter
+from telegram.ext import Application, ContextTypes
 from telegram.helpers import escape_markdown
 from telegram_bot_calendar import WMonthTelegramCalendar
 from keyboards.main_menu import main_menu_keyboard, predictions_keyboard
 from keyboards.inline_buttons import horoscope_keyboard
-from handlers.horoscope import horoscope_callback, process_horoscope, period_callback
-from handlers.natal_chart import natal_chart, handle_natal_input
+from handlers.horoscope import horoscope_callback, process_horoscope, period_callback, period_input
+from handlers.natal_chart import natal_chart, handle_natal_input, regenerate_natal_callback
 from handlers.numerology import numerology, process_numerology
 from handlers.tarot import tarot
-from handlers.compatibility import compatibility, compatibility_natal, handle_compatibility_input
+from handlers.compatibility import (
+    compatibility_quick, compatibility_sign_callback, compatibility_natal, handle_compatibility_input,
+    regenerate_compatibility_callback
+)
 from handlers.compatibility_fio import compatibility_fio
 from handlers.fortune import fortune_callback
 from handlers.subscription import subscribe, unsubscribe
 from handlers.user_profile import set_profile, get_profile
 from handlers.message_of_the_day import message_of_the_day_callback
-from utils.calendar import start_calendar, handle_calendar
-from utils.button_guard import button_guard
-from services.database import init_db
+from utils.calendar import handle_calendar
+from utils.button_guard import button_guard, get_inflight_count
+from utils.sessions import NatalSession, CompatibilitySession, session_sweeper
+from utils.router import UpdateRouter
+from utils.update_queue import UpdateQueue, get_raw_shard_key
+from utils.ingress import WebhookIngress, SUPPORTED_UPDATE_TYPES, json_loads
+from utils.worker_pool import ShardedForwarder, serve_worker, spawn_workers, stop_workers, worker_socket_path
+from utils.update_dedup import UpdateDeduplicator
+from utils.inline_reply import InlineReplyRequest, inline_reply, inline_replies
+from services.database import init_db, close_db, write_queue, profile_cache
+from services.openai_service import warmup_openai, close_openai
+from services.persistence import persistence
+from services.tarot_images import tarot_images
+from services.pipeline import get_pipeline_stats
+from services.variant_pool import get_variant_pool_stats
+from services.reading_cache import reading_cache
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -41,16 +56,15 @@ for var in required_env_vars:
 
 # Создание приложения
 telegram_token = os.environ.get("TELEGRAM_TOKEN")
-app = Application.builder().token(telegram_token).build()
-
-# Кастомные фильтры
-class NatalFilter(BaseFilter):
-    def filter(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
-        return bool(context.user_data.get("awaiting_natal"))
-
-class CompatibilityFilter(BaseFilter):
-    def filter(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
-        return bool(context.user_data.get("awaiting_compatibility"))
+# Состояние диалогов (user_data) сохраняется в SQLite и переживает перезапуски;
+# InlineReplyRequest позволяет вернуть первый вызов быстрого обработчика ответом на webhook
+app = (
+    Application.builder()
+    .token(telegram_token)
+    .request(InlineReplyRequest(connection_pool_size=256))
+    .persistence(persistence)
+    .build()
+)
 
 # Определение функций
 async def back_to_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -78,110 +92,262 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         reply_markup=main_menu_keyboard
     )
 
-@button_guard
-async def handle_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not update.message or not update.message.text or not update.effective_chat:
-        logger.error("Отсутствует сообщение или effective_chat")
-        return
-    text = update.message.text
-    chat_id = update.message.chat_id
-    logger.debug(f"Пользователь {chat_id} выбрал: {text}")
-    try:
-        if text == "🔮 Гороскоп":
-            await update.message.reply_text("Выберите ваш знак зодиака:", reply_markup=horoscope_keyboard)
-        elif text == "🔢 Нумерология":
-            await update.message.reply_text("🔢 Выберите дату рождения через календарь:")
-            context.user_data["awaiting_numerology"] = True
-            await start_calendar(update, context)
-        elif text == "🌌 Натальная карта":
-            await update.message.reply_text("📜 Введите ваше имя:")
-            context.user_data["awaiting_natal"] = True
-            context.user_data["natal_step"] = "name"
-        elif text == "❤️ Совместимость":
-            await update.message.reply_text("💑 Выберите дату рождения первого человека:")
-            context.user_data["awaiting_compatibility"] = True
-            await start_calendar(update, context)
-        elif text == "📜 Послание на день":
-            await message_of_the_day_callback(update, context)
-        elif text == "🎴 Карты Таро":
-            await tarot(update, context)
-        elif text == "🔮 Предсказания":
-            await update.message.reply_text("🔮 Выберите категорию предсказания:", reply_markup=predictions_keyboard)
-        elif text in ["💰 На деньги", "🍀 На удачу", "💞 На отношения", "🩺 На здоровье"]:
-            await fortune_callback(update, context)
-        elif text == "🔙 Вернуться в меню":
-            await update.message.reply_text("⏬ Главное меню:", reply_markup=main_menu_keyboard)
-        else:
-            logger.warning(f"Неизвестная команда: {text}")
-            await update.message.reply_text("⚠️ Неизвестная команда. Используйте меню.")
-    except Exception as e:
-        logger.error(f"Ошибка при обработке кнопки {text}: {e}")
-        await update.message.reply_text("⚠️ Произошла ошибка. Попробуйте снова.")
+async def show_horoscope_signs(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text("Выберите ваш знак зодиака:", reply_markup=horoscope_keyboard)
+
+async def show_predictions(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text("🔮 Выберите категорию предсказания:", reply_markup=predictions_keyboard)
+
+async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text("⏬ Главное меню:", reply_markup=main_menu_keyboard)
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.error(f"Ошибка в обработке обновления: {context.error}")
     if update and update.effective_chat:
         await context.bot.send_message(update.effective_chat.id, "⚠️ Произошла ошибка. Попробуйте позже.")
 
-# Регистрация хендлеров
-app.add_handler(CommandHandler("start", start_handler))
-app.add_handler(CommandHandler("natal_chart", natal_chart))
-app.add_handler(CommandHandler("numerology", numerology))
-app.add_handler(CommandHandler("tarot", tarot))
-app.add_handler(CommandHandler("message_of_the_day", message_of_the_day_callback))
-app.add_handler(CommandHandler("compatibility", compatibility))
-app.add_handler(CommandHandler("compatibility_natal", compatibility_natal))
-app.add_handler(CommandHandler("compatibility_fio", compatibility_fio))
-app.add_handler(CommandHandler("subscribe", subscribe))
-app.add_handler(CommandHandler("unsubscribe", unsubscribe))
-app.add_handler(CommandHandler("set_profile", set_profile))
-app.add_handler(CommandHandler("get_profile", get_profile))
-
-app.add_handler(CallbackQueryHandler(back_to_menu_callback, pattern="^back_to_menu$"))
-app.add_handler(CallbackQueryHandler(message_of_the_day_callback, pattern="^message_of_the_day$"))
-app.add_handler(CallbackQueryHandler(handle_calendar, pattern="^cbcal_"))
-app.add_handler(CallbackQueryHandler(horoscope_callback, pattern="^horoscope_.*$"))
-app.add_handler(CallbackQueryHandler(period_callback, pattern="^period_.*$"))
-app.add_handler(CallbackQueryHandler(fortune_callback, pattern="^fortune_.*$"))
-
-# Регистрация фильтров и хендлеров для текстового ввода
-app.add_handler(MessageHandler(
-    filters.Regex("^(🔮 Гороскоп|🔢 Нумерология|🌌 Натальная карта|❤️ Совместимость|📜 Послание на день|🎴 Карты Таро|🔮 Предсказания|💰 На деньги|🍀 На удачу|💞 На отношения|🩺 На здоровье|🔙 Вернуться в меню)$"),
-    handle_buttons
-))
-app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & NatalFilter(), handle_natal_input))
-app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & CompatibilityFilter(), handle_compatibility_input))
-app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, process_horoscope))
+# Маршрутизация: команды и кнопки — по словарю, callback_data — по префиксу,
+# текстовый ввод — по активной сессии. inline_reply — обработчики, которые не используют
+# результат первого вызова Bot API: он возвращается ответом на webhook
+router = UpdateRouter()
+router.command("start", inline_reply(start_handler))
+router.command("natal_chart", inline_reply(natal_chart))
+router.command("numerology", numerology)
+router.command("tarot", tarot)
+router.command("message_of_the_day", message_of_the_day_callback)
+router.command("compatibility", inline_reply(compatibility_quick))
+router.command("compatibility_natal", compatibility_natal)
+router.command("compatibility_fio", compatibility_fio)
+router.command("subscribe", subscribe)
+router.command("unsubscribe", unsubscribe)
+router.command("set_profile", set_profile)
+router.command("get_profile", get_profile)
+
+router.callback_query("back_to_menu", inline_reply(back_to_menu_callback))
+router.callback_query("cbcal_", handle_calendar)
+router.callback_query("horoscope_", inline_reply(horoscope_callback))
+# Долгие обработчики (запросы к OpenAI) не блокируют очередь чата: block=False,
+# а повторные нажатия объединяет button_guard
+router.callback_query("message_of_the_day", button_guard(message_of_the_day_callback), block=False)
+# Первый вызов — answerCallbackQuery, его результат не нужен
+router.callback_query("period_", button_guard(inline_reply(period_callback), key=period_input), block=False)
+router.callback_query("fortune_", button_guard(inline_reply(fortune_callback)), block=False)
+# Пара знаков, которой ещё нет в матрице, генерируется один раз — это долго
+router.callback_query("compat_", button_guard(inline_reply(compatibility_sign_callback)), block=False)
+# Новый разбор вместо сохранённого в кэше
+router.callback_query("regen-natal_", button_guard(inline_reply(regenerate_natal_callback)), block=False)
+router.callback_query("regen-compatibility_", button_guard(inline_reply(regenerate_compatibility_callback)), block=False)
+
+MENU_BUTTONS = {
+    "🔮 Гороскоп": inline_reply(show_horoscope_signs),
+    "🔢 Нумерология": numerology,
+    "🌌 Натальная карта": inline_reply(natal_chart),
+    "❤️ Совместимость": inline_reply(compatibility_quick),
+    "📜 Послание на день": message_of_the_day_callback,
+    "🎴 Карты Таро": tarot,
+    "🔮 Предсказания": inline_reply(show_predictions),
+    "💰 На деньги": fortune_callback,
+    "🍀 На удачу": fortune_callback,
+    "💞 На отношения": fortune_callback,
+    "🩺 На здоровье": fortune_callback,
+    "🔙 Вернуться в меню": inline_reply(show_main_menu),
+}
+for button_text, button_callback in MENU_BUTTONS.items():
+    router.button(button_text, button_guard(button_callback), block=False)
+
+router.state(NatalSession.kind, handle_natal_input)
+router.state(CompatibilitySession.kind, handle_compatibility_input)
+router.fallback(process_horoscope)
+
+app.add_handler(router)
+app.add_error_handler(error_handler)
+
+# Очередь входящих обновлений: webhook отвечает сразу, обработка идёт в воркерах
+update_queue = UpdateQueue(
+    app,
+    workers=int(os.environ.get("UPDATE_WORKERS", 64)),
+    maxsize=int(os.environ.get("UPDATE_QUEUE_SIZE", 1000))
+)
+
+# Окно недавних update_id для отбрасывания повторных доставок
+update_dedup = UpdateDeduplicator(
+    capacity=int(os.environ.get("DEDUP_WINDOW", 10000)),
+    path=os.environ.get("DEDUP_STATE_PATH")
+)
+
+# Число процессов-воркеров; при 1 бот работает в одном процессе
+worker_processes = int(os.environ.get("WORKER_PROCESSES", 1))
+
+# Проверки webhook до разбора обновления: секретный токен, повторные доставки, тип обновления
+ingress = WebhookIngress(secret_token=os.environ.get("WEBHOOK_SECRET"), dedup=update_dedup)
 
 # Webhook handler
 async def webhook(request):
-    update = telegram.Update.de_json(await request.json(), app.bot)
-    await app.process_update(update)
+    accepted = await ingress.accept(request)
+    if accepted is None:
+        return web.Response()
+    data, _ = accepted
+    update = telegram.Update.de_json(data, app.bot)
+    # Быстрый обработчик: ждём его первый вызов Bot API, чтобы вернуть его в ответе
+    inline = inline_replies.enabled and router.is_inline_reply(update)
+    if inline:
+        inline_replies.open(update.update_id)
+    if not await update_queue.submit(update):
+        # Очередь переполнена: Telegram повторит доставку позже, поэтому не считаем обновление полученным
+        inline_replies.discard(update.update_id)
+        ingress.reject(data)
+        return web.Response(status=503)
+    if inline:
+        reply = await inline_replies.wait(update.update_id)
+        if reply is not None:
+            return web.json_response(reply)
     return web.Response()
 
-async def main():
-    logger.info("Запуск webhook-режима бота...")
-    loop = asyncio.get_event_loop()
-    try:
-        await app.initialize()
-        await init_db()
+def worker_stats() -> dict:
+    return {
+        "updates": update_queue.stats(),
+        "inflight_actions": get_inflight_count(),
+        "db_writes": write_queue.stats(),
+        "profile_cache": profile_cache.stats(),
+        "persistence": persistence.stats(),
+        "sessions": session_sweeper.stats(),
+        "router": router.stats(),
+        "inline_replies": inline_replies.stats(),
+        "tarot_images": tarot_images.stats(),
+        "pipelines": get_pipeline_stats(),
+        "variant_pools": get_variant_pool_stats(),
+        "reading_cache": reading_cache.stats(),
+    }
+
+async def stats(request):
+    return web.json_response({"dedup": update_dedup.stats(), "ingress": ingress.stats(), **worker_stats()})
+
+async def start_bot(run_scheduler: bool = True) -> None:
+    """Запускает обработку обновлений: БД, OpenAI, очередь, приложение и (опционально) планировщик."""
+    await app.initialize()
+    await init_db()
+    await warmup_openai()
+    await update_queue.start()
+    # start запускает периодическое сохранение user_data; апдейты приходят через update_queue
+    await app.start()
+    await session_sweeper.start(app)
+    if run_scheduler:
         from scheduler import schedule_daily_messages
-        loop.create_task(schedule_daily_messages(app))
-        webhook_url = f"{os.environ.get('WEBHOOK_URL')}/{os.environ.get('TELEGRAM_TOKEN')}"
-        await app.bot.set_webhook(webhook_url)
-        logger.info(f"Webhook установлен: {webhook_url}")
-        webhook_app = web.Application()
-        webhook_app.router.add_post(f"/{os.environ.get('TELEGRAM_TOKEN')}", webhook)
-        port = int(os.environ.get("PORT", 10000))
-        runner = web.AppRunner(webhook_app)
-        await runner.setup()
-        site = web.TCPSite(runner, "0.0.0.0", port)
-        await site.start()
-        logger.info(f"Webhook server started on 0.0.0.0:{port}/{os.environ.get('TELEGRAM_TOKEN')}")
+        asyncio.get_running_loop().create_task(schedule_daily_messages(app))
+
+async def stop_bot() -> None:
+    await update_queue.stop()
+    await session_sweeper.stop()
+    if app.running:
+        await app.stop()
+    # shutdown сохраняет последние изменения user_data, поэтому база закрывается после него
+    await app.shutdown()
+    await close_openai()
+    await close_db()
+
+async def start_webhook_server(handler, stats_handler) -> web.AppRunner:
+    """Устанавливает webhook и запускает HTTP-сервер, принимающий обновления."""
+    webhook_url = f"{os.environ.get('WEBHOOK_URL')}/{os.environ.get('TELEGRAM_TOKEN')}"
+    await app.bot.set_webhook(
+        webhook_url, secret_token=ingress.secret_token, allowed_updates=list(SUPPORTED_UPDATE_TYPES)
+    )
+    logger.info(f"Webhook установлен: {webhook_url}")
+    webhook_app = web.Application()
+    webhook_app.router.add_post(f"/{os.environ.get('TELEGRAM_TOKEN')}", handler)
+    webhook_app.router.add_get(f"/{os.environ.get('TELEGRAM_TOKEN')}/stats", stats_handler)
+    port = int(os.environ.get("PORT", 10000))
+    runner = web.AppRunner(webhook_app)
+    await runner.setup()
+    site = web.TCPSite(runner, "0.0.0.0", port)
+    await site.start()
+    logger.info(f"Webhook server started on 0.0.0.0:{port}/{os.environ.get('TELEGRAM_TOKEN')}")
+    return runner
+
+async def run_single_process():
+    try:
+        await start_bot()
+        await update_dedup.start()
+        await start_webhook_server(webhook, stats)
         await asyncio.Event().wait()
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
         raise
+    finally:
+        await update_dedup.stop()
+        await stop_bot()
+
+async def run_front(socket_dir: str):
+    """
+    Фронтальный процесс многопроцессного режима.
+
+    Принимает webhook, отбрасывает повторные доставки и передаёт тело обновления
+    без разбора воркеру, выбранному по chat_id. Обработка (de_json, хендлеры, OpenAI)
+    идёт в воркерах, поэтому пропускная способность растёт с числом ядер.
+    """
+    forwarder = ShardedForwarder([worker_socket_path(socket_dir, i) for i in range(worker_processes)])
+
+    async def front_webhook(request):
+        accepted = await ingress.accept(request)
+        if accepted is None:
+            return web.Response()
+        data, body = accepted
+        if not await forwarder.forward(get_raw_shard_key(data), body):
+            ingress.reject(data)
+            return web.Response(status=503)
+        return web.Response()
+
+    async def front_stats(request):
+        return web.json_response({
+            "dedup": update_dedup.stats(), "ingress": ingress.stats(), "workers": forwarder.stats()
+        })
+
+    try:
+        await forwarder.start()
+        await update_dedup.start()
+        await app.bot.initialize()
+        await start_webhook_server(front_webhook, front_stats)
+        await asyncio.Event().wait()
+    finally:
+        await update_dedup.stop()
+        await forwarder.stop()
+        await app.bot.shutdown()
+
+async def run_worker(index: int, socket_path: str):
+    """Процесс-воркер: собственное Application, общая база SQLite; планировщик — только в воркере 0."""
+    async def accept(body: bytes) -> bool:
+        return await update_queue.submit(telegram.Update.de_json(json_loads(body), app.bot))
+
+    stopping = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    server = None
+    try:
+        await start_bot(run_scheduler=index == 0)
+        server = await serve_worker(socket_path, accept)
+        await stopping.wait()
+        logger.info(f"Воркер {index} останавливается")
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        await stop_bot()
+
+def worker_entry(index: int, socket_path: str) -> None:
+    asyncio.run(run_worker(index, socket_path))
+
+async def main():
+    logger.info("Запуск webhook-режима бота...")
+    if worker_processes <= 1:
+        await run_single_process()
+        return
+    # Схема мигрируется один раз до запуска воркеров, а не в каждом из них одновременно
+    await init_db()
+    await close_db()
+    socket_dir = os.environ.get("WORKER_SOCKET_DIR") or tempfile.mkdtemp(prefix="bot-workers-")
+    processes = spawn_workers(worker_processes, worker_entry, socket_dir)
+    try:
+        await run_front(socket_dir)
+    finally:
+        await asyncio.get_running_loop().run_in_executor(None, stop_workers, processes)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -25,4 +25,40 @@ if not os.path.exists(os.path.dirname(DB_PATH)) and DB_PATH != "bot_data.db":
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
 # Дополнительные настройки
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
\ No newline at end of file
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Настройки клиента OpenAI
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "20"))  # одновременных запросов к OpenAI
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "20"))  # соединений в пуле HTTP
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))  # таймаут запроса (секунды)
+
+# Часовой пояс подписчиков по умолчанию (для ежедневной рассылки)
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Europe/Moscow")
+
+# Кэш профилей пользователей
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))  # записей
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "3600"))  # секунд
+
+# Выборка подписчиков для рассылки порциями
+SUBSCRIPTION_BATCH_SIZE = int(os.getenv("SUBSCRIPTION_BATCH_SIZE", "1000"))  # строк за запрос
+
+# Сохранение состояния диалогов в БД
+PERSISTENCE_INTERVAL = float(os.getenv("PERSISTENCE_INTERVAL", "5"))  # секунд между сохранениями
+
+# Ответ на обновление в теле ответа на webhook (0 — выключено)
+INLINE_REPLY_TIMEOUT = float(os.getenv("INLINE_REPLY_TIMEOUT", "0.5"))  # секунд ожидания первого вызова
+
+# Изображения карт Таро
+TAROT_IMAGE_DIR = os.getenv("TAROT_IMAGE_DIR", os.path.join(os.path.dirname(DB_PATH) or ".", "tarot_images"))
+TAROT_IMAGE_VARIANTS = int(os.getenv("TAROT_IMAGE_VARIANTS", "1"))  # стилей на карту
+TAROT_IMAGE_SIZE = int(os.getenv("TAROT_IMAGE_SIZE", "768"))  # сторона JPEG (пиксели)
+TAROT_IMAGE_TIMEOUT = float(os.getenv("TAROT_IMAGE_TIMEOUT", "25"))  # секунд; дольше — расклад без картинки
+
+# Пул заранее сгенерированных текстов для небольших наборов ключей (число, карта, категория)
+VARIANT_POOL_SIZE = int(os.getenv("VARIANT_POOL_SIZE", "5"))  # вариантов на ключ
+VARIANT_MAX_AGE = float(os.getenv("VARIANT_MAX_AGE", str(30 * 24 * 3600)))  # секунд до замены варианта
+VARIANT_MAX_SERVES = int(os.getenv("VARIANT_MAX_SERVES", "500"))  # показов до замены варианта
+
+# Кэш натальных карт и совместимости по данным рождения
+READING_CACHE_SIZE = int(os.getenv("READING_CACHE_SIZE", "20000"))  # записей
+READING_CACHE_TOUCH_INTERVAL = float(os.getenv("READING_CACHE_TOUCH_INTERVAL", str(6 * 3600)))  # секунд между отметками использования
@@ -1,25 +1,141 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.helpers import escape_markdown  # Правильный импорт
-from services.compatibility_service import get_compatibility
+from services.compatibility_service import get_compatibility, get_zodiac_compatibility, is_zodiac_pair_ready
 from utils.validation import validate_date, validate_time, validate_place
 from utils.calendar import start_calendar
+from utils.loading_messages import send_processing_message, replace_processing_message, ProgressEditor
+from utils.sessions import NatalSession, CompatibilitySession, get_session, save_session, end_session
 from keyboards.main_menu import main_menu_keyboard
+from services.reading_cache import reading_cache, compatibility_key
+from keyboards.inline_buttons import compatibility_signs_keyboard, compatibility_result_keyboard, regenerate_keyboard
+from utils.zodiac import ZODIAC_NAMES
 import logging
-from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+async def compatibility_quick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Быстрая совместимость: выбор двух знаков зодиака."""
+    if not update.effective_chat:
+        logger.error("Отсутствует effective_chat в update")
+        return
+    await update.effective_message.reply_text(
+        "💞 Выберите знак первого человека:", reply_markup=compatibility_signs_keyboard("compat_")
+    )
+
+async def compatibility_sign_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обрабатывает callback_data быстрой совместимости: compat_<знак>, compat_<знак>_<знак>
+    и compat_natal (переход к расчёту по натальным картам).
+    """
+    query = update.callback_query
+    await query.answer()
+    signs = query.data.split("_")[1:]
+    if signs == ["natal"]:
+        await compatibility(update, context)
+        return
+    if not signs or len(signs) > 2 or any(sign not in ZODIAC_NAMES for sign in signs):
+        logger.error(f"Неизвестные знаки в callback_data: {query.data}")
+        return
+
+    if len(signs) == 1:
+        await query.message.edit_text(
+            f"💞 Первый знак: {signs[0]}\nВыберите знак второго человека:",
+            reply_markup=compatibility_signs_keyboard(f"compat_{signs[0]}_")
+        )
+        return
+
+    sign1, sign2 = signs
+    try:
+        # Ответ берётся из заранее посчитанной матрицы пар знаков
+        on_progress = None
+        if not await is_zodiac_pair_ready(sign1, sign2):
+            # Пары ещё нет в матрице: генерация долгая, показываем её ход
+            processing_message = await query.message.edit_text(f"💞 Рассчитываем совместимость: {sign1} и {sign2}...")
+            on_progress = ProgressEditor(context, processing_message, header=f"💞 Совместимость: {sign1} и {sign2}\n\n")
+        result = await get_zodiac_compatibility(sign1, sign2, on_progress=on_progress)
+        await query.message.edit_text(
+            f"💞 Совместимость: {sign1} и {sign2}\n\n{result}"[:4096],
+            reply_markup=compatibility_result_keyboard
+        )
+    except Exception as e:
+        logger.error(f"Ошибка совместимости знаков {sign1} и {sign2}: {e}")
+        await query.message.reply_text(
+            escape_markdown("⚠️ Ошибка при расчете совместимости. Попробуйте позже.", version=2),
+            parse_mode="MarkdownV2"
+        )
+
 async def compatibility(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Совместимость по натальным картам: даты, время и места рождения двух человек."""
     if not update.effective_chat:
         logger.error("Отсутствует effective_chat в update")
         return
-    await update.message.reply_text("💑 Выберите дату рождения первого человека:")
-    context.user_data["awaiting_compatibility"] = True
-    context.user_data["compatibility_step"] = "birth_date1"
-    context.user_data["last_interaction"] = datetime.now()
+    await update.effective_message.reply_text("💑 Выберите дату рождения первого человека:")
+    # Одновременно идёт только один многошаговый ввод
+    end_session(update, context, NatalSession)
+    save_session(update, context, CompatibilitySession())
     await start_calendar(update, context)
 
+async def compatibility_date_selected(update: Update, context: ContextTypes.DEFAULT_TYPE, birth_date: str) -> bool:
+    """
+    Принимает дату рождения (из календаря или текстом), если расчёт совместимости ждёт её.
+
+    Returns:
+        bool: True, если дата принята
+    """
+    session = get_session(context, CompatibilitySession)
+    if session is None or session.step not in ("birth_date1", "birth_date2") or session.is_expired():
+        return False
+    if session.step == "birth_date1":
+        session.birth_date1 = birth_date
+        session.step = "birth_time1"
+        prompt = "⏰ Введите время рождения первого человека (ЧЧ:ММ):"
+    else:
+        session.birth_date2 = birth_date
+        session.step = "birth_time2"
+        prompt = "⏰ Введите время рождения второго человека (ЧЧ:ММ):"
+    save_session(update, context, session)
+    await context.bot.send_message(update.effective_chat.id, prompt)
+    return True
+
+async def send_compatibility(update: Update, context: ContextTypes.DEFAULT_TYPE, args: list, refresh: bool = False) -> None:
+    """
+    Рассчитывает (или берёт из кэша) совместимость и выводит её с кнопкой «Сгенерировать заново».
+
+    Args:
+        args: Имя, дата, время и место рождения первого, затем второго человека
+        refresh: Сгенерировать заново, не используя кэш
+    """
+    processing_message = await send_processing_message(update, "💑 Рассчитываем совместимость...")
+    result = await get_compatibility(*args, on_progress=ProgressEditor(context, processing_message), refresh=refresh)
+    # Кнопка «Сгенерировать заново» ссылается на данные именно этого разбора
+    request_id = reading_cache.remember(compatibility_key(tuple(args[:4]), tuple(args[4:])), args)
+    await replace_processing_message(
+        context, processing_message, escape_markdown(result, version=2), parse_mode="MarkdownV2",
+        reply_markup=regenerate_keyboard("compatibility", request_id)
+    )
+
+async def regenerate_compatibility_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Кнопка «Сгенерировать заново» под совместимостью: новый разбор вместо сохранённого."""
+    query = update.callback_query
+    await query.answer()
+    args = reading_cache.recall(query.data.rsplit("_", 1)[-1])
+    if not args:
+        await context.bot.send_message(
+            update.effective_chat.id, "⚠️ Данные этого разбора больше не хранятся. Начните заново.",
+            reply_markup=main_menu_keyboard
+        )
+        return
+    try:
+        await send_compatibility(update, context, args, refresh=True)
+    except Exception as e:
+        logger.error(f"Ошибка повторного расчета совместимости: {e}")
+        await context.bot.send_message(
+            update.effective_chat.id,
+            escape_markdown("⚠️ Ошибка при расчете совместимости. Попробуйте позже.", version=2),
+            parse_mode="MarkdownV2"
+        )
+
 async def compatibility_natal(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message or not update.effective_chat:
         logger.error("Отсутствует сообщение или effective_chat в update")
@@ -40,8 +156,7 @@ async def compatibility_natal(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     try:
-        result = await get_compatibility(name1, birth1, time1, place1, name2, birth2, time2, place2)
-        await update.message.reply_text(escape_markdown(result, version=2), parse_mode="MarkdownV2")
+        await send_compatibility(update, context, [name1, birth1, time1, place1, name2, birth2, time2, place2])
     except Exception as e:
         logger.error(f"Ошибка расчета совместимости: {e}")
         await update.message.reply_text(
@@ -53,8 +168,11 @@ async def handle_compatibility_input(update: Update, context: ContextTypes.DEFAU
     if not update.message or not update.message.text or not update.effective_chat:
         logger.error("Отсутствует сообщение или effective_chat в update")
         return
-    if "last_interaction" in context.user_data and (datetime.now() - context.user_data["last_interaction"]) > timedelta(minutes=10):
-        context.user_data.clear()
+    session = get_session(context, CompatibilitySession)
+    if session is None:
+        return
+    if session.is_expired():
+        end_session(update, context, CompatibilitySession)
         await update.message.reply_text(
             escape_markdown("⚠️ Время ожидания ввода истекло. Начните заново.", version=2),
             parse_mode="MarkdownV2",
@@ -62,21 +180,18 @@ async def handle_compatibility_input(update: Update, context: ContextTypes.DEFAU
         )
         return
 
-    step = context.user_data.get("compatibility_step")
+    step = session.step
     text = update.message.text
     logger.debug(f"Обрабатываем ввод для шага {step}: {text}")
 
-    if step == "birth_date1":
+    if step in ("birth_date1", "birth_date2"):
         if not validate_date(text):
             await update.message.reply_text(
                 escape_markdown("⚠️ Неверный формат даты (ДД.ММ.ГГГГ).", version=2),
                 parse_mode="MarkdownV2"
             )
             return
-        context.user_data["birth_date1"] = text
-        context.user_data["compatibility_step"] = "birth_time1"
-        context.user_data["last_interaction"] = datetime.now()
-        await update.message.reply_text("⏰ Введите время рождения первого человека (ЧЧ:ММ):")
+        await compatibility_date_selected(update, context, text)
     elif step == "birth_time1":
         if not validate_time(text):
             await update.message.reply_text(
@@ -84,9 +199,9 @@ async def handle_compatibility_input(update: Update, context: ContextTypes.DEFAU
                 parse_mode="MarkdownV2"
             )
             return
-        context.user_data["birth_time1"] = text
-        context.user_data["compatibility_step"] = "birth_place1"
-        context.user_data["last_interaction"] = datetime.now()
+        session.birth_time1 = text
+        session.step = "birth_place1"
+        save_session(update, context, session)
         await update.message.reply_text("📍 Введите место рождения первого человека:")
     elif step == "birth_place1":
         if not validate_place(text):
@@ -95,23 +210,12 @@ async def handle_compatibility_input(update: Update, context: ContextTypes.DEFAU
                 parse_mode="MarkdownV2"
             )
             return
-        context.user_data["birth_place1"] = text
-        context.user_data["name1"] = context.user_data.get("name1", "Первый человек")
-        context.user_data["compatibility_step"] = "birth_date2"
-        context.user_data["last_interaction"] = datetime.now()
+        session.birth_place1 = text
+        session.name1 = session.name1 or "Первый человек"
+        session.step = "birth_date2"
+        save_session(update, context, session)
         await update.message.reply_text("💑 Выберите дату рождения второго человека:")
         await start_calendar(update, context)
-    elif step == "birth_date2":
-        if not validate_date(text):
-            await update.message.reply_text(
-                escape_markdown("⚠️ Неверный формат даты (ДД.ММ.ГГГГ).", version=2),
-                parse_mode="MarkdownV2"
-            )
-            return
-        context.user_data["birth_date2"] = text
-        context.user_data["compatibility_step"] = "birth_time2"
-        context.user_data["last_interaction"] = datetime.now()
-        await update.message.reply_text("⏰ Введите время рождения второго человека (ЧЧ:ММ):")
     elif step == "birth_time2":
         if not validate_time(text):
             await update.message.reply_text(
@@ -119,9 +223,9 @@ async def handle_compatibility_input(update: Update, context: ContextTypes.DEFAU
                 parse_mode="MarkdownV2"
             )
             return
-        context.user_data["birth_time2"] = text
-        context.user_data["compatibility_step"] = "birth_place2"
-        context.user_data["last_interaction"] = datetime.now()
+        session.birth_time2 = text
+        session.step = "birth_place2"
+        save_session(update, context, session)
         await update.message.reply_text("📍 Введите место рождения второго человека:")
     elif step == "birth_place2":
         if not validate_place(text):
@@ -130,23 +234,22 @@ async def handle_compatibility_input(update: Update, context: ContextTypes.DEFAU
                 parse_mode="MarkdownV2"
             )
             return
-        context.user_data["birth_place2"] = text
-        context.user_data["name2"] = context.user_data.get("name2", "Второй человек")
-        context.user_data["last_interaction"] = datetime.now()
+        session.birth_place2 = text
+        session.name2 = session.name2 or "Второй человек"
+        save_session(update, context, session)
 
         try:
-            result = await get_compatibility(
-                context.user_data["name1"],
-                context.user_data["birth_date1"],
-                context.user_data["birth_time1"],
-                context.user_data["birth_place1"],
-                context.user_data["name2"],
-                context.user_data["birth_date2"],
-                context.user_data["birth_time2"],
-                context.user_data["birth_place2"]
-            )
-            await update.message.reply_text(escape_markdown(result, version=2), parse_mode="MarkdownV2")
-            context.user_data.clear()
+            await send_compatibility(update, context, [
+                session.name1,
+                session.birth_date1,
+                session.birth_time1,
+                session.birth_place1,
+                session.name2,
+                session.birth_date2,
+                session.birth_time2,
+                session.birth_place2,
+            ])
+            end_session(update, context, CompatibilitySession)
             await update.message.reply_text("⏬ Главное меню:", reply_markup=main_menu_keyboard)
         except Exception as e:
             logger.error(f"Ошибка расчета совместимости: {e}")
@@ -155,4 +258,4 @@ async def handle_compatibility_input(update: Update, context: ContextTypes.DEFAU
                 parse_mode="MarkdownV2",
                 reply_markup=main_menu_keyboard
             )
-            context.user_data.clear()
\ No newline at end of file
+            end_session(update, context, CompatibilitySession)
@@ -47,11 +47,12 @@ async def fortune_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         return
 
     try:
-        fortune = await get_fortune(category)
+        fortune = await get_fortune(category, update.effective_user.id if update.effective_user else None)
         fortune = fortune[:4000]
-        await (query.message.edit_text if query else update.message.reply_text)
-        f"🔮 Предсказание на {category}:\n{fortune}"
-        
+        await (query.message.edit_text if query else update.message.reply_text)(
+            f"🔮 Предсказание на {category}:\n{fortune}"
+        )
+
     except Exception as e:
         logger.error(f"Ошибка получения предсказания: {e}")
         await (query.message.edit_text if query else update.message.reply_text)(
@@ -3,7 +3,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.helpers import escape_markdown
 from services.horoscope_service import get_horoscope
-from utils.loading_messages import send_processing_message, replace_processing_message
+from utils.loading_messages import send_processing_message, replace_processing_message, ProgressEditor
 from utils.validation import sanitize_input
 from keyboards.inline_buttons import horoscope_keyboard
 
@@ -52,6 +52,10 @@ async def horoscope_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             parse_mode="MarkdownV2"
         )
 
+def period_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Данные period_callback помимо кнопки периода: выбранный ранее знак (для button_guard)."""
+    return context.user_data.get("selected_sign")
+
 async def period_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает выбор периода гороскопа и отправляет гороскоп."""
     query = update.callback_query
@@ -89,24 +93,18 @@ async def period_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             parse_mode="MarkdownV2"
         )
 
-        # Получаем гороскоп
-        horoscope_text = await get_horoscope(sign, period)
+        # Получаем гороскоп, показывая текст по мере генерации
+        progress = ProgressEditor(context, processing_message, header=f"🌟 Гороскоп для {sign} на {period_text}:\n\n")
+        horoscope_text = await get_horoscope(sign, period, on_progress=progress)
 
         # Экранируем текст для MarkdownV2
         horoscope_text = escape_markdown(horoscope_text, version=2)
 
-        # Отправляем гороскоп
-        await context.bot.send_message(
-            chat_id,
-            f"🌟 Гороскоп для {sanitize_input(sign)} на {sanitize_input(period_text)}:\n\n{horoscope_text}",
-            parse_mode="MarkdownV2"
-        )
-
-        # Удаляем сообщение о генерации
+        # Заменяем сообщение о генерации готовым гороскопом
         await replace_processing_message(
             context,
             processing_message,
-            sanitize_input(f"✅ Гороскоп для {sign} на {period_text} готов!"),
+            f"🌟 Гороскоп для {sanitize_input(sign)} на {sanitize_input(period_text)}:\n\n{horoscope_text}",
             parse_mode="MarkdownV2"
         )
 
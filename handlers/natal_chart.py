@@ -4,9 +4,12 @@ from telegram.helpers import escape_markdown  # Правильный импор
 from services.natal_chart_service import get_natal_chart
 from utils.validation import validate_date, validate_time, validate_place
 from utils.calendar import start_calendar
+from utils.loading_messages import send_processing_message, replace_processing_message, ProgressEditor
+from utils.sessions import NatalSession, CompatibilitySession, get_session, save_session, end_session
 from keyboards.main_menu import main_menu_keyboard
+from services.reading_cache import reading_cache, natal_key
+from keyboards.inline_buttons import regenerate_keyboard
 import logging
-from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
@@ -15,15 +18,73 @@ async def natal_chart(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         logger.error("Отсутствует effective_chat в update")
         return
     await update.message.reply_text("🌌 Введите ваше имя:")
-    context.user_data["natal_step"] = "name"
-    context.user_data["last_interaction"] = datetime.now()
+    # Одновременно идёт только один многошаговый ввод
+    end_session(update, context, CompatibilitySession)
+    save_session(update, context, NatalSession())
+
+async def natal_date_selected(update: Update, context: ContextTypes.DEFAULT_TYPE, birth_date: str) -> bool:
+    """
+    Принимает дату рождения (из календаря или текстом), если натальная карта ждёт её.
+
+    Returns:
+        bool: True, если дата принята
+    """
+    session = get_session(context, NatalSession)
+    if session is None or session.step != "birth_date" or session.is_expired():
+        return False
+    session.birth_date = birth_date
+    session.step = "birth_time"
+    save_session(update, context, session)
+    await context.bot.send_message(update.effective_chat.id, "⏰ Введите время рождения (ЧЧ:ММ):")
+    return True
+
+async def send_natal_chart(update: Update, context: ContextTypes.DEFAULT_TYPE, args: list, refresh: bool = False) -> None:
+    """
+    Составляет (или берёт из кэша) натальную карту и выводит её с кнопкой «Сгенерировать заново».
+
+    Args:
+        args: Имя, дата, время и место рождения
+        refresh: Сгенерировать заново, не используя кэш
+    """
+    processing_message = await send_processing_message(update, "🌌 Составляем натальную карту...")
+    result = await get_natal_chart(*args, on_progress=ProgressEditor(context, processing_message), refresh=refresh)
+    # Кнопка «Сгенерировать заново» ссылается на данные именно этого разбора
+    request_id = reading_cache.remember(natal_key(*args), args)
+    await replace_processing_message(
+        context, processing_message, escape_markdown(result, version=2), parse_mode="MarkdownV2",
+        reply_markup=regenerate_keyboard("natal", request_id)
+    )
+
+async def regenerate_natal_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Кнопка «Сгенерировать заново» под натальной картой: новый разбор вместо сохранённого."""
+    query = update.callback_query
+    await query.answer()
+    args = reading_cache.recall(query.data.rsplit("_", 1)[-1])
+    if not args:
+        await context.bot.send_message(
+            update.effective_chat.id, "⚠️ Данные этого разбора больше не хранятся. Начните заново.",
+            reply_markup=main_menu_keyboard
+        )
+        return
+    try:
+        await send_natal_chart(update, context, args, refresh=True)
+    except Exception as e:
+        logger.error(f"Ошибка повторного расчета натальной карты: {e}")
+        await context.bot.send_message(
+            update.effective_chat.id,
+            escape_markdown("⚠️ Ошибка при расчете натальной карты. Попробуйте позже.", version=2),
+            parse_mode="MarkdownV2"
+        )
 
 async def handle_natal_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message or not update.message.text or not update.effective_chat:
         logger.error("Отсутствует сообщение или effective_chat в update")
         return
-    if "last_interaction" in context.user_data and (datetime.now() - context.user_data["last_interaction"]) > timedelta(minutes=10):
-        context.user_data.clear()
+    session = get_session(context, NatalSession)
+    if session is None:
+        return
+    if session.is_expired():
+        end_session(update, context, NatalSession)
         await update.message.reply_text(
             escape_markdown("⚠️ Время ожидания ввода истекло. Начните заново.", version=2),
             parse_mode="MarkdownV2",
@@ -31,14 +92,14 @@ async def handle_natal_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return
 
-    step = context.user_data.get("natal_step")
+    step = session.step
     text = update.message.text
     logger.debug(f"Обрабатываем ввод для шага {step}: {text}")
 
     if step == "name":
-        context.user_data["name"] = text
-        context.user_data["natal_step"] = "birth_date"
-        context.user_data["last_interaction"] = datetime.now()
+        session.name = text
+        session.step = "birth_date"
+        save_session(update, context, session)
         await update.message.reply_text("📅 Выберите дату рождения:")
         await start_calendar(update, context)
     elif step == "birth_date":
@@ -48,10 +109,7 @@ async def handle_natal_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 parse_mode="MarkdownV2"
             )
             return
-        context.user_data["birth_date"] = text
-        context.user_data["natal_step"] = "birth_time"
-        context.user_data["last_interaction"] = datetime.now()
-        await update.message.reply_text("⏰ Введите время рождения (ЧЧ:ММ):")
+        await natal_date_selected(update, context, text)
     elif step == "birth_time":
         if not validate_time(text):
             await update.message.reply_text(
@@ -59,9 +117,9 @@ async def handle_natal_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 parse_mode="MarkdownV2"
             )
             return
-        context.user_data["birth_time"] = text
-        context.user_data["natal_step"] = "birth_place"
-        context.user_data["last_interaction"] = datetime.now()
+        session.birth_time = text
+        session.step = "birth_place"
+        save_session(update, context, session)
         await update.message.reply_text("📍 Введите место рождения:")
     elif step == "birth_place":
         if not validate_place(text):
@@ -70,18 +128,12 @@ async def handle_natal_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 parse_mode="MarkdownV2"
             )
             return
-        context.user_data["birth_place"] = text
-        context.user_data["last_interaction"] = datetime.now()
+        session.birth_place = text
+        save_session(update, context, session)
 
         try:
-            result = await get_natal_chart(
-                context.user_data["name"],
-                context.user_data["birth_date"],
-                context.user_data["birth_time"],
-                context.user_data["birth_place"]
-            )
-            await update.message.reply_text(escape_markdown(result, version=2), parse_mode="MarkdownV2")
-            context.user_data.clear()
+            await send_natal_chart(update, context, [session.name, session.birth_date, session.birth_time, session.birth_place])
+            end_session(update, context, NatalSession)
             await update.message.reply_text("⏬ Главное меню:", reply_markup=main_menu_keyboard)
         except Exception as e:
             logger.error(f"Ошибка расчета натальной карты: {e}")
@@ -90,4 +142,4 @@ async def handle_natal_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 parse_mode="MarkdownV2",
                 reply_markup=main_menu_keyboard
             )
-            context.user_data.clear()
\ No newline at end of file
+            end_session(update, context, NatalSession)
@@ -17,20 +17,15 @@ async def numerology(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     context.user_data["awaiting_numerology"] = True
     await start_calendar(update, context)
 
-async def process_numerology(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not update.message or not update.effective_chat:
-        logger.error("Отсутствует сообщение или effective_chat в update")
-        return
-    birth_date = context.user_data.get("selected_date")
-    if not birth_date:
-        await update.message.reply_text(
-            escape_markdown("⚠️ Дата не выбрана. Используйте календарь.", version=2),
-            parse_mode="MarkdownV2",
-            reply_markup=main_menu_keyboard
-        )
+async def process_numerology(update: Update, context: ContextTypes.DEFAULT_TYPE, birth_date: str) -> None:
+    """Рассчитывает число жизненного пути по дате из календаря (обновление — callback, без message)."""
+    if not update.effective_chat:
+        logger.error("Отсутствует effective_chat в update")
         return
+    chat_id = update.effective_chat.id
     if not validate_date(birth_date):
-        await update.message.reply_text(
+        await context.bot.send_message(
+            chat_id,
             escape_markdown("⚠️ Неверный формат даты (ДД.ММ.ГГГГ).", version=2),
             parse_mode="MarkdownV2",
             reply_markup=main_menu_keyboard
@@ -39,9 +34,10 @@ async def process_numerology(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     try:
         life_path_number = calculate_life_path_number(birth_date)
-        interpretation = get_numerology_interpretation(life_path_number)
+        interpretation = await get_numerology_interpretation(life_path_number, update.effective_user.id)
         full_result = f"🔢 Ваше число жизненного пути: {life_path_number}\n\n{interpretation}"
-        await update.message.reply_text(
+        await context.bot.send_message(
+            chat_id,
             escape_markdown(full_result, version=2),
             parse_mode="MarkdownV2",
             reply_markup=main_menu_keyboard
@@ -50,8 +46,9 @@ async def process_numerology(update: Update, context: ContextTypes.DEFAULT_TYPE)
         context.user_data.pop("awaiting_numerology", None)
     except Exception as e:
         logger.error(f"Ошибка расчета числа жизненного пути: {e}")
-        await update.message.reply_text(
+        await context.bot.send_message(
+            chat_id,
             escape_markdown("⚠️ Ошибка при расчете. Попробуйте позже.", version=2),
             parse_mode="MarkdownV2",
             reply_markup=main_menu_keyboard
-        )
\ No newline at end of file
+        )
@@ -2,35 +2,64 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.helpers import escape_markdown  # Правильный импорт
 from services.database import add_subscription, remove_subscription
-from utils.zodiac import ZODIAC_SIGNS
+from utils.zodiac import ZODIAC_NAMES
+from utils.validation import validate_time
+from utils.delivery_slots import validate_timezone, DEFAULT_LOCAL_MINUTE
+from utils.dates import time_to_minutes
+import config
 from keyboards.main_menu import main_menu_keyboard
 import logging
 
 logger = logging.getLogger(__name__)
 
+
 async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.message or not update.effective_chat:
         logger.error("Отсутствует сообщение или effective_chat в update")
         return
     if not context.args or len(context.args) < 1:
         await update.message.reply_text(
-            escape_markdown(f"⚠️ Укажите знак зодиака: {', '.join(ZODIAC_SIGNS)}", version=2),
+            escape_markdown(
+                f"⚠️ Укажите знак зодиака: {', '.join(ZODIAC_NAMES)}\n"
+                f"Можно добавить время и часовой пояс: /subscribe Лев 07:30 Europe/Moscow",
+                version=2
+            ),
             parse_mode="MarkdownV2"
         )
         return
 
     zodiac = context.args[0].lower()
-    if zodiac not in [sign.lower() for sign in ZODIAC_SIGNS]:
+    if zodiac not in [sign.lower() for sign in ZODIAC_NAMES]:
+        await update.message.reply_text(
+            escape_markdown(f"⚠️ Неверный знак зодиака. Выберите из: {', '.join(ZODIAC_NAMES)}", version=2),
+            parse_mode="MarkdownV2"
+        )
+        return
+
+    delivery_time = context.args[1] if len(context.args) > 1 else None
+    tz_name = context.args[2] if len(context.args) > 2 else config.DEFAULT_TIMEZONE
+    if delivery_time and not validate_time(delivery_time):
+        await update.message.reply_text(
+            escape_markdown("⚠️ Неверный формат времени (ЧЧ:ММ).", version=2),
+            parse_mode="MarkdownV2"
+        )
+        return
+    if not validate_timezone(tz_name):
         await update.message.reply_text(
-            escape_markdown(f"⚠️ Неверный знак зодиака. Выберите из: {', '.join(ZODIAC_SIGNS)}", version=2),
+            escape_markdown("⚠️ Неизвестный часовой пояс. Пример: Europe/Moscow, Asia/Yekaterinburg.", version=2),
             parse_mode="MarkdownV2"
         )
         return
+    local_minute = time_to_minutes(delivery_time) if delivery_time else DEFAULT_LOCAL_MINUTE
 
     try:
-        await add_subscription(update.effective_chat.id, zodiac)
+        await add_subscription(update.effective_chat.id, zodiac, local_minute, tz_name)
         await update.message.reply_text(
-            escape_markdown(f"✅ Вы подписаны на ежедневные гороскопы для {zodiac}!", version=2),
+            escape_markdown(
+                f"✅ Вы подписаны на ежедневные гороскопы для {zodiac}! "
+                f"Время рассылки: около {local_minute // 60:02d}:{local_minute % 60:02d} ({tz_name})",
+                version=2
+            ),
             parse_mode="MarkdownV2",
             reply_markup=main_menu_keyboard
         )
@@ -1,13 +1,39 @@
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes
-from services.tarot_service import get_tarot_interpretation, generate_tarot_image
-from utils.loading_messages import send_processing_message, replace_processing_message
-from utils.telegram_helpers import send_photo_with_caption
+import config
+from services.tarot_service import pick_tarot_card, get_tarot_interpretation, caption_header
+from services.tarot_images import tarot_images
+from services.pipeline import Pipeline
+from utils.loading_messages import send_processing_message, replace_processing_message, ProgressEditor
 from utils.validation import sanitize_input, truncate_text
 
 logger = logging.getLogger(__name__)
 
+def compose_caption(card: str, text: str) -> str:
+    """Подпись к изображению: заголовок карты и толкование."""
+    logger.debug(f"Карта: {card}, Интерпретация: {text[:100]}...")
+    if not text:
+        raise Exception("Не удалось получить интерпретацию карты")
+    return f"{caption_header(card)}{text}"
+
+async def send_reading(bot, chat_id: int, card: str, caption: str, image):
+    """Отправляет расклад: фото с подписью, а если изображение не готово — только текст."""
+    if image is None:
+        return await bot.send_message(chat_id, caption)
+    return await tarot_images.send(bot, chat_id, card, caption, prepared=image)
+
+# Расклад: карта → [толкование, изображение] параллельно → подпись → отправка.
+# Если изображение не успело за TAROT_IMAGE_TIMEOUT, расклад уходит текстом
+tarot_pipeline = (
+    Pipeline("tarot")
+    .stage("card", pick_tarot_card)
+    .stage("text", get_tarot_interpretation, requires=("card", "on_progress"))
+    .stage("image", tarot_images.prepare, requires=("card",), timeout=config.TAROT_IMAGE_TIMEOUT, fallback=None)
+    .stage("caption", compose_caption, requires=("card", "text"))
+    .stage("message", send_reading, requires=("bot", "chat_id", "card", "caption", "image"))
+)
+
 async def tarot(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает команду /tarot и отправляет расклад карт Таро."""
     chat_id = update.effective_chat.id
@@ -22,32 +48,11 @@ async def tarot(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             parse_mode="MarkdownV2"
         )
 
-        # Получаем название карты и её интерпретацию
-        card, tarot_reading = await get_tarot_interpretation()
-        logger.debug(f"Карта: {card}, Интерпретация: {tarot_reading[:100]}...")
-        if not tarot_reading:
-            raise Exception("Не удалось получить интерпретацию карты")
-            
-        # Формируем подпись (без экранирования для простоты)
-        raw_caption = f"🎴 Карта: {card}\n\n{tarot_reading}"
-        logger.debug(f"Исходная подпись: {raw_caption[:200]}...")
-
-        # Обрезаем подпись до лимита Telegram (1000 символов с запасом)
-        caption = raw_caption
-        logger.debug(f"Обрезанная подпись: {len(caption)} символов")
-
-        # Генерируем изображение карты
-        image_url = await generate_tarot_image(card)
-        if not image_url:
-            raise Exception("Не удалось сгенерировать изображение карты Таро")
-
-        # Отправляем фото с подписью
-        await send_photo_with_caption(
-            context.bot,
-            chat_id,
-            image_url,
-            caption,
-            parse_mode=None  # Убираем parse_mode для избежания ошибок
+        # Толкование и изображение карты готовятся параллельно
+        await tarot_pipeline.run(
+            bot=context.bot,
+            chat_id=chat_id,
+            on_progress=ProgressEditor(context, processing_message),
         )
 
         # Удаляем сообщение о генерации
@@ -1,7 +1,8 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.helpers import escape_markdown  # Правильный импорт
-from services.user_profile import save_user_profile, get_user_profile
+from services.user_profile import save_user_profile
+from services.database import get_user_profile
 from utils.validation import validate_date, validate_time
 from keyboards.main_menu import main_menu_keyboard
 import logging
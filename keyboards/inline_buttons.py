@@ -27,6 +27,27 @@ horoscope_buttons = [
 ]
 horoscope_keyboard = InlineKeyboardMarkup(horoscope_buttons)
 
+def compatibility_signs_keyboard(prefix: str) -> InlineKeyboardMarkup:
+    """Те же кнопки знаков, что и для гороскопа, но с callback_data вида prefix + знак."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(button.text, callback_data=prefix + button.callback_data.split("_", 1)[1])
+         for button in row]
+        for row in horoscope_buttons
+    ])
+
+# Быстрая совместимость по знакам: переход к полному расчёту по натальным картам
+compatibility_result_keyboard = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🌌 Подробно по натальным картам", callback_data="compat_natal")],
+    [InlineKeyboardButton("🔙 Вернуться в меню", callback_data="back_to_menu")],
+])
+
+def regenerate_keyboard(kind: str, request_id: str) -> InlineKeyboardMarkup:
+    """Кнопка под разбором: сгенерировать заново именно его (callback_data regen-<kind>_<id>)."""
+    # В префиксе маршрута «_» допустим только в конце, поэтому вид отделён дефисом
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔄 Сгенерировать заново", callback_data=f"regen-{kind}_{request_id}")
+    ]])
+
 # Кнопки для карусели Таро
 def create_carousel_keyboard(buttons, prev_callback, next_callback):
     buttons.append([
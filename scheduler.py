@@ -1,36 +1,154 @@
+import asyncio
 import logging
+import time
+from datetime import datetime, timezone
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from telegram.ext import Application
-from services.database import get_subscriptions
+from services.database import (
+    iter_subscriptions, get_slot_groups, delete_old_deliveries, delete_expired_horoscopes,
+    get_unfinished_broadcast_runs, refresh_delivery_slots
+)
 from services.horoscope_service import get_horoscope
+from services.persistence import persistence
+from services.variant_pool import maintain_variant_pools
+from services.reading_cache import reading_cache
+from services.broadcast import Broadcast, TokenBucket, DEFAULT_RATE
+from utils.delivery_slots import current_slot, local_date
 from telegram import Bot
 
 logger = logging.getLogger(__name__)
 
-async def send_daily_horoscopes(app: Application) -> None:
-    """Отправляет ежедневные гороскопы подписанным пользователям."""
+RUN_PREFIX = "daily_horoscope"
+
+# Фоновая задача обслуживания пулов готовых текстов
+_pool_maintenance = None
+
+# Общий лимит скорости для всех слотов: соседние слоты могут рассылаться одновременно
+delivery_bucket = TokenBucket(DEFAULT_RATE)
+
+async def generate_daily_horoscopes(keys) -> dict:
+    """
+    Генерирует гороскопы на день для каждой пары (знак, дата) параллельно — не более одного запроса на пару.
+
+    Тексты попадают в кэш гороскопов и используются интерактивным разделом до конца дня.
+
+    Returns:
+        dict: (знак, дата) -> текст гороскопа (пары с ошибкой генерации пропускаются)
+    """
+    keys = list(keys)
+    results = await asyncio.gather(
+        *(get_horoscope(sign, "today", day=day) for sign, day in keys), return_exceptions=True
+    )
+    horoscopes = {}
+    for key, result in zip(keys, results):
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка генерации гороскопа для {key[0]}: {result}")
+        else:
+            horoscopes[key] = result
+    return horoscopes
+
+def slot_run_id(slot: int, now: datetime = None) -> str:
+    """Идентификатор рассылки слота за текущие UTC-сутки."""
+    now = now or datetime.now(timezone.utc)
+    return f"{RUN_PREFIX}:{now.date().isoformat()}:{slot}"
+
+async def send_daily_horoscopes(app: Application, slot: int = None, run_id: str = None) -> None:
+    """Отправляет ежедневные гороскопы подписчикам, чей UTC-слот рассылки наступил."""
     bot = app.bot
+    slot = current_slot() if slot is None else slot
     try:
-        subscriptions = await get_subscriptions()
-        for chat_id, zodiac in subscriptions:
-            try:
-                horoscope = await get_horoscope(zodiac, "today")
-                await bot.send_message(chat_id, f"🌟 Гороскоп для {zodiac} на сегодня:\n{horoscope}")
-                logger.debug(f"Гороскоп отправлен пользователю {chat_id} для знака {zodiac}")
-            except Exception as e:
-                logger.error(f"Ошибка отправки гороскопа пользователю {chat_id}: {e}")
+        groups = await get_slot_groups(slot)
     except Exception as e:
         logger.error(f"Ошибка получения подписок: {e}")
+        return
+    if not groups:
+        return
+
+    # Знак и местная дата подписчика определяют текст гороскопа; список подписчиков
+    # в память не загружается — получатели читаются из БД порциями во время рассылки
+    dates = {tz_name: local_date(tz_name) for _, tz_name in groups}
+    keys = {(zodiac.strip().capitalize(), dates[tz_name]) for zodiac, tz_name in groups}
+    horoscopes = await generate_daily_horoscopes(keys)
+    logger.info(f"Слот {slot}: групп подписчиков {len(keys)}, гороскопов: {len(horoscopes)}")
+
+    async def messages():
+        async for chat_id, zodiac, tz_name in iter_subscriptions(slot=slot):
+            sign = zodiac.strip().capitalize()
+            # Подписчик с новым поясом мог появиться после выборки групп
+            day = dates.get(tz_name) or local_date(tz_name)
+            horoscope = horoscopes.get((sign, day))
+            if horoscope is None:
+                continue
+            yield chat_id, f"🌟 Гороскоп для {sign} на сегодня:\n{horoscope}"
+
+    # Повторный запуск того же слота в те же сутки продолжит рассылку с контрольной точки
+    broadcast = Broadcast(bot, run_id or slot_run_id(slot), bucket=delivery_bucket)
+    await broadcast.run(messages())
+
+async def daily_maintenance() -> None:
+    """
+    Пересчитывает слоты (летнее/зимнее время), удаляет старые контрольные точки рассылок
+    и состояния диалогов, ограничивает кэш разборов, пополняет пулы готовых текстов.
+    """
+    try:
+        await refresh_delivery_slots()
+        await delete_old_deliveries(int(time.time()) - 7 * 24 * 3600)
+        await persistence.delete_stale(int(time.time()) - 7 * 24 * 3600)
+        await delete_expired_horoscopes(int(time.time()))
+        await reading_cache.maintain()
+    except Exception as e:
+        logger.warning(f"Ошибка обслуживания рассылок: {e}")
+    # Показы вариантов записываются в БД, недостающие и устаревшие тексты догенерируются.
+    # На пустой базе это больше сотни запросов к OpenAI подряд, поэтому пулы пополняются в фоне
+    _start_pool_maintenance()
+
+def _start_pool_maintenance() -> None:
+    """Запускает обслуживание пулов в фоне, если предыдущее ещё не закончилось."""
+    global _pool_maintenance
+    if _pool_maintenance is not None and not _pool_maintenance.done():
+        logger.info("Обслуживание пулов ещё идёт, новый запуск пропущен")
+        return
+    _pool_maintenance = asyncio.get_running_loop().create_task(_maintain_pools())
+
+async def _maintain_pools() -> None:
+    try:
+        await maintain_variant_pools()
+    except Exception as e:
+        logger.error(f"Ошибка обслуживания пулов готовых текстов: {e}")
+
+async def resume_unfinished_broadcasts(app: Application) -> None:
+    """Продолжает рассылки слотов, прерванные падением процесса за последние сутки."""
+    try:
+        run_ids = await get_unfinished_broadcast_runs(RUN_PREFIX, int(time.time()) - 24 * 3600)
+    except Exception as e:
+        logger.error(f"Ошибка поиска незавершённых рассылок: {e}")
+        return
+    for run_id in run_ids:
+        logger.info(f"Найдена незавершённая рассылка {run_id}, продолжаем")
+        try:
+            await send_daily_horoscopes(app, slot=int(run_id.rsplit(":", 1)[1]), run_id=run_id)
+        except Exception as e:
+            logger.error(f"Ошибка продолжения рассылки {run_id}: {e}")
 
 async def schedule_daily_messages(app: Application) -> None:
-    """Настраивает ежедневную отправку сообщений."""
-    scheduler = AsyncIOScheduler()
+    """Настраивает ежедневную отправку сообщений: небольшая рассылка в каждый минутный слот."""
+    scheduler = AsyncIOScheduler(timezone=timezone.utc)
     scheduler.add_job(
         send_daily_horoscopes,
-        trigger=CronTrigger(hour=8, minute=0),
+        trigger=CronTrigger(minute="*", timezone=timezone.utc),
         args=[app],
-        misfire_grace_time=300
+        misfire_grace_time=30,
+        max_instances=5
+    )
+    scheduler.add_job(
+        daily_maintenance,
+        trigger=CronTrigger(hour=0, minute=5, timezone=timezone.utc),
+        misfire_grace_time=3600
     )
     scheduler.start()
-    logger.info("Планировщик ежедневных сообщений запущен")
\ No newline at end of file
+    logger.info("Планировщик ежедневных сообщений запущен")
+
+    # Прерванные рассылки продолжаются до обслуживания, чтобы подписчики не ждали
+    await resume_unfinished_broadcasts(app)
+    await daily_maintenance()
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from telegram import Bot
+from telegram.error import RetryAfter, Forbidden, BadRequest, NetworkError
+from services.database import get_delivered_chat_ids, save_deliveries, start_broadcast_run, finish_broadcast_run
+
+logger = logging.getLogger(__name__)
+
+# Глобальный лимит Telegram — около 30 сообщений в секунду; оставляем запас
+DEFAULT_RATE = 25.0
+DEFAULT_SENDERS = 10
+MAX_RETRIES = 3
+# Контрольная точка сохраняется пачками
+CHECKPOINT_BATCH = 100
+CHECKPOINT_INTERVAL = 2.0
+
+
+def _seconds(value) -> float:
+    """retry_after может быть числом или timedelta в зависимости от версии python-telegram-bot."""
+    return value.total_seconds() if hasattr(value, "total_seconds") else float(value)
+
+
+class TokenBucket:
+    """
+    Ограничитель скорости «ведро токенов» с адаптацией к ответам 429.
+
+    При RetryAfter все отправители приостанавливаются, а скорость снижается; после серии
+    успешных отправок она постепенно возвращается к целевой.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, min_rate: float = 1.0):
+        self.target_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._successes = 0
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self) -> None:
+        self._successes += 1
+        if self._successes >= 100 and self.rate < self.target_rate:
+            self.rate = min(self.target_rate, self.rate * 1.1)
+            self._successes = 0
+
+    def on_rate_limited(self, retry_after: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        self._tokens = 0
+        self.rate = max(self.min_rate, self.rate * 0.7)
+        self._successes = 0
+
+
+class Broadcast:
+    """
+    Рассылка сообщений с ограничением скорости, параллельными отправителями и контрольными точками.
+
+    Каждый обработанный chat_id (доставлено или окончательная ошибка) записывается в таблицу
+    broadcast_deliveries, поэтому повторный запуск с тем же run_id продолжает рассылку с места
+    остановки. Контрольная точка пишется пачками, так что после сбоя повторно могут уйти
+    не более CHECKPOINT_BATCH сообщений.
+    """
+
+    def __init__(self, bot: Bot, run_id: str, rate: float = DEFAULT_RATE, senders: int = DEFAULT_SENDERS,
+                 max_retries: int = MAX_RETRIES, bucket: TokenBucket = None):
+        self.bot = bot
+        self.run_id = run_id
+        self.senders = senders
+        self.max_retries = max_retries
+        # Общий bucket позволяет нескольким одновременным рассылкам делить лимит Telegram
+        self.bucket = bucket or TokenBucket(rate)
+        self._queue = asyncio.Queue(maxsize=senders * 10)
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self.stats = {
+            "run_id": run_id, "total": 0, "sent": 0, "skipped": 0, "failed": 0,
+            "retries": 0, "rate_limited": 0, "elapsed": 0.0, "per_second": 0.0,
+        }
+
+    async def run(self, messages) -> dict:
+        """
+        Отправляет сообщения и возвращает статистику прогона.
+
+        Args:
+            messages: Итерируемый объект (синхронный или асинхронный) пар (chat_id, text)
+
+        Returns:
+            dict: Отправлено, пропущено (доставлено ранее), ошибки, повторы, 429, скорость
+        """
+        started = time.monotonic()
+        await start_broadcast_run(self.run_id)
+        done = await get_delivered_chat_ids(self.run_id)
+        if done:
+            logger.info(f"Рассылка {self.run_id} продолжается: {len(done)} получателей уже обработано")
+
+        workers = [asyncio.create_task(self._sender()) for _ in range(self.senders)]
+        try:
+            if hasattr(messages, "__aiter__"):
+                async for chat_id, text in messages:
+                    await self._enqueue(chat_id, text, done)
+            else:
+                for chat_id, text in messages:
+                    await self._enqueue(chat_id, text, done)
+            await self._queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self._flush()
+        await finish_broadcast_run(self.run_id)
+
+        self.stats["elapsed"] = round(time.monotonic() - started, 2)
+        if self.stats["elapsed"]:
+            self.stats["per_second"] = round(self.stats["sent"] / self.stats["elapsed"], 2)
+        logger.info(f"Рассылка {self.run_id} завершена: {self.stats}")
+        return self.stats
+
+    async def _enqueue(self, chat_id: int, text: str, done: set) -> None:
+        self.stats["total"] += 1
+        if chat_id in done:
+            self.stats["skipped"] += 1
+            return
+        await self._queue.put((chat_id, text))
+
+    async def _sender(self) -> None:
+        while True:
+            chat_id, text = await self._queue.get()
+            try:
+                status = await self._send(chat_id, text)
+                self.stats["sent" if status == "sent" else "failed"] += 1
+                self._pending.append((chat_id, status, int(time.time())))
+                if len(self._pending) >= CHECKPOINT_BATCH or time.monotonic() - self._last_flush >= CHECKPOINT_INTERVAL:
+                    await self._flush()
+            except Exception as e:
+                # Сообщение не помечается обработанным и будет отправлено при повторном запуске
+                self.stats["failed"] += 1
+                logger.error(f"Ошибка отправки сообщения пользователю {chat_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, chat_id: int, text: str) -> str:
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, text)
+                self.bucket.on_success()
+                return "sent"
+            except RetryAfter as e:
+                retry_after = _seconds(e.retry_after)
+                self.stats["rate_limited"] += 1
+                logger.warning(f"Telegram ограничил скорость рассылки, пауза {retry_after} с")
+                self.bucket.on_rate_limited(retry_after)
+            except (Forbidden, BadRequest) as e:
+                # Бот заблокирован или чат не существует — повтор бесполезен
+                logger.info(f"Пользователь {chat_id} недоступен для рассылки: {e}")
+                return "unreachable"
+            except NetworkError as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                self.stats["retries"] += 1
+                logger.warning(f"Временная ошибка отправки пользователю {chat_id} (попытка {attempt}): {e}")
+                await asyncio.sleep(2 ** attempt)
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self._last_flush = time.monotonic()
+        try:
+            await save_deliveries(self.run_id, pending)
+        except Exception:
+            # Вернём записи в буфер, чтобы сохранить их при следующей попытке
+            self._pending = pending + self._pending
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTTLCache:
+    """
+    Внутрипроцессный кэш с абсолютным временем истечения записей.
+
+    Одновременные промахи по одному ключу объединяются в один вызов загрузчика
+    (single-flight): остальные корутины ждут тот же результат.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024):
+        self.name = name
+        self.maxsize = maxsize
+        self._data: dict = {}  # key -> (value, expires_at)
+        self._inflight: dict = {}  # key -> asyncio.Task загрузки
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Возвращает значение, если оно есть и ещё не истекло."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.time() >= expires_at:
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float) -> None:
+        """Сохраняет значение до момента expires_at (unix-время)."""
+        if key not in self._data and len(self._data) >= self.maxsize:
+            self._evict()
+        self._data[key] = (value, expires_at)
+
+    def is_loading(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], expires_at: float) -> Any:
+        """
+        Возвращает значение из кэша или загружает его через loader.
+
+        Args:
+            key: Ключ кэша
+            loader: Корутина-фабрика, вычисляющая значение
+            expires_at: Unix-время истечения новой записи
+
+        Returns:
+            Any: Значение из кэша или результат loader
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        # Загрузка идёт в отдельной задаче: отмена вызвавшего (повторное нажатие, таймаут
+        # обработчика) не отменяет её и не передаёт CancelledError остальным ожидающим
+        task = asyncio.get_running_loop().create_task(self._load(key, loader, expires_at))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._loaded(key, t))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], expires_at: float) -> Any:
+        value = await loader()
+        self.set(key, value, expires_at)
+        return value
+
+    def _loaded(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Ошибка передана ожидающим; если все они отменены, она не должна считаться непрочитанной
+            task.exception()
+
+    def stats(self) -> dict:
+        """Возвращает статистику кэша."""
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+    def _evict(self) -> None:
+        """Удаляет истёкшие записи, а если их нет — самую раннюю по сроку."""
+        now = time.time()
+        expired = [k for k, (_, expires_at) in self._data.items() if expires_at <= now]
+        for k in expired:
+            del self._data[k]
+        if not expired and self._data:
+            oldest = min(self._data, key=lambda k: self._data[k][1])
+            del self._data[oldest]
+            logger.debug(f"Кэш {self.name}: вытеснена запись {oldest}")
+
+
+class LRUCache:
+    """
+    Ограниченный LRU-кэш с временем жизни записей и кэшированием отсутствующих значений.
+
+    Значение None кэшируется как отрицательный результат со своим (обычно более коротким)
+    временем жизни. Чтобы чтение, начатое до инвалидации, не вернуло в кэш устаревшие
+    данные, set принимает epoch, полученный до чтения, и игнорирует запись, если с тех пор
+    была инвалидация.
+    """
+
+    def __init__(self, name: str, maxsize: int = 10000, ttl: float = 3600, negative_ttl: float = 300):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self.epoch = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> tuple:
+        """
+        Returns:
+            tuple: (найдено ли значение, значение)
+        """
+        entry = self._data.get(key)
+        if entry is None or time.monotonic() >= entry[1]:
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+        self._data.move_to_end(key)
+        if entry[0] is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return True, entry[0]
+
+    def set(self, key: Hashable, value: Any, epoch: int = None) -> None:
+        """Сохраняет значение; если epoch устарел, запись пропускается."""
+        if epoch is not None and epoch != self.epoch:
+            return
+        ttl = self.negative_ttl if value is None else self.ttl
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Удаляет запись и делает недействительными начатые чтения."""
+        self.epoch += 1
+        self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        """Возвращает статистику кэша."""
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.negative_hits) / lookups, 3) if lookups else 0.0,
+        }
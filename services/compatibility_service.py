@@ -1,8 +1,27 @@
-from services.openai_service import ask_openai
+import asyncio
+import logging
+from services.openai_service import ask_openai, stream_openai, close_openai
+from services.database import init_db, close_db
+from services.reading_cache import reading_cache, compatibility_key
+from services.variant_pool import VariantPool
+from utils.zodiac import ZODIAC_NAMES
+
+logger = logging.getLogger(__name__)
 
 async def get_compatibility(name1: str, birth1: str, time1: str, place1: str,
-                           name2: str, birth2: str, time2: str, place2: str) -> str:
-    """Запрашивает совместимость по натальной карте у OpenAI."""
+                           name2: str, birth2: str, time2: str, place2: str, on_progress=None,
+                           refresh: bool = False) -> str:
+    """
+    Запрашивает совместимость по натальной карте у OpenAI (потоково, если передан on_progress).
+
+    Разбор для той же пары (в любом порядке) берётся из кэша; refresh=True генерирует его заново.
+    """
+    key = compatibility_key((name1, birth1, time1, place1), (name2, birth2, time2, place2))
+    if not refresh:
+        cached = await reading_cache.get(key)
+        if cached is not None:
+            return cached
+
     prompt = (
         f"Ты — хранитель древних астрологических знаний, способный видеть нити судьбы. "
         f"Перед тобой открыты звёздные карты двух душ: {name1} (рождённый/ая {birth1} в {time1}, {place1}) "
@@ -15,16 +34,66 @@ async def get_compatibility(name1: str, birth1: str, time1: str, place1: str,
         f"Создай ответ, который затронет самые глубокие струны души и откроет завесу тайны их союза. "
         f"Не используй Markdown-форматирование (например, ###, **, *, # и т.д.). "
     )
-    return await ask_openai(prompt)  # Added await for async call
+    if on_progress:
+        response = await stream_openai(prompt, on_progress=on_progress)
+    else:
+        response = await ask_openai(prompt)  # Added await for async call
+    await reading_cache.put(key, "compatibility", response)
+    return response
+
+def pair_key(sign1: str, sign2: str) -> str:
+    """Ключ неупорядоченной пары знаков: Овен+Лев и Лев+Овен — одна запись."""
+    return "+".join(sorted((sign1, sign2)))
+
+async def get_zodiac_compatibility(sign1: str, sign2: str, on_progress=None) -> str:
+    """
+    Возвращает совместимость знаков из заранее посчитанной матрицы пар.
+
+    Пара, которой ещё нет в матрице, генерируется сразу (потоково, если передан on_progress).
+    """
+    return await zodiac_compatibility_pool.get(pair_key(sign1, sign2), on_progress=on_progress)
 
-def get_zodiac_compatibility(sign1: str, sign2: str) -> str:
+async def is_zodiac_pair_ready(sign1: str, sign2: str) -> bool:
+    """Есть ли пара знаков в матрице (ответ будет мгновенным)."""
+    return await zodiac_compatibility_pool.has_variants(pair_key(sign1, sign2))
+
+async def _generate_zodiac_compatibility(key: str, on_progress=None) -> str:
     """Запрашивает совместимость по знакам зодиака у OpenAI."""
+    sign1, sign2 = key.split("+")
     prompt = (
         f"Представь, что ты древний мудрец-астролог с тысячелетним опытом. Раскрой мистическую связь между огненными/водными/воздушными/земными энергиями знаков {sign1} и {sign2}. "
         f"Опиши их танец энергий словами, наполненными магией и глубокой мудростью веков. "
         f"Какие космические силы соединяют эти души? Какие испытания звезды предначертали им? "
         f"Какие тайные ритуалы могут усилить их гармонию? "
         f"Используй метафоры элементов, небесных тел и мистических сил. "
-        f"Сделай ответ поэтичным, загадочным и наполненным мудростью звёзд."
+        f"Сделай ответ поэтичным, загадочным и наполненным мудростью звёзд. "
+        f"Не используй Markdown-форматирование (например, ###, **, *, # и т.д.)."
     )
-    return ask_openai(prompt)
\ No newline at end of file
+    if on_progress:
+        return await stream_openai(prompt, on_progress=on_progress)
+    return await ask_openai(prompt)
+
+# Матрица 12×12 симметрична: 78 неупорядоченных пар, по одному тексту на пару.
+# Генерируется при первом запросе пары (или заранее: python -m services.compatibility_service)
+# и обновляется раз в VARIANT_MAX_AGE при ежедневном обслуживании пулов
+zodiac_compatibility_pool = VariantPool(
+    "zodiac_compatibility",
+    _generate_zodiac_compatibility,
+    keys=[pair_key(sign1, sign2) for i, sign1 in enumerate(ZODIAC_NAMES) for sign2 in ZODIAC_NAMES[i:]],
+    size=1,
+)
+
+
+async def main() -> None:
+    await init_db()
+    try:
+        generated = await zodiac_compatibility_pool.maintain()
+        logger.info(f"Матрица совместимости готова: новых пар {generated}")
+    finally:
+        await close_openai()
+        await close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    asyncio.run(main())
@@ -1,44 +1,124 @@
 # Убедитесь, что aiosqlite установлен: `pip install aiosqlite`
 import aiosqlite
+import asyncio
 import logging
+from contextlib import asynccontextmanager
+import time
 import config
+from typing import Optional
+from services.write_queue import WriteBehindQueue
+from services.cache import LRUCache
+from services.migrations import run_migrations
+from utils.delivery_slots import delivery_slot, DEFAULT_LOCAL_MINUTE
+from utils.dates import day_number_to_date, minutes_to_time
+from utils.profile import profile_columns
 
 logger = logging.getLogger(__name__)
 
+# Размер отображаемой в память части файла БД (байты)
+MMAP_SIZE = 64 * 1024 * 1024
+# Число подготовленных выражений, которые sqlite3 кэширует на каждом соединении
+CACHED_STATEMENTS = 256
+
+class ConnectionManager:
+    """
+    Долгоживущие соединения с SQLite: одно для записи и одно для чтения.
+
+    Соединения открываются один раз в init_db, работают в режиме WAL (чтение не
+    блокируется записью) и переиспользуют подготовленные выражения. Запись
+    сериализуется блокировкой, чтобы транзакции разных корутин не смешивались.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writer = None
+        self._reader = None
+        self._write_lock = asyncio.Lock()
+
+    async def _connect(self, read_only: bool) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path, cached_statements=CACHED_STATEMENTS)
+        await conn.execute("PRAGMA journal_mode=WAL")
+        # Запись подтверждается вызывающему только после фиксации (групповая фиксация WriteBehindQueue),
+        # поэтому соединение записи делает полный fsync: подтверждённая строка переживает отключение питания.
+        # Коммиты идут пачками, так что fsync на транзакцию обходится дёшево
+        await conn.execute(f"PRAGMA synchronous={'NORMAL' if read_only else 'FULL'}")
+        await conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        await conn.execute("PRAGMA temp_store=MEMORY")
+        await conn.execute("PRAGMA busy_timeout=5000")
+        if read_only:
+            await conn.execute("PRAGMA query_only=1")
+        return conn
+
+    async def open(self) -> None:
+        """Открывает соединения (повторный вызов ничего не делает)."""
+        if self._writer is None:
+            self._writer = await self._connect(read_only=False)
+        if self._reader is None:
+            self._reader = await self._connect(read_only=True)
+
+    async def close(self) -> None:
+        """Закрывает соединения, дождавшись текущей записи."""
+        async with self._write_lock:
+            for conn in (self._reader, self._writer):
+                if conn is not None:
+                    await conn.close()
+            self._reader = self._writer = None
+        logger.info("Соединения с базой данных закрыты")
+
+    @asynccontextmanager
+    async def write(self):
+        """Соединение для записи; при ошибке незавершённая транзакция откатывается."""
+        await self.open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+    @asynccontextmanager
+    async def read(self):
+        """Соединение только для чтения."""
+        await self.open()
+        yield self._reader
+
+db = ConnectionManager(config.DB_PATH)
+
+# Групповая фиксация записей подписок и профилей
+write_queue = WriteBehindQueue(db)
+
+# Кэш профилей (в том числе отсутствующих) перед get_user_profile
+profile_cache = LRUCache("profiles", maxsize=config.PROFILE_CACHE_SIZE, ttl=config.PROFILE_CACHE_TTL)
+
+async def close_db() -> None:
+    """Фиксирует отложенные записи и закрывает соединения с базой данных."""
+    await write_queue.stop()
+    await db.close()
+
 async def init_db() -> None:
-    """Инициализирует базу данных."""
+    """Инициализирует базу данных и применяет миграции схемы."""
     try:
-        async with aiosqlite.connect(config.DB_PATH) as conn:
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS subscriptions (
-                    chat_id INTEGER PRIMARY KEY,
-                    zodiac TEXT NOT NULL
-                )
-            ''')
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS profiles (
-                    chat_id INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    birth_date TEXT NOT NULL,
-                    birth_time TEXT NOT NULL
-                )
-            ''')
-            await conn.commit()
-            logger.info("База данных инициализирована")
+        await db.open()
+        async with db.write() as conn:
+            version = await run_migrations(conn)
+            logger.info(f"База данных инициализирована, версия схемы {version}")
     except Exception as e:
         logger.error(f"Ошибка инициализации базы данных: {e}")
         raise
 
-async def add_subscription(chat_id: int, zodiac: str) -> None:
-    """Добавляет подписку пользователя."""
+async def add_subscription(chat_id: int, zodiac: str, local_minute: int = DEFAULT_LOCAL_MINUTE,
+                           timezone: str = None) -> None:
+    """Добавляет подписку пользователя с временем рассылки (минуты местного времени) и часовым поясом."""
+    timezone = timezone or config.DEFAULT_TIMEZONE
+    slot = delivery_slot(chat_id, local_minute, timezone)
     try:
-        async with aiosqlite.connect(config.DB_PATH) as conn:
-            await conn.execute(
-                "INSERT OR REPLACE INTO subscriptions (chat_id, zodiac) VALUES (?, ?)",
-                (chat_id, zodiac)
-            )
-            await conn.commit()
-            logger.debug(f"Подписка добавлена: {chat_id}, {zodiac}")
+        await write_queue.submit(
+            chat_id,
+            "INSERT OR REPLACE INTO subscriptions (chat_id, zodiac, local_minute, timezone, delivery_slot) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (chat_id, zodiac.strip().lower(), local_minute, timezone, slot)
+        )
+        logger.debug(f"Подписка добавлена: {chat_id}, {zodiac}, слот {slot}")
     except Exception as e:
         logger.error(f"Ошибка добавления подписки: {e}")
         raise
@@ -46,44 +126,395 @@ async def add_subscription(chat_id: int, zodiac: str) -> None:
 async def remove_subscription(chat_id: int) -> None:
     """Удаляет подписку пользователя."""
     try:
-        async with aiosqlite.connect(config.DB_PATH) as conn:
-            await conn.execute("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,))
-            await conn.commit()
-            logger.debug(f"Подписка удалена: {chat_id}")
+        await write_queue.submit(chat_id, "DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,))
+        logger.debug(f"Подписка удалена: {chat_id}")
     except Exception as e:
         logger.error(f"Ошибка удаления подписки: {e}")
         raise
 
+async def iter_subscriptions(batch_size: int = None, zodiac: str = None, slot: int = None):
+    """
+    Асинхронно перебирает подписки (chat_id, zodiac, timezone) порциями.
+
+    Порции выбираются по ключу (chat_id > последнего выданного), поэтому в памяти
+    одновременно находится не больше batch_size строк, а каждый запрос идёт по индексу.
+
+    Args:
+        batch_size: Строк за один запрос (по умолчанию config.SUBSCRIPTION_BATCH_SIZE)
+        zodiac: Только подписки на этот знак
+        slot: Только подписки этого UTC-слота рассылки
+    """
+    batch_size = batch_size or config.SUBSCRIPTION_BATCH_SIZE
+    conditions, params = ["chat_id > ?"], []
+    if zodiac is not None:
+        conditions.append("zodiac = ?")
+        params.append(zodiac.strip().lower())
+    if slot is not None:
+        conditions.append("delivery_slot = ?")
+        params.append(slot)
+    sql = (
+        f"SELECT chat_id, zodiac, timezone FROM subscriptions WHERE {' AND '.join(conditions)} "
+        f"ORDER BY chat_id LIMIT ?"
+    )
+    # chat_id групп отрицательные, поэтому начинаем с минимального 64-битного значения
+    last_chat_id = -2 ** 63
+    while True:
+        try:
+            async with db.read() as conn:
+                cursor = await conn.execute(sql, (last_chat_id, *params, batch_size))
+                rows = await cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка получения подписок: {e}")
+            raise
+        for row in rows:
+            yield row
+        if len(rows) < batch_size:
+            return
+        last_chat_id = rows[-1][0]
+
 async def get_subscriptions() -> list:
-    """Возвращает список всех подписок."""
+    """Возвращает список всех подписок (chat_id, zodiac); для больших выборок используйте iter_subscriptions."""
+    return [(chat_id, zodiac) async for chat_id, zodiac, _ in iter_subscriptions()]
+
+async def get_slot_groups(slot: int) -> list:
+    """Возвращает различные пары (zodiac, timezone) подписчиков UTC-слота рассылки."""
     try:
-        async with aiosqlite.connect(config.DB_PATH) as conn:
-            cursor = await conn.execute("SELECT chat_id, zodiac FROM subscriptions")
+        async with db.read() as conn:
+            cursor = await conn.execute(
+                "SELECT DISTINCT zodiac, timezone FROM subscriptions WHERE delivery_slot = ?", (slot,)
+            )
             return await cursor.fetchall()
     except Exception as e:
-        logger.error(f"Ошибка получения подписок: {e}")
+        logger.error(f"Ошибка получения групп подписчиков слота {slot}: {e}")
         raise
 
-async def save_user_profile(chat_id: int, name: str, birth_date: str, birth_time: str) -> None:
-    """Сохраняет профиль пользователя."""
+async def refresh_delivery_slots() -> None:
+    """Пересчитывает UTC-слоты рассылки (нужно после перехода на летнее/зимнее время)."""
     try:
-        async with aiosqlite.connect(config.DB_PATH) as conn:
-            await conn.execute(
-                "INSERT OR REPLACE INTO profiles (chat_id, name, birth_date, birth_time) VALUES (?, ?, ?, ?)",
-                (chat_id, name, birth_date, birth_time)
-            )
-            await conn.commit()
-            logger.debug(f"Профиль сохранен: {chat_id}, {name}")
+        async with db.write() as conn:
+            cursor = await conn.execute("SELECT chat_id, local_minute, timezone, delivery_slot FROM subscriptions")
+            changes = []
+            for chat_id, local_minute, timezone, slot in await cursor.fetchall():
+                new_slot = delivery_slot(chat_id, local_minute, timezone)
+                if new_slot != slot:
+                    changes.append((new_slot, chat_id))
+            if changes:
+                await conn.executemany("UPDATE subscriptions SET delivery_slot = ? WHERE chat_id = ?", changes)
+                await conn.commit()
+            logger.info(f"Слоты рассылки пересчитаны, изменено: {len(changes)}")
+    except Exception as e:
+        logger.error(f"Ошибка пересчёта слотов рассылки: {e}")
+        raise
+
+async def save_user_profile(chat_id: int, name: str, birth_date: str, birth_time: str, birth_place: str = "") -> None:
+    """Сохраняет профиль пользователя (дата 'ДД.ММ.ГГГГ', время 'ЧЧ:ММ')."""
+    birth_day, birth_minute, zodiac, life_path = profile_columns(birth_date, birth_time)
+    try:
+        profile_cache.invalidate(chat_id)
+        await write_queue.submit(
+            chat_id,
+            "INSERT OR REPLACE INTO profiles (chat_id, name, birth_day, birth_minute, birth_place, zodiac, life_path) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (chat_id, name, birth_day, birth_minute, birth_place, zodiac, life_path)
+        )
+        profile_cache.invalidate(chat_id)
+        logger.debug(f"Профиль сохранен: {chat_id}, {name}")
     except Exception as e:
         logger.error(f"Ошибка сохранения профиля: {e}")
         raise
 
 async def get_user_profile(chat_id: int) -> tuple:
-    """Возвращает профиль пользователя."""
+    """Возвращает профиль пользователя (имя, дата, время, место) — из кэша, если он там есть."""
+    found, profile = profile_cache.get(chat_id)
+    if found:
+        return profile
     try:
-        async with aiosqlite.connect(config.DB_PATH) as conn:
-            cursor = await conn.execute("SELECT name, birth_date, birth_time FROM profiles WHERE chat_id = ?", (chat_id,))
-            return await cursor.fetchone()
+        # Незафиксированное сохранение профиля этого чата должно быть видно при чтении
+        await write_queue.barrier(chat_id)
+        epoch = profile_cache.epoch
+        async with db.read() as conn:
+            cursor = await conn.execute(
+                "SELECT name, birth_day, birth_minute, birth_place, legacy_birth_date, legacy_birth_time "
+                "FROM profiles WHERE chat_id = ?", (chat_id,)
+            )
+            row = await cursor.fetchone()
+        if row:
+            name, birth_day, birth_minute, birth_place, legacy_date, legacy_time = row
+            # Неразобранные при миграции значения показываются как были введены
+            profile = (
+                name,
+                day_number_to_date(birth_day) if birth_day is not None else legacy_date or "",
+                minutes_to_time(birth_minute) if birth_minute is not None else legacy_time or "",
+                birth_place
+            )
+        else:
+            profile = None
+        profile_cache.set(chat_id, profile, epoch=epoch)
+        return profile
     except Exception as e:
         logger.error(f"Ошибка получения профиля: {e}")
-        raise
\ No newline at end of file
+        raise
+
+async def get_profile_chat_ids(zodiac: str = None, life_path: int = None) -> list:
+    """Возвращает chat_id профилей сегмента: по знаку зодиака и/или числу жизненного пути (по индексам)."""
+    conditions, params = [], []
+    if zodiac is not None:
+        conditions.append("zodiac = ?")
+        params.append(zodiac.strip().lower())
+    if life_path is not None:
+        conditions.append("life_path = ?")
+        params.append(life_path)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    try:
+        async with db.read() as conn:
+            cursor = await conn.execute(f"SELECT chat_id FROM profiles{where}", params)
+            return [row[0] for row in await cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка выборки профилей: {e}")
+        raise
+
+async def start_broadcast_run(run_id: str) -> None:
+    """Отмечает начало рассылки run_id (повторный старт сохраняет исходное время)."""
+    try:
+        async with db.write() as conn:
+            await conn.execute(
+                "INSERT OR IGNORE INTO broadcast_runs (run_id, started_at) VALUES (?, ?)",
+                (run_id, int(time.time()))
+            )
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка регистрации рассылки: {e}")
+        raise
+
+async def finish_broadcast_run(run_id: str) -> None:
+    """Отмечает завершение рассылки run_id."""
+    try:
+        async with db.write() as conn:
+            await conn.execute("UPDATE broadcast_runs SET finished_at = ? WHERE run_id = ?", (int(time.time()), run_id))
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка завершения рассылки: {e}")
+        raise
+
+async def get_unfinished_broadcast_runs(prefix: str, since: int) -> list:
+    """Возвращает run_id рассылок с префиксом prefix, начатых после since и не завершённых."""
+    try:
+        async with db.read() as conn:
+            cursor = await conn.execute(
+                "SELECT run_id FROM broadcast_runs WHERE run_id LIKE ? AND started_at >= ? AND finished_at IS NULL",
+                (f"{prefix}%", since)
+            )
+            return [row[0] for row in await cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка проверки состояния рассылок: {e}")
+        raise
+
+async def get_delivered_chat_ids(run_id: str) -> set:
+    """Возвращает chat_id, уже обработанные в рассылке run_id (для продолжения после сбоя)."""
+    try:
+        async with db.read() as conn:
+            cursor = await conn.execute("SELECT chat_id FROM broadcast_deliveries WHERE run_id = ?", (run_id,))
+            return {row[0] for row in await cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"Ошибка получения контрольной точки рассылки: {e}")
+        raise
+
+async def save_deliveries(run_id: str, deliveries: list) -> None:
+    """Сохраняет контрольную точку рассылки: список (chat_id, status, delivered_at)."""
+    try:
+        async with db.write() as conn:
+            await conn.executemany(
+                "INSERT OR REPLACE INTO broadcast_deliveries (run_id, chat_id, status, delivered_at) VALUES (?, ?, ?, ?)",
+                [(run_id, chat_id, status, delivered_at) for chat_id, status, delivered_at in deliveries]
+            )
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка сохранения контрольной точки рассылки: {e}")
+        raise
+
+async def delete_old_deliveries(before: int) -> None:
+    """Удаляет записи о доставке старше before (unix-время)."""
+    try:
+        async with db.write() as conn:
+            await conn.execute("DELETE FROM broadcast_deliveries WHERE delivered_at < ?", (before,))
+            await conn.execute("DELETE FROM broadcast_runs WHERE started_at < ?", (before,))
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка очистки контрольных точек рассылки: {e}")
+        raise
+
+async def get_shared_horoscope(sign: str, period: str, start_day: int) -> Optional[str]:
+    """Возвращает гороскоп, сохранённый любым процессом, если он ещё не истёк."""
+    try:
+        async with db.read() as conn:
+            cursor = await conn.execute(
+                "SELECT text FROM horoscopes WHERE sign = ? AND period = ? AND start_day = ? AND expires_at > ?",
+                (sign, period, start_day, int(time.time()))
+            )
+            row = await cursor.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Ошибка получения гороскопа из базы: {e}")
+        raise
+
+async def save_shared_horoscope(sign: str, period: str, start_day: int, text: str, expires_at: int) -> None:
+    """Сохраняет гороскоп для других процессов."""
+    try:
+        async with db.write() as conn:
+            await conn.execute(
+                "INSERT OR REPLACE INTO horoscopes (sign, period, start_day, text, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (sign, period, start_day, text, expires_at)
+            )
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка сохранения гороскопа в базу: {e}")
+        raise
+
+async def delete_expired_horoscopes(now: int) -> None:
+    """Удаляет истёкшие гороскопы."""
+    try:
+        async with db.write() as conn:
+            await conn.execute("DELETE FROM horoscopes WHERE expires_at <= ?", (now,))
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка очистки гороскопов: {e}")
+        raise
+
+async def get_tarot_images(card: str) -> list:
+    """Возвращает сохранённые варианты изображения карты: [(вариант, имя файла, file_id), ...]."""
+    try:
+        async with db.read() as conn:
+            cursor = await conn.execute(
+                "SELECT variant, filename, file_id FROM tarot_images WHERE card = ? ORDER BY variant", (card,)
+            )
+            return await cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Ошибка получения изображений карты {card}: {e}")
+        raise
+
+async def save_tarot_image(card: str, variant: int, filename: str) -> None:
+    """Сохраняет изображение карты; file_id сбрасывается, пока новый файл не загружен в Telegram."""
+    try:
+        async with db.write() as conn:
+            await conn.execute(
+                "INSERT OR REPLACE INTO tarot_images (card, variant, filename, file_id, created_at) VALUES (?, ?, ?, NULL, ?)",
+                (card, variant, filename, int(time.time()))
+            )
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка сохранения изображения карты {card}: {e}")
+        raise
+
+async def set_tarot_file_id(card: str, variant: int, file_id: Optional[str]) -> None:
+    """Запоминает file_id загруженного изображения (None — забыть недействительный file_id)."""
+    try:
+        async with db.write() as conn:
+            await conn.execute(
+                "UPDATE tarot_images SET file_id = ? WHERE card = ? AND variant = ?", (file_id, card, variant)
+            )
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка сохранения file_id карты {card}: {e}")
+        raise
+
+async def get_content_variants(pool: str) -> list:
+    """Возвращает тексты пула: [(ключ, вариант, текст, создан, показан раз), ...]."""
+    try:
+        async with db.read() as conn:
+            cursor = await conn.execute(
+                "SELECT key, variant, text, created_at, served FROM content_variants WHERE pool = ?", (pool,)
+            )
+            return await cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Ошибка получения вариантов пула {pool}: {e}")
+        raise
+
+async def save_content_variant(pool: str, key: str, variant: int, text: str) -> int:
+    """Сохраняет (или заменяет) вариант текста; возвращает время создания."""
+    created_at = int(time.time())
+    try:
+        async with db.write() as conn:
+            await conn.execute(
+                "INSERT OR REPLACE INTO content_variants (pool, key, variant, text, created_at, served) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (pool, key, variant, text, created_at)
+            )
+            await conn.commit()
+        return created_at
+    except Exception as e:
+        logger.error(f"Ошибка сохранения варианта пула {pool}: {e}")
+        raise
+
+async def add_content_variant_serves(pool: str, serves: list) -> None:
+    """Прибавляет накопленные показы вариантов: serves — [(показов, ключ, вариант), ...]."""
+    try:
+        async with db.write() as conn:
+            await conn.executemany(
+                "UPDATE content_variants SET served = served + ? WHERE pool = ? AND key = ? AND variant = ?",
+                [(count, pool, key, variant) for count, key, variant in serves]
+            )
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка сохранения показов пула {pool}: {e}")
+        raise
+
+async def get_cached_reading(key: str, touch_interval: float) -> Optional[str]:
+    """
+    Возвращает сохранённый разбор по ключу.
+
+    Отметка использования (для вытеснения) обновляется, только если она старше
+    touch_interval, поэтому частые попадания не открывают транзакцию записи.
+    """
+    try:
+        async with db.read() as conn:
+            cursor = await conn.execute("SELECT text, last_used FROM reading_cache WHERE key = ?", (key,))
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        text, last_used = row
+        now = int(time.time())
+        if now - last_used >= touch_interval:
+            async with db.write() as conn:
+                await conn.execute("UPDATE reading_cache SET last_used = ? WHERE key = ?", (now, key))
+                await conn.commit()
+        return text
+    except Exception as e:
+        logger.error(f"Ошибка получения разбора из кэша: {e}")
+        raise
+
+async def save_cached_reading(key: str, kind: str, text: str) -> None:
+    """Сохраняет разбор (заменяя прежний с тем же ключом)."""
+    now = int(time.time())
+    try:
+        async with db.write() as conn:
+            await conn.execute(
+                "INSERT OR REPLACE INTO reading_cache (key, kind, text, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, text, now, now)
+            )
+            await conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка сохранения разбора в кэш: {e}")
+        raise
+
+async def trim_reading_cache(max_size: int) -> int:
+    """
+    Вытесняет давно не использованные разборы сверх max_size (вызывается планировщиком).
+
+    Returns:
+        int: Число вытесненных записей
+    """
+    try:
+        async with db.write() as conn:
+            cursor = await conn.execute("SELECT COUNT(*) FROM reading_cache")
+            excess = (await cursor.fetchone())[0] - max_size
+            if excess > 0:
+                await conn.execute(
+                    "DELETE FROM reading_cache WHERE key IN "
+                    "(SELECT key FROM reading_cache ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+                await conn.commit()
+        return max(excess, 0)
+    except Exception as e:
+        logger.error(f"Ошибка очистки кэша разборов: {e}")
+        raise
@@ -1,6 +1,21 @@
 from services.openai_service import ask_openai
+from services.variant_pool import VariantPool, PER_USER_DAILY
 
-async def get_fortune(category: str) -> str:
+FORTUNE_CATEGORIES = ("деньги", "удача", "отношения", "здоровье")
+
+async def get_fortune(category: str, user_id: int = None) -> str:
+    """Возвращает предсказание из пула: в течение дня пользователь получает одно и то же."""
+    response = await fortune_pool.get(category, user_id)
+
+    formatted_fortune = (
+        f"\n{response}\n"
+        "__________________________\n"
+        "💫 Совет: Примите знаки судьбы и следуйте интуиции!"       
+    )
+
+    return formatted_fortune
+
+async def _generate_fortune(category: str, on_progress=None) -> str:
     prompt = (
         f"Ты — древний оракул, чьи видения пронзают завесу времени. "
         f"Яви мистическое предсказание о {category}, словно ты заглянул(а) в потайные комнаты судьбы. "
@@ -11,12 +26,6 @@ async def get_fortune(category: str) -> str:
         f"Говори загадочно, поэтично и с глубоким мистическим смыслом. "
         f"Не используй Markdown-форматирование (например, ###, **, *, # и т.д.)."
     )
-    response = await ask_openai(prompt)
-
-    formatted_fortune = (
-        f"\n{response}\n"
-        "__________________________\n"
-        "💫 Совет: Примите знаки судьбы и следуйте интуиции!"       
-    )
+    return await ask_openai(prompt)
 
-    return formatted_fortune
\ No newline at end of file
+fortune_pool = VariantPool("fortune", _generate_fortune, keys=FORTUNE_CATEGORIES, mode=PER_USER_DAILY)
@@ -1,6 +1,10 @@
-from services.openai_service import ask_openai
+from services.openai_service import ask_openai, stream_openai
+from services.cache import AsyncTTLCache
+from services.database import get_shared_horoscope, save_shared_horoscope
 from telegram.ext import ContextTypes
-from datetime import datetime
+from datetime import datetime, date, timedelta, timezone
+import asyncio
+import random
 import logging
 from utils.validation import sanitize_input
 
@@ -8,25 +12,67 @@ from utils.validation import sanitize_input
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def get_horoscope(sign: str, period: str, context: ContextTypes.DEFAULT_TYPE = None) -> str:
+PERIODS = ("today", "week", "month")
+
+# Окно перед сменой периода, в котором начинается фоновая генерация следующего гороскопа (секунды)
+REFRESH_WINDOW = 30 * 60
+
+# Смещение самого западного часового пояса (UTC−12): там день заканчивается позже всего (секунды)
+LATEST_UTC_OFFSET = 12 * 3600
+
+# 12 знаков × 3 периода × (вчера/сегодня/завтра для подписчиков в разных часовых поясах)
+horoscope_cache = AsyncTTLCache("horoscope", maxsize=12 * len(PERIODS) * 3)
+
+# Ключи, для которых уже запущена фоновая предзагрузка следующего периода
+_prefetching: set = set()
+
+
+def _period_bounds(period: str, day: date) -> tuple:
     """
-    Асинхронно получает гороскоп через OpenAI API для указанного знака зодиака и периода.
-    
+    Возвращает границы периода, которому принадлежит день.
+
     Args:
-        sign: Знак зодиака
         period: Период гороскопа ('today', 'week', 'month')
-        context: Контекст Telegram (опционально)
-    
+        day: Дата внутри периода
+
     Returns:
-        str: Текст гороскопа
+        tuple: (начало периода, начало следующего периода)
     """
-    # Определяем период для текста запроса
-    period_text = {
-        "today": datetime.now().strftime("%d.%m.%Y"),
-        "week": f"неделю с {datetime.now().strftime('%d.%m.%Y')}",
-        "month": f"месяц {datetime.now().strftime('%B %Y')}"
-    }.get(period, datetime.now().strftime("%d.%m.%Y"))
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if period == "month":
+        start = day.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    return day, day + timedelta(days=1)
+
+
+def _period_text(period: str, start: date) -> str:
+    """Текст периода для запроса к OpenAI."""
+    if period == "week":
+        return f"неделю с {start.strftime('%d.%m.%Y')}"
+    if period == "month":
+        return f"месяц {start.strftime('%B %Y')}"
+    return start.strftime("%d.%m.%Y")
+
 
+def _timestamp(day: date) -> float:
+    """Unix-время локальной полуночи указанного дня."""
+    return datetime.combine(day, datetime.min.time()).timestamp()
+
+
+def _expires_at(end: date) -> float:
+    """
+    Unix-время, когда период закончился во всех часовых поясах.
+
+    Подписчик получает гороскоп на свою местную дату, которая может отставать от даты
+    сервера, поэтому запись живёт до полуночи end в самом западном поясе (UTC−12).
+    """
+    return datetime.combine(end, datetime.min.time(), tzinfo=timezone.utc).timestamp() + LATEST_UTC_OFFSET
+
+async def _generate_horoscope(sign: str, period: str, start: date, on_progress=None) -> str:
+    """Запрашивает у OpenAI гороскоп для знака на период, начинающийся с start."""
+    period_text = _period_text(period, start)
     prompt = (
         f"Ты — потомственный астролог, владеющий древними тайнами звёзд и планет. "
         f"Сотвори волшебное предсказание судьбы для знака {sign} на {period_text}. "
@@ -38,7 +84,106 @@ async def get_horoscope(sign: str, period: str, context: ContextTypes.DEFAULT_TY
         f"Говори красивым, поэтичным языком, наполненным мистицизмом и тайной. "
         f"Пиши на русском языке. Не используй Markdown-форматирование (например, ###, **, *, # и т.д.). "
     )
-    response = await ask_openai(prompt)
+    if on_progress:
+        response = await stream_openai(prompt, on_progress=on_progress)
+    else:
+        response = await ask_openai(prompt)
+    if response.startswith("⚠️"):
+        # Текст ошибки не должен попасть в кэш на весь период
+        raise RuntimeError(response)
 
     logger.info(f"Гороскоп для {sign} на {period_text}: {response[:50]}...")
-    return response
\ No newline at end of file
+    return response
+
+
+async def _load_shared(sign: str, period: str, start: date, end: date, on_progress=None) -> str:
+    """Берёт гороскоп из общей таблицы (его мог сгенерировать другой процесс), иначе генерирует и сохраняет."""
+    try:
+        response = await get_shared_horoscope(sign, period, start.toordinal())
+    except Exception:
+        response = None
+    if response is not None:
+        return response
+    response = await _generate_horoscope(sign, period, start, on_progress)
+    try:
+        await save_shared_horoscope(sign, period, start.toordinal(), response, int(_expires_at(end)))
+    except Exception:
+        # Не сохранённый в базу текст всё равно попадёт в кэш процесса
+        pass
+    return response
+
+
+async def _load(sign: str, period: str, start: date, end: date, on_progress=None) -> str:
+    """
+    Загружает гороскоп периода через кэш (с объединением одновременных запросов).
+
+    Прогресс генерации получает только тот вызов, который действительно обращается к OpenAI.
+    """
+    return await horoscope_cache.get_or_load(
+        (sign, period, start),
+        lambda: _load_shared(sign, period, start, end, on_progress),
+        _expires_at(end)
+    )
+
+
+def _schedule_prefetch(sign: str, period: str, end: date) -> None:
+    """
+    Запускает фоновую генерацию гороскопа следующего периода незадолго до смены периода.
+
+    Момент старта случайный внутри REFRESH_WINDOW, поэтому 36 ключей не обращаются
+    к OpenAI одновременно в полночь.
+    """
+    next_start, next_end = _period_bounds(period, end)
+    key = (sign, period, next_start)
+    if key in _prefetching or horoscope_cache.is_loading(key) or horoscope_cache.get(key) is not None:
+        return
+
+    delay = random.uniform(0, max(0.0, _timestamp(end) - datetime.now().timestamp()))
+
+    async def prefetch() -> None:
+        try:
+            await asyncio.sleep(delay)
+            await _load(sign, period, next_start, next_end)
+            logger.debug(f"Гороскоп для {sign} ({period}) с {next_start} подготовлен заранее")
+        except Exception as e:
+            logger.warning(f"Не удалось заранее подготовить гороскоп для {sign} ({period}): {e}")
+        finally:
+            _prefetching.discard(key)
+
+    _prefetching.add(key)
+    asyncio.get_running_loop().create_task(prefetch())
+
+
+async def get_horoscope(sign: str, period: str, context: ContextTypes.DEFAULT_TYPE = None,
+                        on_progress=None, day: date = None) -> str:
+    """
+    Асинхронно получает гороскоп для указанного знака зодиака и периода.
+
+    Ответ зависит только от знака, периода и текущего дня/недели/месяца, поэтому
+    хранится в кэше до конца периода.
+
+    Args:
+        sign: Знак зодиака
+        period: Период гороскопа ('today', 'week', 'month')
+        context: Контекст Telegram (опционально)
+        on_progress: Обработчик частичного текста при генерации (опционально)
+        day: Дата, для которой нужен гороскоп (по умолчанию — сегодня по времени сервера)
+
+    Returns:
+        str: Текст гороскопа
+    """
+    sign = sign.strip().capitalize()
+    if period not in PERIODS:
+        period = "today"
+
+    start, end = _period_bounds(period, day or datetime.now().date())
+    response = await _load(sign, period, start, end, on_progress)
+
+    if 0 < _timestamp(end) - datetime.now().timestamp() <= REFRESH_WINDOW:
+        _schedule_prefetch(sign, period, end)
+    return response
+
+
+def get_cache_stats() -> dict:
+    """Возвращает статистику кэша гороскопов."""
+    return horoscope_cache.stats()
@@ -0,0 +1,233 @@
+import logging
+import aiosqlite
+import config
+from utils.delivery_slots import delivery_slot, DEFAULT_LOCAL_MINUTE
+from utils.profile import profile_columns
+
+logger = logging.getLogger(__name__)
+
+# Версия схемы хранится в PRAGMA user_version; миграции применяются по порядку, каждая в своей транзакции
+
+
+async def _migration_1_base_schema(conn: aiosqlite.Connection) -> None:
+    """Исходная схема: подписки со слотами рассылки, профили, контрольные точки рассылок."""
+    cursor = await conn.execute("PRAGMA table_info(subscriptions)")
+    columns = {row[1] for row in await cursor.fetchall()}
+    # Подписки из схемы без времени рассылки переносятся в новую таблицу
+    legacy = bool(columns) and "delivery_slot" not in columns
+    if legacy:
+        await conn.execute("ALTER TABLE subscriptions RENAME TO subscriptions_legacy")
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            chat_id INTEGER PRIMARY KEY,
+            zodiac TEXT NOT NULL,
+            local_minute INTEGER NOT NULL,
+            timezone TEXT NOT NULL,
+            delivery_slot INTEGER NOT NULL
+        )
+    ''')
+    if legacy:
+        # Время и часовой пояс по умолчанию берутся из конфигурации, слот считается как при подписке
+        timezone = config.DEFAULT_TIMEZONE
+        cursor = await conn.execute("SELECT chat_id, zodiac FROM subscriptions_legacy")
+        await conn.executemany(
+            "INSERT INTO subscriptions (chat_id, zodiac, local_minute, timezone, delivery_slot) VALUES (?, ?, ?, ?, ?)",
+            [
+                (chat_id, zodiac, DEFAULT_LOCAL_MINUTE, timezone, delivery_slot(chat_id, DEFAULT_LOCAL_MINUTE, timezone))
+                for chat_id, zodiac in await cursor.fetchall()
+            ]
+        )
+        await conn.execute("DROP TABLE subscriptions_legacy")
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_slot ON subscriptions (delivery_slot)")
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS profiles (
+            chat_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            birth_date TEXT NOT NULL,
+            birth_time TEXT NOT NULL
+        )
+    ''')
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            run_id TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            delivered_at INTEGER NOT NULL,
+            PRIMARY KEY (run_id, chat_id)
+        ) WITHOUT ROWID
+    ''')
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_runs (
+            run_id TEXT PRIMARY KEY,
+            started_at INTEGER NOT NULL,
+            finished_at INTEGER
+        )
+    ''')
+
+
+async def _migration_2_typed_profiles(conn: aiosqlite.Connection) -> None:
+    """
+    Профили: дата — номер дня, время — минуты, место рождения, производные знак и число пути.
+
+    Добавляет индексы для выборок по сегментам («все Львы», «все с числом пути 7»).
+    Дата или время, которые не удалось разобрать, сохраняются исходным текстом в
+    legacy_birth_date / legacy_birth_time, чтобы миграция не теряла данные.
+    """
+    await conn.execute('''
+        CREATE TABLE profiles_v2 (
+            chat_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            birth_day INTEGER,
+            birth_minute INTEGER,
+            birth_place TEXT NOT NULL DEFAULT '',
+            zodiac TEXT,
+            life_path INTEGER,
+            legacy_birth_date TEXT,
+            legacy_birth_time TEXT
+        )
+    ''')
+    cursor = await conn.execute("SELECT chat_id, name, birth_date, birth_time FROM profiles")
+    rows = []
+    for chat_id, name, birth_date, birth_time in await cursor.fetchall():
+        birth_day, birth_minute, zodiac, life_path = profile_columns(birth_date, birth_time)
+        if birth_day is None or birth_minute is None:
+            logger.warning(
+                f"Профиль {chat_id}: не удалось разобрать дату/время '{birth_date}' '{birth_time}', сохранён исходный текст"
+            )
+        rows.append((
+            chat_id, name, birth_day, birth_minute, zodiac, life_path,
+            birth_date if birth_day is None else None,
+            birth_time if birth_minute is None else None,
+        ))
+    await conn.executemany(
+        "INSERT INTO profiles_v2 (chat_id, name, birth_day, birth_minute, zodiac, life_path, "
+        "legacy_birth_date, legacy_birth_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    await conn.execute("DROP TABLE profiles")
+    await conn.execute("ALTER TABLE profiles_v2 RENAME TO profiles")
+    await conn.execute("CREATE INDEX idx_profiles_zodiac ON profiles (zodiac)")
+    await conn.execute("CREATE INDEX idx_profiles_life_path ON profiles (life_path)")
+
+    # lower() в SQLite не работает с кириллицей, поэтому нормализуем знаки на стороне Python
+    cursor = await conn.execute("SELECT chat_id, zodiac FROM subscriptions")
+    await conn.executemany(
+        "UPDATE subscriptions SET zodiac = ? WHERE chat_id = ?",
+        [(zodiac.strip().lower(), chat_id) for chat_id, zodiac in await cursor.fetchall()]
+    )
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_zodiac ON subscriptions (zodiac)")
+    logger.info(f"Профили переведены на типизированную схему: {len(rows)}")
+
+
+async def _migration_3_user_state(conn: aiosqlite.Connection) -> None:
+    """Состояние диалогов (context.user_data) для SQLitePersistence."""
+    await conn.execute('''
+        CREATE TABLE user_state (
+            user_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+    await conn.execute("CREATE INDEX idx_user_state_updated ON user_state (updated_at)")
+
+
+async def _migration_4_shared_horoscopes(conn: aiosqlite.Connection) -> None:
+    """Сгенерированные гороскопы, общие для всех процессов-воркеров."""
+    await conn.execute('''
+        CREATE TABLE horoscopes (
+            sign TEXT NOT NULL,
+            period TEXT NOT NULL,
+            start_day INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            expires_at INTEGER NOT NULL,
+            PRIMARY KEY (sign, period, start_day)
+        ) WITHOUT ROWID
+    ''')
+
+
+async def _migration_5_tarot_images(conn: aiosqlite.Connection) -> None:
+    """Изображения карт Таро: файл на диске (по хэшу содержимого) и file_id Telegram."""
+    await conn.execute('''
+        CREATE TABLE tarot_images (
+            card TEXT NOT NULL,
+            variant INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            file_id TEXT,
+            created_at INTEGER NOT NULL,
+            PRIMARY KEY (card, variant)
+        ) WITHOUT ROWID
+    ''')
+
+
+async def _migration_6_content_variants(conn: aiosqlite.Connection) -> None:
+    """Пул заранее сгенерированных текстов (нумерология, Таро, предсказания)."""
+    await conn.execute('''
+        CREATE TABLE content_variants (
+            pool TEXT NOT NULL,
+            key TEXT NOT NULL,
+            variant INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            served INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (pool, key, variant)
+        ) WITHOUT ROWID
+    ''')
+
+
+async def _migration_7_reading_cache(conn: aiosqlite.Connection) -> None:
+    """Кэш натальных карт и совместимости по нормализованным данным рождения."""
+    await conn.execute('''
+        CREATE TABLE reading_cache (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            text TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            last_used INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    await conn.execute("CREATE INDEX idx_reading_cache_last_used ON reading_cache (last_used)")
+
+
+MIGRATIONS = [
+    (1, _migration_1_base_schema),
+    (2, _migration_2_typed_profiles),
+    (3, _migration_3_user_state),
+    (4, _migration_4_shared_horoscopes),
+    (5, _migration_5_tarot_images),
+    (6, _migration_6_content_variants),
+    (7, _migration_7_reading_cache),
+]
+
+
+async def _user_version(conn: aiosqlite.Connection) -> int:
+    cursor = await conn.execute("PRAGMA user_version")
+    return (await cursor.fetchone())[0]
+
+
+async def run_migrations(conn: aiosqlite.Connection) -> int:
+    """
+    Применяет недостающие миграции.
+
+    Returns:
+        int: Версия схемы после миграций
+    """
+    version = await _user_version(conn)
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Пока ждали блокировку записи, миграцию мог применить другой процесс
+            version = await _user_version(conn)
+            if target <= version:
+                await conn.commit()
+                continue
+            logger.info(f"Миграция схемы {version} -> {target}: {migration.__doc__.strip().splitlines()[0]}")
+            await migration(conn)
+            await conn.execute(f"PRAGMA user_version = {target}")
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+        version = target
+    return version
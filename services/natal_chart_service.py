@@ -1,12 +1,24 @@
-from services.openai_service import ask_openai
+from services.openai_service import ask_openai, stream_openai
+from services.reading_cache import reading_cache, natal_key
 import logging
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def get_natal_chart(name: str, birth_date: str, birth_time: str, birth_place: str) -> str:
-    """Асинхронно запрашивает у OpenAI детальный разбор натальной карты."""
+async def get_natal_chart(name: str, birth_date: str, birth_time: str, birth_place: str, on_progress=None,
+                          refresh: bool = False) -> str:
+    """
+    Асинхронно запрашивает у OpenAI детальный разбор натальной карты (потоково, если передан on_progress).
+
+    Разбор для тех же данных рождения берётся из кэша; refresh=True генерирует его заново.
+    """
+    key = natal_key(name, birth_date, birth_time, birth_place)
+    if not refresh:
+        cached = await reading_cache.get(key)
+        if cached is not None:
+            return cached
+
     prompt = (
         f"Ты — хранитель древних астрологических знаний, способный читать тайные письмена звёзд. "
         f"Раскрой сакральный код судьбы, заключенный в натальной карте {name}, чья душа пришла в этот мир "
@@ -24,11 +36,15 @@ async def get_natal_chart(name: str, birth_date: str, birth_time: str, birth_pla
         f"с космическими энергиями, заключенными в её натальной карте. "
         f"Не используй Markdown-форматирование (например, ###, **, *, # и т.д.). "
     )
-    response = await ask_openai(prompt)
+    if on_progress:
+        response = await stream_openai(prompt, on_progress=on_progress)
+    else:
+        response = await ask_openai(prompt)
     
     # Очищаем текст от потенциально проблемных символов
     response = ''.join(c for c in response if ord(c) < 128 or c in 'абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ\n')
     response = response.replace("\n\n", "\n").replace("  ", " ")  # Упрощаем форматирование
     
     logger.debug(f"Очищенный natal_chart_text: {response[:500]}...")  # Логируем первые 500 символов
+    await reading_cache.put(key, "natal", response)
     return response
\ No newline at end of file
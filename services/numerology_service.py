@@ -1,4 +1,5 @@
 from services.openai_service import ask_openai
+from services.variant_pool import VariantPool, PER_USER
 from datetime import datetime
 
 def calculate_life_path_number(birth_date: str) -> int:
@@ -16,7 +17,15 @@ def calculate_life_path_number(birth_date: str) -> int:
     return life_path_number
 
 
-def get_numerology_interpretation(life_path_number: int) -> str:
+async def get_numerology_interpretation(life_path_number: int, user_id: int = None) -> str:
+    """
+    Возвращает интерпретацию нумерологического числа из пула готовых текстов.
+    Один и тот же пользователь получает для своего числа один и тот же текст.
+    """
+    return await numerology_pool.get(life_path_number, user_id)
+
+
+async def _generate_interpretation(life_path_number: str, on_progress=None) -> str:
     """
     Запрашивает у OpenAI интерпретацию нумерологического числа.
     """
@@ -41,4 +50,8 @@ def get_numerology_interpretation(life_path_number: int) -> str:
     
     НЕ используй Markdown-форматирование (например, ###, **, *, # и т.д.).
     """
-    return ask_openai(prompt)
\ No newline at end of file
+    return await ask_openai(prompt)
+
+
+# Чисел судьбы всего девять, поэтому тексты для них генерируются заранее
+numerology_pool = VariantPool("numerology", _generate_interpretation, keys=range(1, 10), mode=PER_USER)
@@ -1,15 +1,84 @@
-from openai import OpenAI, OpenAIError
+from openai import AsyncOpenAI, OpenAIError
 import config
+import httpx
 import logging
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import asyncio
+from contextlib import asynccontextmanager
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Инициализация клиента OpenAI
-client = OpenAI(api_key=config.OPENAI_API_KEY)
+# Общий пул keep-alive соединений для всех сервисов, работающих с OpenAI
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=config.OPENAI_POOL_SIZE,
+        max_keepalive_connections=config.OPENAI_POOL_SIZE,
+        keepalive_expiry=300
+    ),
+    timeout=httpx.Timeout(config.OPENAI_TIMEOUT, connect=10.0)
+)
+
+# Инициализация асинхронного клиента OpenAI (один на процесс)
+client = AsyncOpenAI(api_key=config.OPENAI_API_KEY, http_client=http_client, max_retries=0)
+
+# Глобальное ограничение одновременных запросов к OpenAI
+_semaphore = asyncio.Semaphore(config.OPENAI_MAX_CONCURRENCY)
+_stats = {"in_flight": 0, "waiting": 0, "completed": 0, "failed": 0, "max_waiting": 0}
+
+
+@asynccontextmanager
+async def openai_slot():
+    """Занимает слот глобального лимита одновременных запросов к OpenAI."""
+    _stats["waiting"] += 1
+    _stats["max_waiting"] = max(_stats["max_waiting"], _stats["waiting"])
+    try:
+        await _semaphore.acquire()
+    finally:
+        _stats["waiting"] -= 1
+    _stats["in_flight"] += 1
+    try:
+        yield
+        _stats["completed"] += 1
+    except BaseException:
+        _stats["failed"] += 1
+        raise
+    finally:
+        _stats["in_flight"] -= 1
+        _semaphore.release()
+
+
+def get_openai_stats() -> dict:
+    """
+    Возвращает статистику очереди запросов и пула соединений OpenAI.
+
+    Returns:
+        dict: Лимиты, число выполняющихся и ожидающих запросов, состояние пула
+    """
+    stats = dict(_stats, max_concurrency=config.OPENAI_MAX_CONCURRENCY, pool_size=config.OPENAI_POOL_SIZE)
+    # httpx не предоставляет публичного API для состояния пула, поэтому читаем его осторожно
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is not None:
+        stats["pool_connections"] = len(connections)
+        stats["pool_idle"] = sum(1 for c in connections if c.is_idle())
+    return stats
+
+
+async def warmup_openai() -> None:
+    """Прогревает пул: устанавливает TLS-соединение с OpenAI до первого запроса пользователя."""
+    try:
+        await client.models.list()
+        logger.info("Соединение с OpenAI установлено")
+    except Exception as e:
+        logger.warning(f"Не удалось прогреть соединение с OpenAI: {e}")
+
+
+async def close_openai() -> None:
+    """Закрывает пул соединений OpenAI."""
+    await client.close()
+
 
 @retry(
     stop=stop_after_attempt(3),  # Максимум 3 попытки
@@ -30,19 +99,88 @@ async def ask_openai(prompt: str) -> str:
         str: Ответ от OpenAI или сообщение об ошибке после всех попыток.
     """
     try:
-        response = await asyncio.to_thread(
-            client.chat.completions.create,
-            model="gpt-4o-mini",        # ✅ лёгкая и быстрая модель
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=3600,           # лимит длины ответа
-            temperature=0.9            # креативность
-        )
+        async with openai_slot():
+            response = await client.chat.completions.create(
+                model="gpt-4o-mini",        # ✅ лёгкая и быстрая модель
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=3600,           # лимит длины ответа
+                temperature=0.9            # креативность
+            )
         return response.choices[0].message.content.strip()
     except OpenAIError as e:
         logger.error(f"Ошибка OpenAI API: {e}")
         raise
     except Exception as e:
         logger.error(f"Неизвестная ошибка при запросе к OpenAI: {e}")
-        return f"⚠️ Неизвестная ошибка при получении данных: {e}"
\ No newline at end of file
+        return f"⚠️ Неизвестная ошибка при получении данных: {e}"
+
+
+def _cut_to_budget(text: str, max_chars: int) -> str:
+    """Обрезает текст до max_chars по границе предложения (если она не слишком далеко)."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "), cut.rfind("\n"))
+    if boundary >= max_chars // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip()
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+    retry=retry_if_exception_type(OpenAIError),
+    before_sleep=lambda retry_state: logger.info(
+        f"Попытка {retry_state.attempt_number} из 3, ожидание {retry_state.next_action.sleep} секунд..."
+    )
+)
+async def stream_openai(prompt: str, on_progress=None, max_chars: int = None) -> str:
+    """
+    Потоковый запрос к OpenAI API: текст отдаётся по мере генерации.
+
+    Args:
+        prompt (str): Текст запроса к OpenAI.
+        on_progress: Корутина-функция, получающая накопленный текст после каждого фрагмента.
+        max_chars (int): Лимит длины ответа; при его достижении генерация прерывается.
+
+    Returns:
+        str: Полный (или обрезанный по max_chars) ответ от OpenAI.
+    """
+    parts = []
+    length = 0
+    try:
+        async with openai_slot():
+            stream = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=3600,
+                temperature=0.9,
+                stream=True
+            )
+            try:
+                async for chunk in stream:
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    parts.append(delta)
+                    length += len(delta)
+                    if max_chars and length >= max_chars:
+                        logger.debug(f"Достигнут лимит {max_chars} символов, генерация остановлена")
+                        break
+                    if on_progress:
+                        await on_progress("".join(parts))
+            finally:
+                await stream.close()
+
+        text = "".join(parts).strip()
+        return _cut_to_budget(text, max_chars) if max_chars else text
+    except OpenAIError as e:
+        logger.error(f"Ошибка OpenAI API: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"Неизвестная ошибка при потоковом запросе к OpenAI: {e}")
+        return f"⚠️ Неизвестная ошибка при получении данных: {e}"
@@ -0,0 +1,194 @@
+import json
+import logging
+import time
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+from telegram.ext import BasePersistence, PersistenceInput
+import config
+from services.database import db, write_queue
+from utils.sessions import Session, SESSION_TYPES, session_sweeper
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_value(value: Any) -> dict:
+    """Кодирует в JSON значения, которые json не поддерживает (сессии и даты в user_data)."""
+    if isinstance(value, Session):
+        return {"$s": value.kind, **value.to_dict()}
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    raise TypeError(f"Тип {type(value).__name__} не поддерживается")
+
+
+def _decode_object(obj: dict) -> Any:
+    if "$s" in obj:
+        return SESSION_TYPES[obj.pop("$s")].from_dict(obj)
+    if len(obj) == 1:
+        if "$dt" in obj:
+            return datetime.fromisoformat(obj["$dt"])
+        if "$d" in obj:
+            return date.fromisoformat(obj["$d"])
+    return obj
+
+
+def encode_state(data: dict) -> bytes:
+    """Компактно кодирует user_data: JSON без пробелов, кириллица в UTF-8 без \\u-экранирования."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_encode_value).encode()
+
+
+def decode_state(blob: bytes) -> dict:
+    return json.loads(blob, object_hook=_decode_object)
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Хранение context.user_data в SQLite (таблица user_state).
+
+    Данные пользователя загружаются лениво — при первом его обновлении после запуска,
+    а не все сразу при старте. При сохранении записываются только изменившиеся данные:
+    PTB передаёт пользователей, затронутых с прошлого сохранения, а из них отбрасываются
+    те, чьё закодированное состояние совпадает с последним записанным. Записи идут через
+    общую очередь групповой фиксации, поэтому одно сохранение — одна транзакция.
+    """
+
+    def __init__(self, update_interval: float = None):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval or config.PERSISTENCE_INTERVAL,
+        )
+        self._loaded = set()
+        self._digests: Dict[int, int] = {}  # user_id -> хэш последнего записанного состояния
+        self.loads = 0
+        self.writes = 0
+        self.skipped = 0
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        # Данные загружаются по одному пользователю в refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        """Загружает сохранённое состояние пользователя при первом обращении."""
+        if user_id in self._loaded:
+            return
+        try:
+            async with db.read() as conn:
+                cursor = await conn.execute("SELECT data FROM user_state WHERE user_id = ?", (user_id,))
+                row = await cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Ошибка загрузки состояния пользователя {user_id}: {e}")
+            return
+        self._loaded.add(user_id)
+        if row is None:
+            return
+        self.loads += 1
+        self._digests[user_id] = hash(row[0])
+        # Значения, уже записанные в память до загрузки, новее сохранённых
+        for key, value in decode_state(row[0]).items():
+            if key in user_data:
+                continue
+            user_data[key] = value
+            if isinstance(value, Session):
+                session_sweeper.schedule(user_id, value)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        """Записывает состояние пользователя, если оно изменилось с последней записи."""
+        if not data:
+            if user_id in self._digests:
+                await self.drop_user_data(user_id)
+            return
+        try:
+            blob = encode_state(data)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Состояние пользователя {user_id} не сохранено: {e}")
+            return
+        digest = hash(blob)
+        if self._digests.get(user_id) == digest:
+            self.skipped += 1
+            return
+        try:
+            await write_queue.submit(
+                user_id,
+                "INSERT OR REPLACE INTO user_state (user_id, data, updated_at) VALUES (?, ?, ?)",
+                (user_id, blob, int(time.time()))
+            )
+        except Exception as e:
+            logger.error(f"Ошибка сохранения состояния пользователя {user_id}: {e}")
+            return
+        self._digests[user_id] = digest
+        self.writes += 1
+
+    def _forget(self, user_id: int) -> None:
+        """Забывает пользователя: следующее обращение снова прочитает его состояние из БД."""
+        self._digests.pop(user_id, None)
+        self._loaded.discard(user_id)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._forget(user_id)
+        try:
+            await write_queue.submit(user_id, "DELETE FROM user_state WHERE user_id = ?", (user_id,))
+        except Exception as e:
+            logger.error(f"Ошибка удаления состояния пользователя {user_id}: {e}")
+
+    async def delete_stale(self, before: int) -> None:
+        """Удаляет состояния, не обновлявшиеся с момента before (unix-время)."""
+        async with db.write() as conn:
+            cursor = await conn.execute("DELETE FROM user_state WHERE updated_at < ? RETURNING user_id", (before,))
+            deleted = [user_id for user_id, in await cursor.fetchall()]
+            await conn.commit()
+        # Иначе неизменившееся состояние этих пользователей больше не было бы записано
+        for user_id in deleted:
+            self._forget(user_id)
+        logger.info(f"Удалено устаревших состояний диалогов: {len(deleted)}")
+
+    def stats(self) -> dict:
+        """Возвращает статистику сохранения состояний."""
+        return {
+            "loaded_users": len(self._loaded),
+            "loads": self.loads,
+            "writes": self.writes,
+            "skipped_unchanged": self.skipped,
+        }
+
+    # Данные чатов, бота, callback_data и состояния ConversationHandler не сохраняются
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def flush(self) -> None:
+        # Каждая запись ждёт фиксации в update_user_data, буферов нет
+        pass
+
+
+persistence = SQLitePersistence()
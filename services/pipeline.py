@@ -0,0 +1,146 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Значение fallback по умолчанию: этап обязателен, его ошибка прерывает конвейер
+REQUIRED = object()
+
+# Все созданные конвейеры (для статистики)
+_pipelines = []
+
+
+class Stage:
+    __slots__ = ("name", "func", "requires", "timeout", "fallback", "calls", "total", "max", "timeouts", "failures")
+
+    def __init__(self, name: str, func: Callable, requires: tuple, timeout: Optional[float], fallback: Any):
+        self.name = name
+        self.func = func
+        self.requires = requires
+        self.timeout = timeout
+        self.fallback = fallback
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.timeouts = 0
+        self.failures = 0
+
+    @property
+    def optional(self) -> bool:
+        return self.fallback is not REQUIRED
+
+    def record(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "avg_ms": round(self.total / self.calls * 1000, 1) if self.calls else 0.0,
+            "max_ms": round(self.max * 1000, 1),
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+        }
+
+
+class Pipeline:
+    """
+    Составной ответ как граф этапов.
+
+    Этап получает именованными аргументами результаты этапов из requires (и входные
+    данные run) и запускается, как только они готовы, поэтому независимые этапы
+    (например, текст и изображение карты) выполняются параллельно. Этапы объявляются
+    по порядку и могут зависеть только от объявленных ранее, так что циклов нет.
+
+    У этапа может быть таймаут. Если задан fallback, то при таймауте или ошибке этап
+    возвращает fallback и конвейер продолжается (например, ответ уходит без картинки);
+    ошибка обязательного этапа отменяет остальные и пробрасывается из run.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._stages = []
+        self.runs = 0
+        self.failed = 0
+        _pipelines.append(self)
+
+    def stage(self, name: str, func: Callable, requires: Iterable[str] = (), timeout: float = None,
+              fallback: Any = REQUIRED) -> "Pipeline":
+        """Добавляет этап; func — функция или корутина с аргументами из requires."""
+        if any(stage.name == name for stage in self._stages):
+            raise ValueError(f"Этап {name!r} уже объявлен в конвейере {self.name}")
+        self._stages.append(Stage(name, func, tuple(requires), timeout, fallback))
+        return self
+
+    async def run(self, **inputs) -> dict:
+        """
+        Выполняет конвейер.
+
+        Returns:
+            dict: Входные данные и результаты всех этапов по именам
+        """
+        results = dict(inputs)
+        loop = asyncio.get_running_loop()
+        tasks = {}
+        for stage in self._stages:
+            missing = [name for name in stage.requires if name not in tasks and name not in results]
+            if missing:
+                raise ValueError(f"Этап {stage.name!r} зависит от неизвестных {missing}")
+            tasks[stage.name] = loop.create_task(self._run_stage(stage, tasks, results))
+        self.runs += 1
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            self.failed += 1
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return results
+
+    async def _run_stage(self, stage: Stage, tasks: dict, results: dict) -> Any:
+        dependencies = [tasks[name] for name in stage.requires if name in tasks]
+        if dependencies:
+            await asyncio.gather(*dependencies)
+        kwargs = {name: results[name] for name in stage.requires}
+
+        # Задержка записывается для завершённых этапов (успех, таймаут, ошибка), но не для отменённых
+        started = time.perf_counter()
+        try:
+            value = stage.func(**kwargs)
+            if inspect.isawaitable(value):
+                value = await asyncio.wait_for(value, stage.timeout)
+        except asyncio.TimeoutError:
+            stage.record(time.perf_counter() - started)
+            stage.timeouts += 1
+            if not stage.optional:
+                raise
+            logger.warning(f"Этап {self.name}.{stage.name} не уложился в {stage.timeout} с, продолжаем без него")
+            value = stage.fallback
+        except Exception as e:
+            stage.record(time.perf_counter() - started)
+            stage.failures += 1
+            if not stage.optional:
+                raise
+            logger.warning(f"Ошибка этапа {self.name}.{stage.name}, продолжаем без него: {e}")
+            value = stage.fallback
+        else:
+            stage.record(time.perf_counter() - started)
+        results[stage.name] = value
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failed": self.failed,
+            "stages": {stage.name: stage.stats() for stage in self._stages},
+        }
+
+
+def get_pipeline_stats() -> dict:
+    """Возвращает задержки этапов всех конвейеров."""
+    return {pipeline.name: pipeline.stats() for pipeline in _pipelines}
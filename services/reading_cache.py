@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import re
+from typing import Optional
+import config
+from services.cache import LRUCache
+from services.database import get_cached_reading, save_cached_reading, trim_reading_cache
+from utils.dates import date_to_day_number, time_to_minutes
+
+logger = logging.getLogger(__name__)
+
+# Данные запросов для кнопки «Сгенерировать заново» хранятся только в памяти процесса
+REQUEST_CACHE_SIZE = 10000
+REQUEST_TTL = 24 * 3600
+# Длина id запроса в callback_data (начало ключа кэша)
+REQUEST_ID_LENGTH = 16
+
+
+def normalize_text(text: str) -> str:
+    """Имя или место в каноническом виде: регистр, «ё», дефисы и лишние пробелы не важны."""
+    text = text.casefold().replace("ё", "е")
+    return " ".join(re.split(r"[\s\-]+", text.strip()))
+
+
+def person_key(name: str, birth_date: str, birth_time: str, birth_place: str) -> str:
+    """Канонические данные рождения: имя, номер дня, минуты от полуночи, место."""
+    return "|".join((
+        normalize_text(name),
+        str(date_to_day_number(birth_date)),
+        str(time_to_minutes(birth_time)),
+        normalize_text(birth_place),
+    ))
+
+
+def natal_key(name: str, birth_date: str, birth_time: str, birth_place: str) -> str:
+    return _digest("natal", person_key(name, birth_date, birth_time, birth_place))
+
+
+def compatibility_key(person1: tuple, person2: tuple) -> str:
+    """Ключ пары не зависит от порядка: A+B и B+A дают один ключ."""
+    return _digest("compatibility", *sorted((person_key(*person1), person_key(*person2))))
+
+
+def _digest(kind: str, *parts: str) -> str:
+    # В БД хранится хэш, а не сами данные рождения
+    return hashlib.sha256("\n".join((kind, *parts)).encode()).hexdigest()
+
+
+class ReadingCache:
+    """
+    Постоянный кэш долгих разборов (натальная карта, совместимость).
+
+    Ключ — хэш нормализованных данных рождения, поэтому повторный запрос с теми же
+    данными (потерянное сообщение, запрос для партнёра) отвечается без OpenAI.
+    Размер ограничен max_size: раз в сутки (maintain) вытесняются давно не запрошенные
+    разборы. Время использования записи обновляется не чаще touch_interval.
+    """
+
+    def __init__(self, max_size: int, touch_interval: float):
+        self.max_size = max_size
+        self.touch_interval = touch_interval
+        self._requests = LRUCache("reading_requests", maxsize=REQUEST_CACHE_SIZE, ttl=REQUEST_TTL)
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            text = await get_cached_reading(key, self.touch_interval)
+        except Exception:
+            return None
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return text
+
+    async def put(self, key: str, kind: str, text: str) -> None:
+        if not text or text.startswith("⚠️"):
+            # Текст ошибки OpenAI не кэшируется
+            return
+        try:
+            await save_cached_reading(key, kind, text)
+        except Exception as e:
+            logger.warning(f"Разбор не сохранён в кэш: {e}")
+
+    def remember(self, key: str, args) -> str:
+        """
+        Запоминает данные запроса в памяти для повторной генерации разбора.
+
+        Returns:
+            str: Короткий id для callback_data кнопки под этим разбором
+        """
+        request_id = key[:REQUEST_ID_LENGTH]
+        self._requests.set(request_id, tuple(args))
+        return request_id
+
+    def recall(self, request_id: str) -> Optional[tuple]:
+        """Данные запроса по id или None (истекли или процесс перезапускался)."""
+        found, args = self._requests.get(request_id)
+        return args if found else None
+
+    async def maintain(self) -> None:
+        """Вытесняет записи сверх max_size (вызывается планировщиком раз в сутки)."""
+        evicted = await trim_reading_cache(self.max_size)
+        self.evicted += evicted
+        logger.info(f"Кэш разборов обслужен: вытеснено {evicted}")
+
+    def stats(self) -> dict:
+        return {"max_size": self.max_size, "hits": self.hits, "misses": self.misses, "evicted": self.evicted}
+
+
+reading_cache = ReadingCache(config.READING_CACHE_SIZE, config.READING_CACHE_TOUCH_INTERVAL)
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import random
+import sys
+from typing import Optional
+import telegram
+import config
+from services.database import init_db, close_db, get_tarot_images, save_tarot_image, set_tarot_file_id
+from services.openai_service import close_openai
+from services.tarot_service import generate_tarot_image, tarot_cards
+from utils.telegram_helpers import send_photo_with_caption
+
+try:
+    # Pillow уменьшает изображение и перекодирует его в JPEG; без него хранится исходный PNG
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+JPEG_QUALITY = 85
+
+
+def to_jpeg(image: bytes, size: int) -> tuple:
+    """Уменьшает изображение до size×size и перекодирует в JPEG; возвращает (байты, расширение)."""
+    if Image is None:
+        return image, "png"
+    with Image.open(io.BytesIO(image)) as picture:
+        picture = picture.convert("RGB")
+        picture.thumbnail((size, size))
+        output = io.BytesIO()
+        picture.save(output, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    return output.getvalue(), "jpg"
+
+
+class TarotImageStore:
+    """
+    Хранилище изображений карт Таро.
+
+    Каждая карта (в нескольких стилях-вариантах) генерируется DALL-E один раз, уменьшается
+    до JPEG и сохраняется на диск под именем — хэшем содержимого. После первой загрузки в
+    Telegram file_id запоминается в таблице tarot_images, и дальше фото отправляется по
+    нему без загрузки файла.
+    """
+
+    def __init__(self, directory: str, variants: int = 1, size: int = 768):
+        self.directory = directory
+        self.variants = max(1, variants)
+        self.size = size
+        self._rendering = {}
+        self.sent_by_file_id = 0
+        self.uploaded = 0
+        self.rendered = 0
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _write(self, image: bytes, extension: str) -> str:
+        """Сохраняет файл под именем-хэшем содержимого; одинаковые изображения не дублируются."""
+        filename = f"{hashlib.sha256(image).hexdigest()}.{extension}"
+        path = self._path(filename)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(image)
+            os.replace(tmp_path, path)
+        return filename
+
+    def _read(self, filename: str) -> Optional[bytes]:
+        try:
+            with open(self._path(filename), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def render(self, card: str, variant: int = 0) -> Optional[str]:
+        """
+        Генерирует и сохраняет изображение карты; одновременные запросы одной карты
+        ждут одну генерацию.
+
+        Returns:
+            str: Имя файла или None, если DALL-E не вернул изображение
+        """
+        key = (card, variant)
+        task = self._rendering.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._render(card, variant))
+            self._rendering[key] = task
+            task.add_done_callback(lambda _: self._rendering.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _render(self, card: str, variant: int) -> Optional[str]:
+        image = await generate_tarot_image(card, variant)
+        if not image:
+            return None
+        image, extension = await asyncio.to_thread(to_jpeg, image, self.size)
+        filename = await asyncio.to_thread(self._write, image, extension)
+        await save_tarot_image(card, variant, filename)
+        self.rendered += 1
+        logger.info(f"Изображение карты {card} (вариант {variant}) сохранено: {filename}, {len(image)} байт")
+        return filename
+
+    async def _load(self, card: str, variant: int, filename: Optional[str]) -> bytes:
+        """Читает файл изображения с диска, генерируя его, если файла ещё нет."""
+        image = await asyncio.to_thread(self._read, filename) if filename else None
+        if image is None:
+            filename = await self.render(card, variant)
+            if filename is None:
+                raise Exception("Не удалось сгенерировать изображение карты Таро")
+            image = await asyncio.to_thread(self._read, filename)
+        return image
+
+    async def prepare(self, card: str) -> tuple:
+        """
+        Выбирает вариант изображения карты и готовит его к отправке.
+
+        Returns:
+            tuple: (вариант, file_id или содержимое файла)
+        """
+        rows = [row for row in await get_tarot_images(card) if row[0] < self.variants]
+        if rows:
+            variant, filename, file_id = random.choice(rows)
+        else:
+            variant, filename, file_id = 0, None, None
+        if file_id:
+            return variant, file_id
+        return variant, await self._load(card, variant, filename)
+
+    async def send(self, bot, chat_id: int, card: str, caption: str, prepared: tuple = None) -> telegram.Message:
+        """
+        Отправляет изображение карты с подписью: по file_id, иначе загружает файл с диска
+        (генерируя его при первом обращении) и запоминает полученный file_id.
+
+        Args:
+            prepared: Результат prepare, если изображение подготовлено заранее
+        """
+        variant, photo = prepared or await self.prepare(card)
+        if isinstance(photo, str):
+            try:
+                message = await send_photo_with_caption(bot, chat_id, photo, caption)
+                self.sent_by_file_id += 1
+                return message
+            except telegram.error.BadRequest as e:
+                # file_id другого бота или удалённого файла: загружаем файл заново
+                logger.warning(f"file_id карты {card} недействителен: {e}")
+                await set_tarot_file_id(card, variant, None)
+                rows = {row[0]: row[1] for row in await get_tarot_images(card)}
+                photo = await self._load(card, variant, rows.get(variant))
+
+        message = await send_photo_with_caption(bot, chat_id, photo, caption)
+        self.uploaded += 1
+        if message and message.photo:
+            await set_tarot_file_id(card, variant, message.photo[-1].file_id)
+        return message
+
+    async def prerender(self, variants: int = None) -> int:
+        """Генерирует недостающие изображения всей колоды; возвращает число новых файлов."""
+        variants = variants or self.variants
+        missing = []
+        for card in tarot_cards:
+            stored = {variant: filename for variant, filename, _ in await get_tarot_images(card)}
+            for variant in range(variants):
+                filename = stored.get(variant)
+                if filename is None or not os.path.exists(self._path(filename)):
+                    missing.append((card, variant))
+        logger.info(f"Изображений для генерации: {len(missing)}")
+        # Параллельность ограничивает openai_slot
+        results = await asyncio.gather(*(self.render(card, variant) for card, variant in missing))
+        return sum(1 for filename in results if filename)
+
+    def stats(self) -> dict:
+        return {
+            "jpeg": Image is not None,
+            "sent_by_file_id": self.sent_by_file_id,
+            "uploaded": self.uploaded,
+            "rendered": self.rendered,
+            "rendering": len(self._rendering),
+        }
+
+
+tarot_images = TarotImageStore(config.TAROT_IMAGE_DIR, config.TAROT_IMAGE_VARIANTS, config.TAROT_IMAGE_SIZE)
+
+
+# Предварительная генерация всей колоды: python -m services.tarot_images [число_вариантов]
+async def main(variants: int = None) -> None:
+    await init_db()
+    try:
+        created = await tarot_images.prerender(variants)
+        logger.info(f"Колода готова: новых изображений {created}, каталог {tarot_images.directory}")
+    finally:
+        await close_openai()
+        await close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else None))
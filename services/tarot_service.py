@@ -1,15 +1,12 @@
+import base64
 import random
 import re
-from openai import OpenAI
-from services.openai_service import ask_openai
-import config
+from services.openai_service import stream_openai, client, openai_slot
+from services.variant_pool import VariantPool
 import logging
-import asyncio
 
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=config.OPENAI_API_KEY)
-
 tarot_cards = [
     "Шут", "Маг", "Верховная Жрица", "Императрица", "Император",
     "Иерофант", "Влюбленные", "Колесница", "Справедливость", "Отшельник",
@@ -17,8 +14,36 @@ tarot_cards = [
     "Дьявол", "Башня", "Звезда", "Луна", "Солнце", "Суд", "Мир"
 ]
 
-async def get_tarot_interpretation():
-    card = random.choice(tarot_cards)
+# Стили изображений карт: вариант изображения определяет стиль
+TAROT_STYLES = [
+    "в стиле древних эзотерических традиций",
+    "в стиле средневековой гравюры с золотым тиснением",
+    "в стиле модерна с плавными линиями и витражными цветами",
+]
+
+# Лимит подписи к фото в Telegram
+CAPTION_LIMIT = 1024
+
+
+def caption_header(card: str) -> str:
+    """Заголовок подписи к изображению карты."""
+    return f"🎴 Карта: {card}\n\n"
+
+
+def pick_tarot_card() -> str:
+    """Вытягивает случайную карту."""
+    return random.choice(tarot_cards)
+
+async def get_tarot_interpretation(card: str, on_progress=None) -> str:
+    """Возвращает толкование карты из пула готовых текстов."""
+    return await tarot_pool.get(card, on_progress=on_progress)
+
+async def _generate_interpretation(card: str, on_progress=None) -> str:
+    """
+    Получает толкование карты у OpenAI.
+
+    Генерация останавливается, как только текст заполняет лимит подписи к фото.
+    """
     prompt = (
         f"Ты — древний мистик карт Таро. В свете свечей твои руки касаются колоды, и силы указывают на карту: {card}. "
         f"Раскрой глубинный смысл в четырёх сферах: "
@@ -35,25 +60,30 @@ async def get_tarot_interpretation():
         f"Не используй Markdown-форматирование (например, ###, **, *, # и т.д.)."
         f"ОБЯЗАТЕЛЬНО УЛОЖИ СВОЙ ОТВЕТ В 960 символов!"
     )
-    interpretation = await ask_openai(prompt)
-    return card, interpretation
+    budget = CAPTION_LIMIT - len(caption_header(card))
+    return await stream_openai(prompt, on_progress=on_progress, max_chars=budget)
+
+# 22 карты: толкования генерируются заранее, вариант выбирается случайно
+tarot_pool = VariantPool("tarot", _generate_interpretation, keys=tarot_cards)
 
-async def generate_tarot_image(card: str) -> str:
-    """Генерирует изображение карты Таро с помощью DALL-E."""
-    prompt = f"Мистическое изображение карты Таро '{card}' в стиле древних эзотерических традиций, с богатой символикой, глубокими цветами и магической аурой."
+async def generate_tarot_image(card: str, variant: int = 0) -> bytes:
+    """Генерирует изображение карты Таро с помощью DALL-E в стиле варианта variant; возвращает PNG."""
+    style = TAROT_STYLES[variant % len(TAROT_STYLES)]
+    prompt = f"Мистическое изображение карты Таро '{card}' {style}, с богатой символикой, глубокими цветами и магической аурой."
     try:
-        response = await asyncio.to_thread(
-            client.images.generate,
-            model="dall-e-3",
-            prompt=prompt,
-            n=1,
-            size="1024x1024"
-        )
-        if not response.data or not response.data[0].url:
+        async with openai_slot():
+            response = await client.images.generate(
+                model="dall-e-3",
+                prompt=prompt,
+                n=1,
+                size="1024x1024",
+                response_format="b64_json"
+            )
+        if not response.data or not response.data[0].b64_json:
             raise Exception("DALL-E не вернул изображение")
-        image_url = response.data[0].url
-        logger.debug(f"Сгенерирован URL изображения: {image_url}")
-        return image_url
+        image = base64.b64decode(response.data[0].b64_json)
+        logger.debug(f"Сгенерировано изображение карты {card} (вариант {variant}): {len(image)} байт")
+        return image
     except Exception as e:
         logger.error(f"Ошибка генерации изображения: {e}")
-        return ""
\ No newline at end of file
+        return b""
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import random
+import time
+import zlib
+from datetime import date
+from typing import Awaitable, Callable, Iterable, Optional
+import config
+from services.database import get_content_variants, save_content_variant, add_content_variant_serves
+
+logger = logging.getLogger(__name__)
+
+# Способы выбора варианта: случайный, постоянный для пользователя, постоянный для пользователя на день
+RANDOM = "random"
+PER_USER = "user"
+PER_USER_DAILY = "daily"
+
+# Все созданные пулы (для статистики и обслуживания)
+_pools = []
+
+
+class Variant:
+    __slots__ = ("text", "created_at", "served", "unsaved")
+
+    def __init__(self, text: str, created_at: float, served: int = 0):
+        self.text = text
+        self.created_at = created_at
+        self.served = served
+        self.unsaved = 0  # показы, ещё не записанные в БД
+
+
+class VariantPool:
+    """
+    Пул заранее сгенерированных текстов для небольшого набора ключей.
+
+    Для каждого ключа (число судьбы, карта, категория предсказания) в таблице
+    content_variants хранится до size текстов, и запрос отвечается готовым вариантом
+    без обращения к OpenAI. Генерация идёт только при первом запросе ключа и в фоне:
+    пока вариантов меньше size, а также вместо варианта, который устарел (max_age)
+    или показан max_serves раз. Для каждого ключа в фоне генерируется не больше одного
+    текста одновременно, поэтому расход на OpenAI зависит от числа ключей, а не от трафика.
+
+    Показы считаются в памяти и записываются в БД пачкой в maintain(), который также
+    перечитывает варианты, сгенерированные другими процессами.
+    """
+
+    def __init__(self, name: str, generate: Callable[..., Awaitable[str]], keys: Iterable = (),
+                 size: int = None, mode: str = RANDOM, max_age: float = None, max_serves: int = None):
+        """
+        Args:
+            name: Имя пула (ключ в таблице content_variants)
+            generate: Корутина generate(key, on_progress=None), возвращающая новый текст
+            keys: Все ключи пула (для заполнения в maintain)
+            mode: RANDOM, PER_USER или PER_USER_DAILY
+        """
+        self.name = name
+        self.generate = generate
+        self.keys = [str(key) for key in keys]
+        self.size = size or config.VARIANT_POOL_SIZE
+        self.mode = mode
+        self.max_age = max_age or config.VARIANT_MAX_AGE
+        self.max_serves = max_serves or config.VARIANT_MAX_SERVES
+        self._variants = None  # ключ -> список Variant (индекс — номер варианта)
+        self._load_lock = asyncio.Lock()
+        self._generating = {}  # ключ -> задача генерации
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failed = 0
+        _pools.append(self)
+
+    async def _ensure_loaded(self) -> None:
+        if self._variants is not None:
+            return
+        async with self._load_lock:
+            if self._variants is None:
+                await self.reload()
+
+    async def reload(self) -> None:
+        """Перечитывает варианты из БД (например, сгенерированные другим процессом)."""
+        variants = {}
+        for key, index, text, created_at, served in sorted(await get_content_variants(self.name)):
+            variants.setdefault(key, []).append(Variant(text, created_at, served))
+        self._variants = variants
+
+    async def has_variants(self, key) -> bool:
+        """Есть ли для ключа готовый текст (иначе get будет генерировать его сразу)."""
+        await self._ensure_loaded()
+        return bool(self._variants.get(str(key)))
+
+    def _pick(self, key: str, variants: list, user_id: Optional[int]) -> int:
+        if self.mode == RANDOM or user_id is None:
+            return random.randrange(len(variants))
+        seed = f"{user_id}:{key}"
+        if self.mode == PER_USER_DAILY:
+            seed += f":{date.today().toordinal()}"
+        return zlib.crc32(seed.encode()) % len(variants)
+
+    def _needs_refill(self, variants: list) -> Optional[int]:
+        """Номер варианта, который нужно (пере)генерировать, или None."""
+        if len(variants) < self.size:
+            return len(variants)
+        now = time.time()
+        index, worst = min(enumerate(variants), key=lambda item: item[1].created_at)
+        if now - worst.created_at > self.max_age:
+            return index
+        index, worst = max(enumerate(variants), key=lambda item: item[1].served)
+        if worst.served >= self.max_serves:
+            return index
+        return None
+
+    async def get(self, key, user_id: int = None, on_progress=None) -> str:
+        """
+        Возвращает вариант текста для ключа.
+
+        Если вариантов ещё нет, текст генерируется сразу (с on_progress); иначе ответ
+        мгновенный, а недостающие или устаревшие варианты догенерируются в фоне.
+        """
+        key = str(key)
+        if self.keys and key not in self.keys:
+            # Ключ вне набора не кэшируется, чтобы пул оставался конечным
+            return await self.generate(key, on_progress=on_progress)
+        await self._ensure_loaded()
+        variants = self._variants.get(key)
+        if not variants:
+            self.misses += 1
+            return await self._generate(key, 0, on_progress)
+
+        self.hits += 1
+        variant = variants[self._pick(key, variants, user_id)]
+        variant.served += 1
+        variant.unsaved += 1
+        index = self._needs_refill(variants)
+        if index is not None:
+            self._refill(key, index)
+        return variant.text
+
+    def _refill(self, key: str, index: int) -> None:
+        """Запускает фоновую генерацию варианта, если для ключа ещё ничего не генерируется."""
+        if key not in self._generating:
+            asyncio.get_running_loop().create_task(self._refill_background(key, index))
+
+    async def _refill_background(self, key: str, index: int) -> None:
+        try:
+            await self._generate(key, index)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Ошибка фоновой генерации пула {self.name} для ключа {key}: {e}")
+
+    async def _generate(self, key: str, index: int, on_progress=None) -> str:
+        task = self._generating.get(key)
+        if task is not None:
+            # Ключ уже генерируется: ждём тот же текст вместо второго запроса к OpenAI
+            return await asyncio.shield(task)
+        task = asyncio.get_running_loop().create_task(self._generate_and_save(key, index, on_progress))
+        self._generating[key] = task
+        task.add_done_callback(lambda _: self._generating.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _generate_and_save(self, key: str, index: int, on_progress=None) -> str:
+        text = await self.generate(key, on_progress=on_progress)
+        if not text or text.startswith("⚠️"):
+            # Текст ошибки OpenAI возвращаем пользователю, но не сохраняем
+            self.failed += 1
+            return text
+        created_at = await save_content_variant(self.name, key, index, text)
+        variants = self._variants.setdefault(key, [])
+        if index < len(variants):
+            variants[index] = Variant(text, created_at)
+        else:
+            variants.append(Variant(text, created_at))
+        self.generated += 1
+        logger.info(f"Пул {self.name}: сгенерирован вариант {index} для ключа {key}")
+        return text
+
+    async def maintain(self) -> int:
+        """
+        Записывает накопленные показы, перечитывает пул и догенерирует недостающие и
+        устаревшие варианты всех ключей (по одному на ключ за вызов).
+
+        Returns:
+            int: Число сгенерированных вариантов
+        """
+        await self._ensure_loaded()
+        serves = []
+        for key, variants in self._variants.items():
+            for index, variant in enumerate(variants):
+                if variant.unsaved:
+                    serves.append((variant.unsaved, key, index))
+                    variant.unsaved = 0
+        if serves:
+            await add_content_variant_serves(self.name, serves)
+        await self.reload()
+
+        generated = 0
+        for key in self.keys or list(self._variants):
+            index = self._needs_refill(self._variants.get(key, []))
+            if index is None or key in self._generating:
+                continue
+            try:
+                text = await self._generate(key, index)
+                generated += bool(text) and not text.startswith("⚠️")
+            except Exception as e:
+                logger.error(f"Ошибка пополнения пула {self.name} для ключа {key}: {e}")
+        return generated
+
+    def stats(self) -> dict:
+        variants = self._variants or {}
+        return {
+            "keys": len(variants),
+            "variants": sum(len(v) for v in variants.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "failed": self.failed,
+            "generating": len(self._generating),
+        }
+
+
+async def maintain_variant_pools() -> None:
+    """Обслуживание всех пулов (вызывается планировщиком раз в сутки)."""
+    for pool in _pools:
+        try:
+            generated = await pool.maintain()
+            logger.info(f"Пул {pool.name} обслужен: новых вариантов {generated}")
+        except Exception as e:
+            logger.error(f"Ошибка обслуживания пула {pool.name}: {e}")
+
+
+def get_variant_pool_stats() -> dict:
+    return {pool.name: pool.stats() for pool in _pools}
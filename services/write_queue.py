@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Пачка фиксируется через MAX_DELAY секунд после первой записи или при MAX_BATCH записях
+MAX_DELAY = 0.005
+MAX_BATCH = 100
+
+
+class WriteBehindQueue:
+    """
+    Очередь записей с групповой фиксацией (group commit).
+
+    Записи, пришедшие почти одновременно, выполняются в одной транзакции, поэтому волна
+    /subscribe стоит одного fsync, а не по одному на пользователя. submit возвращает
+    управление только после фиксации транзакции с этой записью. Записи одного чата
+    выполняются в порядке поступления; barrier(chat_id) позволяет чтению дождаться
+    ещё не зафиксированных записей чата (read-your-writes).
+    """
+
+    def __init__(self, manager, max_delay: float = MAX_DELAY, max_batch: int = MAX_BATCH):
+        self.manager = manager
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._queue = None
+        self._task = None
+        self._pending = {}  # chat_id -> список futures незафиксированных записей
+        self.batches = 0
+        self.rows = 0
+        self.failed = 0
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._flusher())
+
+    async def submit(self, chat_id: int, sql: str, params: tuple) -> None:
+        """Ставит запись в очередь и ждёт фиксации транзакции, в которую она попала."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(chat_id, []).append(future)
+        await self._queue.put((chat_id, sql, params, future))
+        try:
+            await future
+        finally:
+            futures = self._pending.get(chat_id)
+            if futures is not None:
+                if future in futures:
+                    futures.remove(future)
+                if not futures:
+                    del self._pending[chat_id]
+
+    async def barrier(self, chat_id: int) -> None:
+        """Ждёт фиксации всех поставленных в очередь записей чата."""
+        futures = list(self._pending.get(chat_id, ()))
+        if futures:
+            await asyncio.gather(*futures, return_exceptions=True)
+
+    async def stop(self) -> None:
+        """Фиксирует оставшиеся записи и останавливает очередь."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _flusher(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, batch: list) -> None:
+        try:
+            async with self.manager.write() as conn:
+                for _, sql, params, _ in batch:
+                    await conn.execute(sql, params)
+                await conn.commit()
+        except Exception as e:
+            if len(batch) == 1:
+                self.failed += 1
+                if not batch[0][3].done():
+                    batch[0][3].set_exception(e)
+                return
+            # Одна ошибочная запись не должна ронять всю пачку — фиксируем записи по одной
+            logger.warning(f"Ошибка групповой записи ({len(batch)} записей), повтор по одной: {e}")
+            for item in batch:
+                await self._commit([item])
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        for _, _, _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        """Возвращает статистику групповой фиксации."""
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "failed": self.failed,
+            "avg_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+        }
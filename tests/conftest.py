@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# config.py требует эти переменные при импорте; тесты работают с временной базой
+os.environ.setdefault("TELEGRAM_TOKEN", "123:test")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("WEBHOOK_URL", "http://localhost")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bot-tests-"), "bot.db"))
@@ -0,0 +1,38 @@
+import asyncio
+from types import SimpleNamespace
+from utils.button_guard import button_guard
+
+
+def _tap(data: str) -> SimpleNamespace:
+    async def answer(*args, **kwargs):
+        return True
+
+    return SimpleNamespace(
+        callback_query=SimpleNamespace(data=data, answer=answer),
+        message=None,
+        effective_chat=SimpleNamespace(id=1),
+        effective_user=SimpleNamespace(id=1),
+    )
+
+
+def test_guard_key_separates_taps_with_different_input():
+    calls = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def period_callback(update, context):
+            calls.append(context.user_data["selected_sign"])
+            await release.wait()
+
+        guarded = button_guard(period_callback, key=lambda update, context: context.user_data["selected_sign"])
+        first = asyncio.create_task(guarded(_tap("period_today"), SimpleNamespace(user_data={"selected_sign": "Лев"})))
+        repeat = asyncio.create_task(guarded(_tap("period_today"), SimpleNamespace(user_data={"selected_sign": "Лев"})))
+        other = asyncio.create_task(guarded(_tap("period_today"), SimpleNamespace(user_data={"selected_sign": "Овен"})))
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(first, repeat, other)
+
+    asyncio.run(run())
+    # Повтор со Львом присоединился к первому запросу, Овен выполнен отдельно
+    assert calls == ["Лев", "Овен"]
@@ -0,0 +1,49 @@
+import asyncio
+import time
+from services.cache import AsyncTTLCache
+
+
+def test_cancelled_caller_does_not_cancel_coalesced_waiters():
+    cache = AsyncTTLCache("test", maxsize=8)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "значение"
+
+    async def run():
+        expires_at = time.time() + 60
+        first = asyncio.create_task(cache.get_or_load("key", loader, expires_at))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get_or_load("key", loader, expires_at))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "значение"
+        assert first.cancelled()
+        assert await cache.get_or_load("key", loader, expires_at) == "значение"
+
+    asyncio.run(run())
+    assert len(calls) == 1
+    assert not cache.is_loading("key")
+
+
+def test_loader_error_reaches_every_waiter_and_is_not_cached():
+    cache = AsyncTTLCache("test", maxsize=8)
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("сбой")
+
+    async def run():
+        expires_at = time.time() + 60
+        results = await asyncio.gather(
+            cache.get_or_load("key", loader, expires_at),
+            cache.get_or_load("key", loader, expires_at),
+            return_exceptions=True,
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert cache.get("key") is None
+
+    asyncio.run(run())
+    assert not cache.is_loading("key")
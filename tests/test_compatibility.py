@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+import services.compatibility_service as compatibility_service
+from handlers.compatibility import compatibility_sign_callback
+from services.database import init_db, close_db
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+        return {"chat": {"id": 1}, "message_id": 10}
+
+
+async def _answer(*args, **kwargs):
+    return True
+
+
+def test_missing_sign_pair_shows_processing_message(monkeypatch):
+    prompts = []
+
+    async def fake_ask_openai(prompt):
+        prompts.append(prompt)
+        return "Союз огня и воздуха"
+
+    async def fake_stream_openai(prompt, on_progress):
+        return await fake_ask_openai(prompt)
+
+    monkeypatch.setattr(compatibility_service, "ask_openai", fake_ask_openai)
+    monkeypatch.setattr(compatibility_service, "stream_openai", fake_stream_openai)
+    message = FakeMessage()
+
+    def tap():
+        query = SimpleNamespace(data="compat_Овен_Весы", answer=_answer, message=message)
+        return SimpleNamespace(callback_query=query, effective_chat=SimpleNamespace(id=1))
+
+    async def run():
+        await init_db()
+        try:
+            await compatibility_sign_callback(tap(), SimpleNamespace(bot=None, user_data={}))
+            # Повторный запрос пары берётся из матрицы без сообщения об обработке
+            await compatibility_sign_callback(tap(), SimpleNamespace(bot=None, user_data={}))
+        finally:
+            await close_db()
+
+    asyncio.run(run())
+    assert len(prompts) == 1
+    assert message.edits[0].startswith("💞 Рассчитываем совместимость")
+    assert "Союз огня и воздуха" in message.edits[1]
+    assert len(message.edits) == 3 and "Союз огня и воздуха" in message.edits[2]
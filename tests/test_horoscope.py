@@ -0,0 +1,30 @@
+import asyncio
+from datetime import date, timedelta
+import services.horoscope_service as horoscope_service
+from services.database import init_db, close_db, get_shared_horoscope
+
+
+def test_horoscope_for_local_date_behind_server_date_is_cached(monkeypatch):
+    prompts = []
+
+    async def fake_ask_openai(prompt):
+        prompts.append(prompt)
+        return f"Гороскоп {len(prompts)}"
+
+    monkeypatch.setattr(horoscope_service, "ask_openai", fake_ask_openai)
+    # Подписчик в America/New_York вечером: его местная дата — вчерашняя для сервера
+    yesterday = date.today() - timedelta(days=1)
+
+    async def run():
+        await init_db()
+        try:
+            first = await horoscope_service.get_horoscope("Лев", "today", day=yesterday)
+            second = await horoscope_service.get_horoscope("Лев", "today", day=yesterday)
+            shared = await get_shared_horoscope("Лев", "today", yesterday.toordinal())
+            return first, second, shared
+        finally:
+            await close_db()
+
+    first, second, shared = asyncio.run(run())
+    assert first == second == shared
+    assert len(prompts) == 1
@@ -0,0 +1,14 @@
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from utils.ingress import WebhookIngress, SECRET_HEADER
+
+
+@pytest.mark.parametrize("header", ["wrong", "неверный", ""])
+def test_wrong_secret_token_is_forbidden(header):
+    ingress = WebhookIngress(secret_token="s3cret")
+    request = make_mocked_request("POST", "/webhook", headers={SECRET_HEADER: header})
+    with pytest.raises(web.HTTPForbidden):
+        asyncio.run(ingress.accept(request))
+    assert ingress.forbidden == 1
@@ -0,0 +1,74 @@
+import asyncio
+import aiosqlite
+import config
+from services.migrations import MIGRATIONS, run_migrations
+from utils.delivery_slots import delivery_slot, DEFAULT_LOCAL_MINUTE
+
+
+async def _migrate_concurrently(path: str, connections: int) -> list:
+    conns = []
+    for _ in range(connections):
+        conn = await aiosqlite.connect(path)
+        await conn.execute("PRAGMA busy_timeout=10000")
+        conns.append(conn)
+    try:
+        return await asyncio.gather(*(run_migrations(conn) for conn in conns))
+    finally:
+        for conn in conns:
+            await conn.close()
+
+
+async def _user_version(path: str) -> int:
+    async with aiosqlite.connect(path) as conn:
+        cursor = await conn.execute("PRAGMA user_version")
+        return (await cursor.fetchone())[0]
+
+
+def test_concurrent_migrations_apply_each_migration_once(tmp_path):
+    path = str(tmp_path / "bot.db")
+    latest = MIGRATIONS[-1][0]
+    versions = asyncio.run(_migrate_concurrently(path, 4))
+    assert versions == [latest] * 4
+    assert asyncio.run(_user_version(path)) == latest
+
+
+def test_migrations_are_idempotent(tmp_path):
+    path = str(tmp_path / "bot.db")
+    asyncio.run(_migrate_concurrently(path, 1))
+    assert asyncio.run(_migrate_concurrently(path, 2)) == [MIGRATIONS[-1][0]] * 2
+
+
+async def _migrate_baseline_database(path: str) -> list:
+    async with aiosqlite.connect(path) as conn:
+        # Схема до миграций: подписка без времени рассылки
+        await conn.execute("CREATE TABLE subscriptions (chat_id INTEGER PRIMARY KEY, zodiac TEXT NOT NULL)")
+        await conn.execute(
+            "CREATE TABLE profiles (chat_id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+            "birth_date TEXT NOT NULL, birth_time TEXT NOT NULL)"
+        )
+        await conn.execute("INSERT INTO subscriptions VALUES (7, 'Лев')")
+        await conn.execute("INSERT INTO profiles VALUES (7, 'Анна', '01.02.1990', '10:30')")
+        await conn.execute("INSERT INTO profiles VALUES (8, 'Иван', '1990-02-31', 'утром')")
+        await conn.commit()
+        await run_migrations(conn)
+        cursor = await conn.execute("SELECT chat_id, zodiac, local_minute, timezone, delivery_slot FROM subscriptions")
+        subscriptions = await cursor.fetchall()
+        cursor = await conn.execute(
+            "SELECT chat_id, birth_day IS NOT NULL, birth_minute, legacy_birth_date, legacy_birth_time "
+            "FROM profiles ORDER BY chat_id"
+        )
+        return subscriptions, await cursor.fetchall()
+
+
+def test_baseline_subscriptions_get_configured_delivery_time(tmp_path):
+    rows, _ = asyncio.run(_migrate_baseline_database(str(tmp_path / "bot.db")))
+    timezone = config.DEFAULT_TIMEZONE
+    assert rows == [(7, "лев", DEFAULT_LOCAL_MINUTE, timezone, delivery_slot(7, DEFAULT_LOCAL_MINUTE, timezone))]
+
+
+def test_unparsable_profile_values_are_kept_as_text(tmp_path):
+    _, profiles = asyncio.run(_migrate_baseline_database(str(tmp_path / "bot.db")))
+    assert profiles == [
+        (7, 1, 10 * 60 + 30, None, None),
+        (8, 0, None, "1990-02-31", "утром"),
+    ]
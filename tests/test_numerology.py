@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+import services.numerology_service as numerology_service
+from services.database import init_db, close_db
+from utils.calendar import handle_calendar
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+async def _noop(*args, **kwargs):
+    return True
+
+
+def _calendar_update(callback_data: str) -> SimpleNamespace:
+    query = SimpleNamespace(data=callback_data, message=object(), answer=_noop, edit_message_text=_noop)
+    return SimpleNamespace(
+        callback_query=query,
+        effective_chat=SimpleNamespace(id=42),
+        effective_user=SimpleNamespace(id=42),
+        message=None,
+    )
+
+
+def test_calendar_date_reaches_numerology(monkeypatch):
+    prompts = []
+
+    async def fake_ask_openai(prompt):
+        prompts.append(prompt)
+        return "Толкование числа"
+
+    monkeypatch.setattr(numerology_service, "ask_openai", fake_ask_openai)
+    bot = FakeBot()
+    context = SimpleNamespace(bot=bot, user_data={"awaiting_numerology": True})
+
+    async def run():
+        await init_db()
+        try:
+            # 14.05.1990: 1+4+0+5+1+9+9+0 = 29 -> 11 -> 2
+            await handle_calendar(_calendar_update("cbcal_0_s_d_1990_5_14"), context)
+        finally:
+            await close_db()
+
+    asyncio.run(run())
+    assert len(prompts) == 1
+    assert bot.sent and bot.sent[-1][0] == 42
+    assert "число жизненного пути: 2" in bot.sent[-1][1]
+    assert "Толкование числа" in bot.sent[-1][1]
+    assert "awaiting_numerology" not in context.user_data
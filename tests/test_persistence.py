@@ -0,0 +1,29 @@
+import asyncio
+import time
+from services.database import db, init_db, close_db
+from services.persistence import SQLitePersistence
+
+
+def test_stale_state_is_rewritten_after_delete():
+    persistence = SQLitePersistence()
+
+    async def run():
+        await init_db()
+        try:
+            await persistence.refresh_user_data(1, {})
+            await persistence.update_user_data(1, {"selected_sign": "Лев"})
+            await persistence.update_user_data(1, {"selected_sign": "Лев"})
+            assert (persistence.writes, persistence.skipped) == (1, 1)
+
+            await persistence.delete_stale(int(time.time()) + 1)
+            assert persistence.stats()["loaded_users"] == 0
+            # Строка удалена, поэтому то же состояние записывается заново
+            await persistence.update_user_data(1, {"selected_sign": "Лев"})
+            assert persistence.writes == 2
+            async with db.read() as conn:
+                cursor = await conn.execute("SELECT COUNT(*) FROM user_state WHERE user_id = 1")
+                return (await cursor.fetchone())[0]
+        finally:
+            await close_db()
+
+    assert asyncio.run(run()) == 1
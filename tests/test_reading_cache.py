@@ -0,0 +1,59 @@
+import asyncio
+import services.compatibility_service as compatibility_service
+import services.natal_chart_service as natal_chart_service
+from services.database import init_db, close_db
+from services.reading_cache import reading_cache, compatibility_key, natal_key
+
+ANNA = ("Анна", "01.02.1990", "10:30", "Москва")
+IVAN = ("Иван", "03.04.1988", "08:00", "Санкт-Петербург")
+
+
+def _fake_openai(prompts: list):
+    async def ask_openai(prompt):
+        prompts.append(prompt)
+        return f"Разбор {len(prompts)}"
+    return ask_openai
+
+
+def test_reading_cache(monkeypatch):
+    prompts = []
+    monkeypatch.setattr(natal_chart_service, "ask_openai", _fake_openai(prompts))
+    monkeypatch.setattr(compatibility_service, "ask_openai", _fake_openai(prompts))
+
+    async def run():
+        await init_db()
+        try:
+            first = await natal_chart_service.get_natal_chart(*ANNA)
+            # Регистр, «ё» и лишние пробелы не меняют ключ
+            assert await natal_chart_service.get_natal_chart(" анна ", "01.02.1990", "10:30", "москва") == first
+            assert len(prompts) == 1
+
+            fresh = await natal_chart_service.get_natal_chart(*ANNA, refresh=True)
+            assert fresh != first and len(prompts) == 2
+            assert await natal_chart_service.get_natal_chart(*ANNA) == fresh
+
+            pair = await compatibility_service.get_compatibility(*ANNA, *IVAN)
+            assert await compatibility_service.get_compatibility(*IVAN, *ANNA) == pair
+            assert len(prompts) == 3
+            assert compatibility_key(ANNA, IVAN) == compatibility_key(IVAN, ANNA)
+
+            max_size = reading_cache.max_size
+            reading_cache.max_size = 1
+            try:
+                await reading_cache.maintain()
+            finally:
+                reading_cache.max_size = max_size
+            assert reading_cache.evicted >= 1
+        finally:
+            await close_db()
+
+    asyncio.run(run())
+
+
+def test_regenerate_request_ids_are_scoped_to_the_reading():
+    anna = reading_cache.remember(natal_key(*ANNA), ANNA)
+    ivan = reading_cache.remember(natal_key(*IVAN), IVAN)
+    assert anna != ivan and len(f"regen-compatibility_{anna}") <= 64
+    assert reading_cache.recall(anna) == ANNA
+    assert reading_cache.recall(ivan) == IVAN
+    assert reading_cache.recall("0" * 16) is None
@@ -0,0 +1,30 @@
+import asyncio
+import scheduler
+from services.database import init_db, close_db
+
+
+def test_daily_maintenance_refills_pools_in_background(monkeypatch):
+    events = []
+
+    async def run():
+        done = asyncio.Event()
+
+        async def slow_pools():
+            events.append("pools started")
+            await done.wait()
+            events.append("pools finished")
+
+        monkeypatch.setattr(scheduler, "maintain_variant_pools", slow_pools)
+        await init_db()
+        try:
+            await scheduler.daily_maintenance()
+            events.append("maintenance returned")
+            # Повторный запуск, пока пулы ещё обслуживаются, не начинает второе обслуживание
+            await scheduler.daily_maintenance()
+            done.set()
+            await scheduler._pool_maintenance
+        finally:
+            await close_db()
+
+    asyncio.run(run())
+    assert events == ["maintenance returned", "pools started", "pools finished"]
@@ -0,0 +1,37 @@
+import time
+from types import SimpleNamespace
+from utils.sessions import NatalSession, SessionSweeper
+
+
+class FakeApp:
+    def __init__(self):
+        self.user_data = {}
+        self.marked = []
+
+    def mark_data_for_update_persistence(self, user_ids):
+        self.marked.append(user_ids)
+
+    def drop_user_data(self, user_id):
+        self.user_data.pop(user_id, None)
+
+
+def test_expired_session_leaves_tombstone_then_is_removed():
+    app = FakeApp()
+    sweeper = SessionSweeper(tick=1, ttl=10, tombstone_ttl=3)
+    sweeper._app = app
+    session = NatalSession(step="birth_place", name="Анна", birth_date="01.02.1990", birth_time="10:30")
+    session.expires_at = time.time() + 0.5
+    app.user_data[1] = {"natal": session, "selected_sign": "Лев"}
+    sweeper.schedule(1, session)
+
+    assert sweeper.advance(now=session.expires_at + 0.1) == 1
+    tombstone = app.user_data[1]["natal"]
+    # Поля формы удалены, шаг и срок сохранены — обработчик ответит «время истекло»
+    assert isinstance(tombstone, NatalSession) and tombstone.is_expired(now=session.expires_at + 0.1)
+    assert tombstone.step == "birth_place" and tombstone.name is None and tombstone.birth_date is None
+
+    for _ in range(sweeper.size):
+        sweeper.advance(now=session.expires_at + 5)
+    assert "natal" not in app.user_data[1]
+    assert app.user_data[1] == {"selected_sign": "Лев"}
+    assert sweeper.evicted == 1
@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+from utils.update_queue import UpdateQueue
+
+
+class FakeApp:
+    """process_update, который записывает порядок обработки; обновления чата slow_chat ждут release."""
+
+    def __init__(self, slow_chat: int = None):
+        self.slow_chat = slow_chat
+        self.release = asyncio.Event()
+        self.done = []
+
+    async def process_update(self, update):
+        if update.effective_chat.id == self.slow_chat:
+            await self.release.wait()
+        self.done.append((update.effective_chat.id, update.update_id))
+
+
+def _update(update_id: int, chat_id: int) -> SimpleNamespace:
+    return SimpleNamespace(update_id=update_id, effective_chat=SimpleNamespace(id=chat_id))
+
+
+def test_slow_chat_does_not_block_other_chats():
+    async def run():
+        app = FakeApp(slow_chat=1)
+        queue = UpdateQueue(app, workers=2)
+        await queue.start()
+        await queue.submit(_update(1, 1))
+        # Чаты, которые при шардировании попали бы в тот же шард, что и медленный
+        for update_id, chat_id in enumerate((3, 5, 7, 9), start=2):
+            await queue.submit(_update(update_id, chat_id))
+        await asyncio.sleep(0.05)
+        assert [chat for chat, _ in app.done] == [3, 5, 7, 9]
+        app.release.set()
+        await queue.stop()
+        return app.done
+
+    assert asyncio.run(run())[-1] == (1, 1)
+
+
+def test_updates_of_one_chat_are_processed_in_order():
+    async def run():
+        app = FakeApp(slow_chat=1)
+        queue = UpdateQueue(app, workers=8)
+        await queue.start()
+        for update_id in range(5):
+            await queue.submit(_update(update_id, 1))
+        await asyncio.sleep(0.01)
+        app.release.set()
+        await queue.stop()
+        return app.done
+
+    assert asyncio.run(run()) == [(1, update_id) for update_id in range(5)]
+
+
+def test_full_queue_rejects_update():
+    async def run():
+        app = FakeApp(slow_chat=1)
+        queue = UpdateQueue(app, workers=1, maxsize=2, put_timeout=0.01)
+        await queue.start()
+        results = [await queue.submit(_update(update_id, 1)) for update_id in range(3)]
+        app.release.set()
+        await queue.stop()
+        return results, queue.stats()
+
+    results, stats = asyncio.run(run())
+    assert results == [True, True, False]
+    assert stats["rejected"] == 1 and stats["processed"] == 2
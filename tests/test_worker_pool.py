@@ -0,0 +1,30 @@
+import asyncio
+import os
+import tempfile
+from utils.worker_pool import WorkerConnection, serve_worker
+
+
+def test_concurrent_forwards_share_one_connection():
+    path = os.path.join(tempfile.mkdtemp(prefix="bot-"), "w.sock")
+    received = []
+
+    async def handle(body: bytes) -> bool:
+        received.append(body)
+        return True
+
+    async def run():
+        server = await serve_worker(path, handle)
+        connection = WorkerConnection(0, path)
+        try:
+            results = await asyncio.gather(*(connection.forward(str(i).encode()) for i in range(20)))
+            # Все forward увидели отсутствие соединения, но подключение было одно
+            return results, connection.stats()
+        finally:
+            await connection.close()
+            server.close()
+            await server.wait_closed()
+
+    results, stats = asyncio.run(run())
+    assert results == [True] * 20
+    assert sorted(received) == sorted(str(i).encode() for i in range(20))
+    assert stats["forwarded"] == 20 and stats["failed"] == 0
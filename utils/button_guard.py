@@ -1,42 +1,87 @@
 import asyncio
+import functools
 import logging
+from typing import Callable, Hashable
 from telegram import Update
 from telegram.ext import CallbackContext
+from utils.inline_reply import inline_reply_scope
 
 logger = logging.getLogger(__name__)
 
-def button_guard(func):
-    """Декоратор для защиты от многократных нажатий (работает и с inline, и с текстовыми кнопками)."""
+WAIT_MESSAGE = "⏳ Подождите, запрос обрабатывается..."
+
+# Выполняющиеся запросы: (chat_id, действие) -> asyncio.Task
+_inflight: dict = {}
+
+
+def get_action_key(func_name: str, update: Update, extra=None) -> tuple:
+    """Ключ запроса: чат и действие (обработчик + данные кнопки или текст + прочие входные данные)."""
+    chat_id = update.effective_chat.id if update.effective_chat else update.effective_user.id
+    if update.callback_query:
+        action = update.callback_query.data
+    elif update.message:
+        action = update.message.text
+    else:
+        action = None
+    return chat_id, func_name, action, extra
+
+
+def get_inflight_count() -> int:
+    """Возвращает число выполняющихся защищённых запросов."""
+    return len(_inflight)
+
+
+def button_guard(func, key: Callable[[Update, CallbackContext], Hashable] = None):
+    """
+    Декоратор для защиты от многократных нажатий (работает и с inline, и с текстовыми кнопками).
+
+    Повторное нажатие той же кнопки в том же чате не запускает обработчик заново, а
+    присоединяется к уже выполняющемуся запросу и получает его результат. Разные
+    действия одного чата выполняются независимо.
+
+    Если результат обработчика зависит не только от кнопки (например, от знака,
+    выбранного ранее и сохранённого в user_data), key(update, context) возвращает эти
+    данные: нажатие с другими данными считается другим действием.
+
+    Уведомление об ожидании можно вернуть ответом на webhook, поэтому защищённый
+    обработчик всегда помечен inline_reply; первый вызов самого обработчика
+    перехватывается, только если он помечен отдельно.
+    """
+    @functools.wraps(func)
     async def wrapper(update: Update, context: CallbackContext, *args, **kwargs):
-        user_id = update.effective_user.id
-        is_callback = update.callback_query is not None
-
-        if context.user_data.get("processing", False):
-            message = "⏳ Подождите, запрос обрабатывается..."
-            logger.warning(f"⚠️ Блокировка повторного вызова {func.__name__} для пользователя {user_id}")
-
-            if is_callback:
-                await update.callback_query.answer(message, show_alert=True)
-            elif update.message:
-                await update.message.reply_text(message)
-            return
-
-        logger.info(f"✅ Запускаем {func.__name__} для пользователя {user_id}")
-
-        context.user_data["processing"] = True
-        
-        try:
-            await func(update, context, *args, **kwargs)
-        except Exception as e:
-            logger.error(f"❌ Ошибка в {func.__name__}: {e}")
-            if update.message:
-                await update.message.reply_text("⚠️ Ошибка, попробуйте снова.")
-            elif update.callback_query:
-                await update.callback_query.message.reply_text("⚠️ Ошибка, попробуйте снова.")
-
-        finally:
-            await asyncio.sleep(1)  # Уменьшено с 2 до 1 секунды
-            context.user_data["processing"] = False
-            logger.info(f"✅ Завершение {func.__name__} для пользователя {user_id}")
-
-    return wrapper
\ No newline at end of file
+        action_key = get_action_key(func.__name__, update, key(update, context) if key else None)
+        task = _inflight.get(action_key)
+
+        if task is not None:
+            logger.info(f"⏳ Повторный вызов {func.__name__} для чата {action_key[0]} присоединён к выполняющемуся запросу")
+            try:
+                with inline_reply_scope():
+                    if update.callback_query:
+                        await update.callback_query.answer(WAIT_MESSAGE)
+                    elif update.message:
+                        await update.message.reply_text(WAIT_MESSAGE)
+            except Exception as e:
+                logger.warning(f"Не удалось отправить уведомление об ожидании: {e}")
+            return await asyncio.shield(task)
+
+        logger.info(f"✅ Запускаем {func.__name__} для чата {action_key[0]}")
+        task = asyncio.get_running_loop().create_task(_run(func, update, context, *args, **kwargs))
+        _inflight[action_key] = task
+        task.add_done_callback(lambda t: _inflight.pop(action_key) if _inflight.get(action_key) is t else None)
+        return await asyncio.shield(task)
+
+    wrapper.inline_reply = True
+    return wrapper
+
+
+async def _run(func, update: Update, context: CallbackContext, *args, **kwargs):
+    try:
+        return await func(update, context, *args, **kwargs)
+    except Exception as e:
+        logger.error(f"❌ Ошибка в {func.__name__}: {e}")
+        if update.message:
+            await update.message.reply_text("⚠️ Ошибка, попробуйте снова.")
+        elif update.callback_query:
+            await update.callback_query.message.reply_text("⚠️ Ошибка, попробуйте снова.")
+    finally:
+        logger.info(f"✅ Завершение {func.__name__} для чата {update.effective_chat.id if update.effective_chat else None}")
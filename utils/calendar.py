@@ -62,18 +62,15 @@ async def handle_calendar(update: Update, context: CallbackContext) -> None:
                 if context.user_data.get("awaiting_numerology"):
                     from handlers.numerology import process_numerology
                     await process_numerology(update, context, formatted_date)
-                elif context.user_data.get("awaiting_natal_chart"):
-                    from handlers.natal_chart import natal_chart
-                    # Передаем весь Update объект для полной совместимости
-                    await natal_chart(update, context)
-                elif context.user_data.get("awaiting_compatibility"):
-                    from handlers.compatibility import compatibility_natal
-                    await compatibility_natal(update, context)
+                else:
+                    # Дату ждёт текущий шаг натальной карты или совместимости
+                    from handlers.natal_chart import natal_date_selected
+                    from handlers.compatibility import compatibility_date_selected
+                    if not await natal_date_selected(update, context, formatted_date):
+                        await compatibility_date_selected(update, context, formatted_date)
             finally:
                 # Очищаем флаги после обработки
                 context.user_data.pop("awaiting_numerology", None)
-                context.user_data.pop("awaiting_natal_chart", None)
-                context.user_data.pop("awaiting_compatibility", None)
         else:
             # Продолжаем показывать календарь
             keyboard = InlineKeyboardMarkup.from_dict(json.loads(keyboard_json)) if isinstance(keyboard_json, str) else keyboard_json
@@ -0,0 +1,24 @@
+from datetime import date, datetime
+
+# Компактное хранение дат и времени в БД: дата — номер дня (date.toordinal), время — минуты от полуночи
+
+
+def date_to_day_number(date_str: str) -> int:
+    """Переводит дату 'ДД.ММ.ГГГГ' в номер дня."""
+    return datetime.strptime(date_str, "%d.%m.%Y").date().toordinal()
+
+
+def day_number_to_date(day_number: int) -> str:
+    """Переводит номер дня в дату 'ДД.ММ.ГГГГ'."""
+    return date.fromordinal(day_number).strftime("%d.%m.%Y")
+
+
+def time_to_minutes(time_str: str) -> int:
+    """Переводит время 'ЧЧ:ММ' в минуты от полуночи."""
+    hours, minutes = map(int, time_str.split(":"))
+    return hours * 60 + minutes
+
+
+def minutes_to_time(minutes: int) -> str:
+    """Переводит минуты от полуночи во время 'ЧЧ:ММ'."""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
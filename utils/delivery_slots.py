@@ -0,0 +1,43 @@
+from datetime import datetime, date, time, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Время рассылки по умолчанию — 08:00 по местному времени подписчика
+DEFAULT_LOCAL_MINUTE = 8 * 60
+# Подписчики одного времени равномерно распределяются по этому окну (минуты)
+SPREAD_MINUTES = 30
+MINUTES_PER_DAY = 24 * 60
+
+
+def validate_timezone(tz_name: str) -> bool:
+    """Проверяет, что строка — имя часового пояса IANA (например, Europe/Moscow)."""
+    try:
+        ZoneInfo(tz_name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def delivery_slot(chat_id: int, local_minute: int, tz_name: str, on_date: date = None) -> int:
+    """
+    Вычисляет UTC-слот рассылки (минута суток 0–1439) для подписчика.
+
+    Подписчики с одинаковым временем разносятся по окну SPREAD_MINUTES по chat_id, чтобы
+    одна минута не собирала всех. Слот зависит от даты из-за перехода на летнее время,
+    поэтому его пересчитывают ежедневно.
+    """
+    on_date = on_date or datetime.now(timezone.utc).date()
+    minute = (local_minute + chat_id % SPREAD_MINUTES) % MINUTES_PER_DAY
+    local = datetime.combine(on_date, time(minute // 60, minute % 60), tzinfo=ZoneInfo(tz_name))
+    utc = local.astimezone(timezone.utc)
+    return utc.hour * 60 + utc.minute
+
+
+def current_slot(now: datetime = None) -> int:
+    """Текущий UTC-слот рассылки."""
+    now = now or datetime.now(timezone.utc)
+    return now.hour * 60 + now.minute
+
+
+def local_date(tz_name: str) -> date:
+    """Текущая дата в часовом поясе подписчика."""
+    return datetime.now(ZoneInfo(tz_name)).date()
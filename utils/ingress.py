@@ -0,0 +1,105 @@
+import hmac
+import json
+import logging
+from typing import Optional
+from aiohttp import web
+
+try:
+    # orjson разбирает обновления в несколько раз быстрее стандартного json
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Типы обновлений, для которых есть обработчики (см. UpdateRouter); их же просим у Telegram в set_webhook
+SUPPORTED_UPDATE_TYPES = ("message", "callback_query")
+
+
+def classify_update(data: dict) -> Optional[str]:
+    """Возвращает тип обновления по неразобранному JSON или None, если он не поддерживается."""
+    for update_type in SUPPORTED_UPDATE_TYPES:
+        if update_type in data:
+            return update_type
+    return None
+
+
+class WebhookIngress:
+    """
+    Дешёвые проверки входящего webhook до построения telegram.Update.
+
+    Секретный токен проверяется по заголовку до чтения тела, поэтому чужие запросы
+    не разбираются вовсе. Тело разбирается orjson (если установлен), затем по словарю
+    отбрасываются повторные доставки и неподдерживаемые типы обновлений — de_json
+    вызывается только для обновлений, которые действительно будут обработаны.
+    """
+
+    def __init__(self, secret_token: str = None, dedup=None):
+        self.secret_token = secret_token
+        # compare_digest со строками падает на не-ASCII символах, поэтому сравниваются байты
+        self._secret_bytes = secret_token.encode() if secret_token else None
+        self.dedup = dedup
+        self.accepted = 0
+        self.forbidden = 0
+        self.malformed = 0
+        self.duplicates = 0
+        self.unsupported = 0
+        if not secret_token:
+            logger.warning("WEBHOOK_SECRET не задан: заголовок секретного токена не проверяется")
+
+    async def accept(self, request: web.Request) -> Optional[tuple]:
+        """
+        Проверяет запрос и разбирает тело.
+
+        Returns:
+            tuple: (данные обновления, исходное тело) или None, если обновление нужно
+                подтвердить без обработки (дубликат, неподдерживаемый тип)
+
+        Raises:
+            web.HTTPForbidden: Неверный секретный токен
+            web.HTTPBadRequest: Тело не является объектом JSON
+        """
+        if self._secret_bytes and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, "").encode("utf-8", "surrogatepass"), self._secret_bytes
+        ):
+            self.forbidden += 1
+            raise web.HTTPForbidden()
+
+        body = await request.read()
+        try:
+            data = json_loads(body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            self.malformed += 1
+            raise web.HTTPBadRequest()
+
+        update_id = data.get("update_id")
+        if update_id is not None and self.dedup is not None and self.dedup.seen(update_id):
+            self.duplicates += 1
+            return None
+        if classify_update(data) is None:
+            self.unsupported += 1
+            return None
+        self.accepted += 1
+        return data, body
+
+    def reject(self, data: dict) -> None:
+        """Обновление не принято в обработку: Telegram повторит доставку, поэтому забываем update_id."""
+        update_id = data.get("update_id")
+        if update_id is not None and self.dedup is not None:
+            self.dedup.forget(update_id)
+
+    def stats(self) -> dict:
+        return {
+            "json": "orjson" if orjson else "json",
+            "accepted": self.accepted,
+            "forbidden": self.forbidden,
+            "malformed": self.malformed,
+            "duplicates": self.duplicates,
+            "unsupported": self.unsupported,
+        }
@@ -0,0 +1,179 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional
+from telegram.request import HTTPXRequest, RequestData
+import config
+
+logger = logging.getLogger(__name__)
+
+# Методы, которые Telegram выполнит из тела ответа на webhook (без файлов)
+INLINE_METHODS = frozenset({"sendMessage", "editMessageText", "answerCallbackQuery"})
+
+# Слот ответа текущего обновления (его привязывает UpdateRouter) и разрешение на перехват
+_current_slot = contextvars.ContextVar("inline_reply_slot", default=None)
+_capture_allowed = contextvars.ContextVar("inline_reply_allowed", default=False)
+
+
+class InlineReplySlot:
+    """Ожидание ответа на один webhook: первый вызов Bot API обработчика или None."""
+
+    __slots__ = ("future",)
+
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+
+    @property
+    def is_open(self) -> bool:
+        return not self.future.done()
+
+    def close(self, reply: Optional[dict] = None) -> None:
+        if not self.future.done():
+            self.future.set_result(reply)
+
+
+class InlineReplies:
+    """
+    Ответ на обновление прямо в теле ответа на webhook.
+
+    Telegram выполняет один метод Bot API, переданный в ответе на webhook, поэтому
+    первый вызов быстрого обработчика (меню, выбор знака, answerCallbackQuery,
+    уведомление «Подождите») не требует отдельного исходящего HTTPS-запроса.
+    Webhook открывает слот для обновления и ждёт не дольше timeout; обработчик,
+    помеченный inline_reply, вместо отправки кладёт в слот свой первый вызов.
+
+    Результат такого вызова неизвестен (сообщение ещё не отправлено), поэтому
+    обработчику возвращается заглушка: помечать можно только обработчики, которые
+    не используют результат первого вызова. Любой первый вызов закрывает слот —
+    следующие вызовы идут обычным путём.
+    """
+
+    def __init__(self, timeout: float = 0.5):
+        self.timeout = timeout
+        self._slots = {}
+        self.opened = 0
+        self.captured = 0
+        self.timeouts = 0
+        self.methods = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.timeout > 0
+
+    def open(self, update_id: int) -> InlineReplySlot:
+        slot = InlineReplySlot()
+        self._slots[update_id] = slot
+        self.opened += 1
+        return slot
+
+    def get(self, update_id: int) -> Optional[InlineReplySlot]:
+        return self._slots.get(update_id)
+
+    def discard(self, update_id: int) -> None:
+        slot = self._slots.pop(update_id, None)
+        if slot is not None:
+            slot.close()
+
+    async def wait(self, update_id: int) -> Optional[dict]:
+        """Ждёт первый вызов обработчика; по истечении timeout слот закрывается и вызов уйдёт сам."""
+        slot = self._slots.get(update_id)
+        if slot is None:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.shield(slot.future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return None
+        finally:
+            self.discard(update_id)
+
+    def capture(self, endpoint: str, request_data: RequestData) -> Optional[object]:
+        """
+        Перехватывает вызов Bot API, если он первый в слоте текущего обновления.
+
+        Returns:
+            Заглушка результата метода или None, если вызов нужно отправить обычным путём
+        """
+        slot = _current_slot.get()
+        if slot is None or not slot.is_open:
+            return None
+        if not _capture_allowed.get() or endpoint not in INLINE_METHODS or request_data.contains_files:
+            slot.close()
+            return None
+        parameters = request_data.parameters
+        slot.close({"method": endpoint, **parameters})
+        self.captured += 1
+        self.methods[endpoint] = self.methods.get(endpoint, 0) + 1
+        if endpoint == "answerCallbackQuery":
+            return True
+        return {
+            "message_id": parameters.get("message_id", 0),
+            "date": int(time.time()),
+            "chat": {"id": parameters.get("chat_id", 0), "type": "private"},
+            "text": parameters.get("text", ""),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "timeout": self.timeout,
+            "pending": len(self._slots),
+            "opened": self.opened,
+            "captured": self.captured,
+            "timeouts": self.timeouts,
+            "methods": dict(self.methods),
+        }
+
+
+inline_replies = InlineReplies(timeout=config.INLINE_REPLY_TIMEOUT)
+
+
+@contextmanager
+def bind_slot(slot: InlineReplySlot):
+    """Привязывает слот к текущему контексту (и к задачам, созданным внутри него)."""
+    token = _current_slot.set(slot)
+    try:
+        yield
+    finally:
+        _current_slot.reset(token)
+
+
+@contextmanager
+def inline_reply_scope():
+    """Разрешает вернуть первый вызов Bot API внутри блока ответом на webhook."""
+    token = _capture_allowed.set(True)
+    try:
+        yield
+    finally:
+        _capture_allowed.reset(token)
+
+
+def inline_reply(func):
+    """
+    Помечает обработчик, первый вызов Bot API которого можно вернуть ответом на webhook.
+
+    Результат первого вызова обработчик получает в виде заглушки, поэтому он не должен
+    его использовать (например, редактировать отправленное сообщение). Telegram выполнит
+    перехваченный вызов позже следующих, поэтому после него обработчик не должен
+    отправлять сообщения, порядок которых важен (answerCallbackQuery перед правкой — можно).
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with inline_reply_scope():
+            return await func(*args, **kwargs)
+
+    wrapper.inline_reply = True
+    return wrapper
+
+
+class InlineReplyRequest(HTTPXRequest):
+    """HTTPXRequest, отдающий первый вызов помеченного обработчика в ответ на webhook."""
+
+    async def post(self, url: str, request_data: Optional[RequestData] = None, *args, **kwargs):
+        if request_data is not None:
+            result = inline_replies.capture(url.rsplit("/", 1)[-1], request_data)
+            if result is not None:
+                return result
+        return await super().post(url, request_data, *args, **kwargs)
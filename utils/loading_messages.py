@@ -1,6 +1,16 @@
+import logging
+import time
 from telegram import Update
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import ContextTypes
 
+logger = logging.getLogger(__name__)
+
+# Минимальный интервал между редактированиями одного сообщения (лимит Telegram ~1 правка в секунду на чат)
+EDIT_INTERVAL = 1.5
+# Максимальная длина текста сообщения в Telegram
+MAX_MESSAGE_LENGTH = 4096
+
 async def send_processing_message(update: Update, message: str, parse_mode: str = None) -> dict:
     """
     Отправляет временное сообщение о процессе обработки.
@@ -19,7 +29,8 @@ async def send_processing_message(update: Update, message: str, parse_mode: str
         parse_mode=parse_mode
     )
 
-async def replace_processing_message(context: ContextTypes.DEFAULT_TYPE, processing_message: dict, new_text: str, parse_mode: str = None) -> None:
+async def replace_processing_message(context: ContextTypes.DEFAULT_TYPE, processing_message: dict, new_text: str, parse_mode: str = None,
+                                     reply_markup=None) -> None:
     """
     Заменяет временное сообщение новым текстом или отправляет новое, если редактирование невозможно.
     
@@ -28,6 +39,7 @@ async def replace_processing_message(context: ContextTypes.DEFAULT_TYPE, process
         processing_message: Ответ Telegram API с информацией о временном сообщении
         new_text: Новый текст для замены
         parse_mode: Формат текста (например, 'MarkdownV2')
+        reply_markup: Inline-клавиатура под новым текстом
     """
     chat_id = processing_message["chat"]["id"]
     message_id = processing_message["message_id"]
@@ -37,11 +49,62 @@ async def replace_processing_message(context: ContextTypes.DEFAULT_TYPE, process
             chat_id=chat_id,
             message_id=message_id,
             text=new_text,
-            parse_mode=parse_mode
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
         )
     except Exception:
         await context.bot.send_message(
             chat_id=chat_id,
             text=new_text,
-            parse_mode=parse_mode
-        )
\ No newline at end of file
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
+
+
+class ProgressEditor:
+    """
+    Показывает генерируемый текст во временном сообщении, редактируя его не чаще EDIT_INTERVAL.
+
+    Экземпляр передаётся как on_progress в stream_openai. Ошибки редактирования не прерывают
+    генерацию: при RetryAfter правки откладываются на указанное Telegram время.
+    """
+
+    def __init__(self, context: ContextTypes.DEFAULT_TYPE, processing_message: dict, header: str = "",
+                 min_interval: float = EDIT_INTERVAL):
+        self.context = context
+        self.chat_id = processing_message["chat"]["id"]
+        self.message_id = processing_message["message_id"]
+        self.header = header
+        self.min_interval = min_interval
+        self.edits = 0
+        self._next_edit_at = time.monotonic() + min_interval
+        self._last_text = None
+
+    async def __call__(self, text: str) -> None:
+        now = time.monotonic()
+        if now < self._next_edit_at or text == self._last_text:
+            return
+
+        preview = f"{self.header}{text} ✍️"
+        if len(preview) > MAX_MESSAGE_LENGTH:
+            preview = preview[:MAX_MESSAGE_LENGTH - 1] + "…"
+
+        try:
+            await self.context.bot.edit_message_text(
+                chat_id=self.chat_id,
+                message_id=self.message_id,
+                text=preview
+            )
+            self.edits += 1
+            self._last_text = text
+            self._next_edit_at = time.monotonic() + self.min_interval
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            logger.warning(f"Лимит редактирования сообщений, пауза {retry_after} с")
+            self._next_edit_at = time.monotonic() + float(retry_after)
+        except BadRequest as e:
+            logger.debug(f"Не удалось обновить сообщение с прогрессом: {e}")
+            self._next_edit_at = time.monotonic() + self.min_interval
+        except Exception as e:
+            logger.warning(f"Ошибка обновления сообщения с прогрессом: {e}")
+            self._next_edit_at = time.monotonic() + self.min_interval
@@ -0,0 +1,20 @@
+from utils.dates import date_to_day_number, time_to_minutes
+from utils.zodiac import get_zodiac_sign
+
+
+def profile_columns(birth_date: str, birth_time: str) -> tuple:
+    """Типизированные и производные колонки профиля: (номер дня, минуты, знак, число жизненного пути)."""
+    # Импорт внутри функции: numerology_service зависит от services.database
+    from services.numerology_service import calculate_life_path_number
+
+    try:
+        birth_day = date_to_day_number(birth_date)
+        zodiac = get_zodiac_sign(birth_date).lower()
+        life_path = calculate_life_path_number(birth_date)
+    except (ValueError, TypeError, AttributeError):
+        birth_day = zodiac = life_path = None
+    try:
+        birth_minute = time_to_minutes(birth_time)
+    except (ValueError, TypeError, AttributeError):
+        birth_minute = None
+    return birth_day, birth_minute, zodiac, life_path
@@ -0,0 +1,159 @@
+import logging
+from typing import Any, Awaitable, Callable, Optional
+from telegram import Update
+from telegram.ext import Application, BaseHandler, ContextTypes
+from utils.inline_reply import bind_slot, inline_replies
+
+logger = logging.getLogger(__name__)
+
+HandlerCallback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[Any]]
+
+
+class UpdateRouter(BaseHandler):
+    """
+    Единый обработчик, выбирающий функцию по таблицам вместо цепочки фильтров.
+
+    Команды и тексты кнопок ищутся в словарях, callback_data — сначала целиком, затем по
+    префиксу до первого «_» включительно (horoscope_, period_, cbcal_). Прочий текст
+    уходит обработчику текущего многошагового ввода (ключ сессии в user_data) или
+    обработчику по умолчанию. Стоимость выбора не зависит от числа зарегистрированных
+    маршрутов, а PTB проверяет один обработчик вместо десятков.
+
+    Маршрут с block=False запускается отдельной задачей через application.create_task,
+    как обработчик PTB с block=False.
+
+    Если webhook ждёт ответа на обновление (inline_replies), его слот привязывается к
+    обработчику и закрывается, когда обработчик завершился.
+    """
+
+    def __init__(self):
+        super().__init__(self._unused_callback)
+        self._commands = {}
+        self._buttons = {}
+        self._callbacks = {}
+        self._callback_prefixes = {}
+        self._states = {}
+        self._fallback = None
+        self.routed = 0
+
+    @staticmethod
+    async def _unused_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        pass
+
+    def command(self, name: str, callback: HandlerCallback, block: bool = True) -> None:
+        self._commands[name.lower()] = (callback, block)
+
+    def button(self, text: str, callback: HandlerCallback, block: bool = True) -> None:
+        self._buttons[text] = (callback, block)
+
+    def callback_query(self, data: str, callback: HandlerCallback, block: bool = True) -> None:
+        """Регистрирует callback_data целиком или префикс, оканчивающийся на «_»."""
+        if data.endswith("_"):
+            if "_" in data[:-1]:
+                raise ValueError(f"Префикс {data!r} должен содержать «_» только в конце")
+            self._callback_prefixes[data] = (callback, block)
+        else:
+            self._callbacks[data] = (callback, block)
+
+    def state(self, key: str, callback: HandlerCallback, block: bool = True) -> None:
+        """Текст, пришедший, пока в user_data есть ключ key (активная сессия ввода)."""
+        self._states[key] = (callback, block)
+
+    def fallback(self, callback: HandlerCallback, block: bool = True) -> None:
+        """Текст вне кнопок и сессий ввода."""
+        self._fallback = (callback, block)
+
+    def check_update(self, update: object) -> Optional[tuple]:
+        """
+        Returns:
+            tuple: (маршрут или None для текстового ввода, аргументы команды или None)
+        """
+        if not isinstance(update, Update):
+            return None
+
+        query = update.callback_query
+        if query is not None:
+            data = query.data
+            if data is None:
+                return None
+            route = self._callbacks.get(data)
+            if route is None:
+                separator = data.find("_")
+                if separator == -1:
+                    return None
+                route = self._callback_prefixes.get(data[:separator + 1])
+            return (route, None) if route else None
+
+        message = update.message
+        if message is None or message.text is None:
+            return None
+        text = message.text
+        if text.startswith("/"):
+            words = text[1:].split()
+            if not words:
+                return None
+            route = self._commands.get(words[0].split("@", 1)[0].lower())
+            return (route, words[1:]) if route else None
+
+        route = self._buttons.get(text)
+        if route is not None:
+            return route, None
+        # Текстовый ввод: сессия определяется в handle_update, после загрузки user_data
+        return None, None
+
+    async def handle_update(
+        self,
+        update: Update,
+        application: Application,
+        check_result: tuple,
+        context: ContextTypes.DEFAULT_TYPE,
+    ) -> Any:
+        route, args = check_result
+        if args is not None:
+            context.args = args
+        if route is None:
+            route = self._route_text(context)
+            if route is None:
+                return None
+        callback, block = route
+        self.routed += 1
+        slot = inline_replies.get(update.update_id)
+        if slot is None:
+            if block:
+                return await callback(update, context)
+            application.create_task(callback(update, context), update=update)
+            return None
+        with bind_slot(slot):
+            if block:
+                try:
+                    return await callback(update, context)
+                finally:
+                    slot.close()
+            task = application.create_task(callback(update, context), update=update)
+            task.add_done_callback(lambda _: slot.close())
+        return None
+
+    def is_inline_reply(self, update: Update) -> bool:
+        """Маршрут обновления помечен inline_reply: его первый вызов можно вернуть ответом на webhook."""
+        check_result = self.check_update(update)
+        if not check_result or check_result[0] is None:
+            return False
+        return getattr(check_result[0][0], "inline_reply", False)
+
+    def _route_text(self, context: ContextTypes.DEFAULT_TYPE) -> Optional[tuple]:
+        user_data = context.user_data
+        if user_data:
+            for key, route in self._states.items():
+                if key in user_data:
+                    return route
+        return self._fallback
+
+    def stats(self) -> dict:
+        """Возвращает число маршрутов и обработанных обновлений."""
+        return {
+            "commands": len(self._commands),
+            "buttons": len(self._buttons),
+            "callbacks": len(self._callbacks) + len(self._callback_prefixes),
+            "states": len(self._states),
+            "routed": self.routed,
+        }
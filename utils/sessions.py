@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import math
+import sys
+import time
+from typing import Optional
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# Сессия многошагового ввода истекает через 10 минут без действий пользователя
+SESSION_TTL = 10 * 60
+# Истёкшая сессия ещё столько хранится без полей формы, чтобы на поздний ответ пришло «время истекло»
+TOMBSTONE_TTL = 30 * 60
+SWEEP_TICK = 5.0
+
+
+class Session:
+    """
+    Состояние многошагового ввода: текущий шаг, поля формы и срок действия.
+
+    Подклассы объявляют поля формы в __slots__, поэтому запись занимает фиксированный
+    объём без словаря атрибутов. В context.user_data сессия хранится под ключом kind.
+    """
+
+    __slots__ = ("step", "expires_at")
+    kind = ""
+    first_step = ""
+
+    def __init__(self, step: str = None, expires_at: float = 0.0, **fields):
+        self.step = step or self.first_step
+        self.expires_at = expires_at
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def touch(self, ttl: float = SESSION_TTL) -> None:
+        """Продлевает сессию на ttl секунд от текущего момента."""
+        self.expires_at = time.time() + ttl
+
+    def is_expired(self, now: float = None) -> bool:
+        return (now or time.time()) >= self.expires_at
+
+    def to_dict(self) -> dict:
+        # Незаполненные поля не сохраняются — from_dict восстановит их как None
+        data = {"step": self.step, "expires_at": self.expires_at}
+        data.update((name, getattr(self, name)) for name in self.__slots__ if getattr(self, name) is not None)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Session":
+        return cls(**data)
+
+    def size(self) -> int:
+        """Примерный объём сессии в памяти (байты), включая значения полей."""
+        values = [self.step, *(getattr(self, name) for name in self.__slots__)]
+        return sys.getsizeof(self) + sum(sys.getsizeof(value) for value in values if value is not None)
+
+
+class NatalSession(Session):
+    __slots__ = ("name", "birth_date", "birth_time", "birth_place")
+    kind = "natal"
+    first_step = "name"
+
+
+class CompatibilitySession(Session):
+    __slots__ = (
+        "name1", "birth_date1", "birth_time1", "birth_place1",
+        "name2", "birth_date2", "birth_time2", "birth_place2",
+    )
+    kind = "compatibility"
+    first_step = "birth_date1"
+
+
+SESSION_TYPES = {cls.kind: cls for cls in (NatalSession, CompatibilitySession)}
+
+
+class SessionSweeper:
+    """
+    Колесо таймеров для истечения сессий.
+
+    Колесо — кольцо ячеек по tick секунд; сессия лежит в ячейке, соответствующей сроку
+    её истечения. Раз в tick колесо поворачивается на одну ячейку и проверяет только
+    её содержимое: продлённые сессии переносятся в новую ячейку, а у истёкших удаляются
+    поля формы. Пустая истёкшая сессия (надгробие) остаётся ещё tombstone_ttl секунд,
+    чтобы поздний ответ пользователя получил сообщение об истечении времени, а не
+    ушёл в другой обработчик, и только потом удаляется из user_data. Постановка и
+    перенос стоят O(1), поэтому брошенные посреди ввода сессии не ждут следующего
+    сообщения пользователя.
+    """
+
+    def __init__(self, tick: float = SWEEP_TICK, ttl: float = SESSION_TTL, tombstone_ttl: float = TOMBSTONE_TTL):
+        self.tick = tick
+        self.tombstone_ttl = tombstone_ttl
+        self.size = math.ceil(ttl / tick) + 1
+        self._wheel = [set() for _ in range(self.size)]
+        self._slots = {}  # (user_id, kind) -> индекс ячейки
+        self._cursor = 0
+        self._app = None
+        self._task = None
+        self.evicted = 0
+
+    def schedule(self, user_id: int, session: Session, deadline: float = None) -> None:
+        """Ставит (или переносит) сессию в ячейку срока deadline (по умолчанию — срока истечения)."""
+        key = (user_id, session.kind)
+        old = self._slots.get(key)
+        if old is not None:
+            self._wheel[old].discard(key)
+        ticks = max(1, math.ceil(((deadline or session.expires_at) - time.time()) / self.tick))
+        # Срок дальше одного оборота: сессия будет проверена и перенесена при следующем проходе
+        index = (self._cursor + min(ticks, self.size - 1)) % self.size
+        self._wheel[index].add(key)
+        self._slots[key] = index
+
+    def cancel(self, user_id: int, kind: str) -> None:
+        index = self._slots.pop((user_id, kind), None)
+        if index is not None:
+            self._wheel[index].discard((user_id, kind))
+
+    def advance(self, now: float = None) -> int:
+        """
+        Поворачивает колесо на одну ячейку: истёкшие в ней сессии становятся надгробиями,
+        надгробия старше tombstone_ttl удаляются.
+
+        Returns:
+            int: Число истёкших сессий
+        """
+        now = now or time.time()
+        self._cursor = (self._cursor + 1) % self.size
+        due, self._wheel[self._cursor] = self._wheel[self._cursor], set()
+        evicted = 0
+        for key in due:
+            del self._slots[key]
+            user_id, kind = key
+            user_data = self._app.user_data.get(user_id) if self._app else None
+            session = user_data.get(kind) if user_data else None
+            if not isinstance(session, Session):
+                continue
+            if not session.is_expired(now):
+                self.schedule(user_id, session)
+                continue
+            # Сессия с полями формы истекла только что; без полей — это уже надгробие
+            has_fields = any(getattr(session, name) is not None for name in session.__slots__)
+            evicted += has_fields
+            removal_at = session.expires_at + self.tombstone_ttl
+            if now < removal_at:
+                if has_fields:
+                    user_data[kind] = type(session)(step=session.step, expires_at=session.expires_at)
+                    self._app.mark_data_for_update_persistence(user_ids=user_id)
+                self.schedule(user_id, session, deadline=removal_at)
+                continue
+            del user_data[kind]
+            if user_data:
+                self._app.mark_data_for_update_persistence(user_ids=user_id)
+            else:
+                self._app.drop_user_data(user_id)
+        if evicted:
+            self.evicted += evicted
+            logger.info(f"Истекло сессий: {evicted}")
+        return evicted
+
+    async def start(self, app) -> None:
+        """Запускает поворот колеса для user_data приложения."""
+        self._app = app
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.advance()
+            except Exception as e:
+                logger.error(f"Ошибка очистки сессий: {e}")
+
+    def stats(self) -> dict:
+        """Возвращает число и примерный объём живых сессий по видам."""
+        by_kind = {kind: {"count": 0, "bytes": 0} for kind in SESSION_TYPES}
+        for user_id, kind in self._slots:
+            user_data = self._app.user_data.get(user_id) if self._app else None
+            session = user_data.get(kind) if user_data else None
+            if isinstance(session, Session):
+                by_kind[kind]["count"] += 1
+                by_kind[kind]["bytes"] += session.size()
+        return {
+            "live": sum(entry["count"] for entry in by_kind.values()),
+            "bytes": sum(entry["bytes"] for entry in by_kind.values()),
+            "by_kind": by_kind,
+            "evicted": self.evicted,
+        }
+
+
+session_sweeper = SessionSweeper()
+
+
+def get_session(context: ContextTypes.DEFAULT_TYPE, session_type: type) -> Optional[Session]:
+    """Возвращает сессию заданного вида из user_data (в том числе истёкшую) или None."""
+    session = context.user_data.get(session_type.kind)
+    return session if isinstance(session, session_type) else None
+
+
+def save_session(update: Update, context: ContextTypes.DEFAULT_TYPE, session: Session) -> Session:
+    """Сохраняет сессию в user_data и продлевает её срок."""
+    session.touch()
+    context.user_data[session.kind] = session
+    session_sweeper.schedule(update.effective_user.id, session)
+    return session
+
+
+def end_session(update: Update, context: ContextTypes.DEFAULT_TYPE, session_type: type) -> None:
+    """Завершает сессию заданного вида."""
+    context.user_data.pop(session_type.kind, None)
+    session_sweeper.cancel(update.effective_user.id, session_type.kind)
@@ -1,5 +1,6 @@
 import logging
 from telegram import Update, Message
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 from utils.validation import sanitize_input, truncate_text
 
@@ -21,8 +22,16 @@ async def replace_processing_message(context: ContextTypes.DEFAULT_TYPE, message
         logger.error(f"Ошибка замены сообщения: {e}")
         raise
 
-async def send_photo_with_caption(bot, chat_id: int, photo_url: str, caption: str, parse_mode: str = None) -> None:
-    """Отправляет фото с подписью, обрезая подпись до лимита Telegram."""
+async def send_photo_with_caption(bot, chat_id: int, photo, caption: str, parse_mode: str = None) -> Message:
+    """
+    Отправляет фото с подписью, обрезая подпись до лимита Telegram.
+
+    Args:
+        photo: URL, file_id или содержимое файла
+
+    Returns:
+        Message: Отправленное сообщение с фото (по нему можно взять file_id)
+    """
     try:
         # Лимит подписи в Telegram - 1024 символа
         max_caption_length = 1024
@@ -36,22 +45,27 @@ async def send_photo_with_caption(bot, chat_id: int, photo_url: str, caption: st
         
         # Убираем parse_mode для подписи, чтобы избежать ошибок с экранированием
         logger.debug(f"Отправка фото с подписью длиной {len(caption)} символов")
-        await bot.send_photo(
+        message = await bot.send_photo(
             chat_id=chat_id,
-            photo=photo_url,
+            photo=photo,
             caption=caption,
             parse_mode=None  # Убираем parse_mode для избежания ошибок
         )
         
         logger.info("Фото с подписью успешно отправлено")
-        
+        return message
+
+    except BadRequest:
+        # Недействительный file_id или файл: повтор без подписи тоже не пройдёт, решает вызывающий
+        raise
     except Exception as e:
         logger.error(f"Ошибка отправки фото: {e}")
         # Если не удалось отправить фото с подписью, отправляем отдельно
         try:
-            await bot.send_photo(chat_id=chat_id, photo=photo_url)
+            message = await bot.send_photo(chat_id=chat_id, photo=photo)
             await bot.send_message(chat_id=chat_id, text=caption, parse_mode=None)
             logger.info("Фото и текст отправлены отдельно")
+            return message
         except Exception as e2:
             logger.error(f"Ошибка отправки фото и текста отдельно: {e2}")
             raise
\ No newline at end of file
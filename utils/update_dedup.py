@@ -0,0 +1,110 @@
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDeduplicator:
+    """
+    Ограниченное окно недавно полученных update_id (кольцевой буфер + множество).
+
+    Повторные доставки Telegram отбрасываются до разбора обновления. Если задан path,
+    окно сохраняется в файл и загружается при старте, чтобы дубликаты отсекались и
+    после перезапуска.
+    """
+
+    def __init__(self, capacity: int = 10000, path: str = None, save_interval: float = 30.0):
+        self.capacity = capacity
+        self.path = path
+        self.save_interval = save_interval
+        self._ring = deque()
+        self._seen = set()
+        self._dirty = False
+        self._task = None
+        self.checked = 0
+        self.duplicates = 0
+
+    def seen(self, update_id: int) -> bool:
+        """
+        Проверяет update_id и запоминает его.
+
+        Returns:
+            bool: True, если обновление уже обрабатывалось (дубликат)
+        """
+        self.checked += 1
+        if update_id in self._seen:
+            self.duplicates += 1
+            logger.info(f"Повторная доставка обновления {update_id} отброшена")
+            return True
+        self._remember(update_id)
+        self._dirty = True
+        return False
+
+    def forget(self, update_id: int) -> None:
+        """Убирает update_id из окна (например, если обновление не удалось поставить в очередь)."""
+        if update_id in self._seen:
+            self._seen.discard(update_id)
+            self._ring.remove(update_id)
+            self._dirty = True
+
+    def _remember(self, update_id: int) -> None:
+        if len(self._ring) >= self.capacity:
+            self._seen.discard(self._ring.popleft())
+        self._ring.append(update_id)
+        self._seen.add(update_id)
+
+    def load(self) -> None:
+        """Загружает сохранённое окно update_id."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for update_id in json.load(f)[-self.capacity:]:
+                    self._remember(int(update_id))
+            logger.info(f"Загружено {len(self._ring)} недавних update_id")
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить окно update_id: {e}")
+
+    def save(self) -> None:
+        """Атомарно сохраняет окно update_id в файл."""
+        if not self.path or not self._dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self._ring), f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить окно update_id: {e}")
+
+    async def start(self) -> None:
+        """Загружает окно и запускает периодическое сохранение."""
+        self.load()
+        if self.path:
+            self._task = asyncio.get_running_loop().create_task(self._autosave())
+
+    async def stop(self) -> None:
+        """Останавливает периодическое сохранение и сохраняет окно."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.save()
+
+    async def _autosave(self) -> None:
+        while True:
+            await asyncio.sleep(self.save_interval)
+            self.save()
+
+    def stats(self) -> dict:
+        """Возвращает счётчики дедупликации."""
+        return {
+            "window": len(self._ring),
+            "capacity": self.capacity,
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+        }
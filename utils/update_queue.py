@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+
+def get_shard_key(update: Update) -> int:
+    """Ключ шардирования: чат, иначе пользователь, иначе номер обновления."""
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return update.update_id
+
+
+def get_raw_shard_key(data: dict) -> int:
+    """Тот же ключ шардирования, но по неразобранному JSON обновления (без de_json)."""
+    for key, value in data.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+        user = value.get("from") or value.get("user")
+        if user and "id" in user:
+            return user["id"]
+    return data.get("update_id", 0)
+
+
+class UpdateQueue:
+    """
+    Ограниченная очередь входящих обновлений с пулом обработчиков.
+
+    У каждого чата своя очередь, и её в каждый момент обрабатывает не больше одного
+    воркера, поэтому сообщения одного чата идут строго по порядку. Чаты с ожидающими
+    обновлениями стоят в общей очереди готовых, из которой их берёт любой свободный
+    воркер: долгий обработчик занимает только свой чат, остальные чаты обрабатываются
+    параллельно. После каждого обновления чат возвращается в конец очереди готовых,
+    чтобы активный чат не занимал воркер надолго.
+
+    Если в очереди уже maxsize обновлений, submit ждёт put_timeout и возвращает False,
+    чтобы webhook ответил ошибкой и Telegram повторил доставку позже.
+    """
+
+    def __init__(self, app: Application, workers: int = 64, maxsize: int = 1000, put_timeout: float = 1.0):
+        self.app = app
+        self.workers = workers
+        self.maxsize = maxsize
+        self.put_timeout = put_timeout
+        self._chats = {}  # ключ чата -> deque ожидающих обновлений; чат есть здесь, пока он в работе или готов
+        self._ready = asyncio.Queue()  # ключи чатов, ожидающих свободного воркера
+        self._capacity = asyncio.Semaphore(maxsize)
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = []
+        self.busy = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self._wait_total = 0.0
+
+    def depth(self) -> int:
+        """Число принятых, но ещё не обработанных обновлений."""
+        return self._pending
+
+    async def start(self) -> None:
+        """Запускает воркеры."""
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Очередь обновлений запущена: {self.workers} воркеров")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дожидается обработки оставшихся обновлений и останавливает воркеры."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не обработано обновлений при остановке: {self.depth()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, update: Update) -> bool:
+        """
+        Ставит обновление в очередь его чата.
+
+        Returns:
+            bool: False, если очередь переполнена и обновление не принято
+        """
+        if self._capacity.locked():
+            try:
+                await asyncio.wait_for(self._capacity.acquire(), self.put_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                logger.warning(f"Очередь обновлений переполнена, обновление {update.update_id} отклонено")
+                return False
+        else:
+            await self._capacity.acquire()
+        key = get_shard_key(update)
+        pending = self._chats.get(key)
+        if pending is None:
+            pending = self._chats[key] = deque()
+            self._ready.put_nowait(key)
+        pending.append((update, time.monotonic()))
+        self._pending += 1
+        self._idle.clear()
+        self.accepted += 1
+        self.max_depth = max(self.max_depth, self._pending)
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._ready.get()
+            pending = self._chats[key]
+            update, enqueued_at = pending.popleft()
+            self._wait_total += time.monotonic() - enqueued_at
+            self.busy += 1
+            try:
+                await self.app.process_update(update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка обработки обновления {update.update_id}: {e}")
+            finally:
+                self.busy -= 1
+                if pending:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._chats[key]
+                self._pending -= 1
+                self._capacity.release()
+                if not self._pending:
+                    self._idle.set()
+
+    def stats(self) -> dict:
+        """Возвращает метрики очереди."""
+        done = self.processed + self.failed
+        return {
+            "workers": self.workers,
+            "busy": self.busy,
+            "depth": self.depth(),
+            "chats": len(self._chats),
+            "max_depth": self.max_depth,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self._wait_total / done * 1000, 1) if done else 0.0,
+        }
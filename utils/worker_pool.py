@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import struct
+from collections import deque
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Кадр: длина тела (4 байта, big-endian) + тело обновления в JSON; ответ воркера — один байт
+FRAME_HEADER = struct.Struct("!I")
+ACCEPTED = b"\x01"
+REJECTED = b"\x00"
+
+
+def worker_socket_path(socket_dir: str, index: int) -> str:
+    return os.path.join(socket_dir, f"worker-{index}.sock")
+
+
+class WorkerConnection:
+    """
+    Соединение фронтального процесса с одним воркером через Unix-сокет.
+
+    Обновления отправляются без ожидания друг друга, а ответы воркера приходят в том
+    же порядке, поэтому каждому отправленному кадру соответствует future в очереди.
+    """
+
+    def __init__(self, index: int, path: str):
+        self.index = index
+        self.path = path
+        self._reader = None
+        self._writer = None
+        self._waiters = deque()
+        self._reader_task = None
+        self._connect_lock = asyncio.Lock()
+        self.forwarded = 0
+        self.rejected = 0
+        self.failed = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self, timeout: float = 30.0) -> None:
+        """Подключается к воркеру, дожидаясь появления его сокета (одновременные вызовы ждут одно подключение)."""
+        async with self._connect_lock:
+            if self.connected:
+                return
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while True:
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if loop.time() >= deadline:
+                        raise
+                    await asyncio.sleep(0.2)
+            # У каждого соединения своя очередь ожидающих: обрыв старого не задевает кадры нового
+            self._reader, self._writer, self._waiters = reader, writer, deque()
+            self._reader_task = loop.create_task(self._read_acks(reader, writer, self._waiters))
+        logger.info(f"Подключен воркер {self.index}: {self.path}")
+
+    async def forward(self, body: bytes) -> bool:
+        """
+        Передаёт обновление воркеру.
+
+        Returns:
+            bool: True, если воркер принял обновление в свою очередь
+        """
+        if not self.connected:
+            try:
+                await self.connect(timeout=1.0)
+            except OSError as e:
+                self.failed += 1
+                logger.error(f"Воркер {self.index} недоступен: {e}")
+                return False
+        future = asyncio.get_running_loop().create_future()
+        # Запись кадра и постановка future идут без переключения задач — порядок ответов совпадает
+        self._waiters.append(future)
+        self._writer.write(FRAME_HEADER.pack(len(body)) + body)
+        try:
+            await self._writer.drain()
+            accepted = await future
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            self.failed += 1
+            logger.error(f"Ошибка передачи обновления воркеру {self.index}: {e}")
+            return False
+        if accepted:
+            self.forwarded += 1
+        else:
+            self.rejected += 1
+        return accepted
+
+    async def _read_acks(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, waiters: deque) -> None:
+        try:
+            while True:
+                ack = await reader.readexactly(1)
+                waiters.popleft().set_result(ack == ACCEPTED)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.error(f"Соединение с воркером {self.index} потеряно: {e}")
+        finally:
+            writer.close()
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(False)
+
+    async def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "inflight": len(self._waiters),
+            "forwarded": self.forwarded,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
+
+
+class ShardedForwarder:
+    """
+    Распределяет обновления по процессам-воркерам по хэшу chat_id.
+
+    Все обновления одного чата попадают в один процесс, поэтому порядок сообщений чата,
+    его user_data и объединение повторных нажатий сохраняются как в одном процессе.
+    """
+
+    def __init__(self, paths: List[str]):
+        self._connections = [WorkerConnection(i, path) for i, path in enumerate(paths)]
+
+    async def start(self) -> None:
+        await asyncio.gather(*(connection.connect() for connection in self._connections))
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(connection.close() for connection in self._connections))
+
+    async def forward(self, shard_key: int, body: bytes) -> bool:
+        return await self._connections[hash(shard_key) % len(self._connections)].forward(body)
+
+    def stats(self) -> dict:
+        return {f"worker_{connection.index}": connection.stats() for connection in self._connections}
+
+
+async def serve_worker(path: str, handle: Callable[[bytes], Awaitable[bool]]) -> asyncio.AbstractServer:
+    """
+    Запускает приём обновлений от фронтального процесса на Unix-сокете.
+
+    Args:
+        path: Путь к сокету
+        handle: Корутина, принимающая тело обновления; возвращает False, если обновление не принято
+    """
+    async def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                body = await reader.readexactly(FRAME_HEADER.unpack(header)[0])
+                try:
+                    accepted = await handle(body)
+                except Exception as e:
+                    logger.error(f"Ошибка приёма обновления: {e}")
+                    accepted = False
+                writer.write(ACCEPTED if accepted else REJECTED)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(on_client, path=path)
+    logger.info(f"Воркер принимает обновления на {path}")
+    return server
+
+
+def spawn_workers(count: int, target: Callable, socket_dir: str) -> list:
+    """
+    Запускает count процессов-воркеров; target(index, socket_path) выполняется в каждом.
+
+    Используется spawn, чтобы воркеры не наследовали цикл событий и соединения фронта.
+    """
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for index in range(count):
+        process = context.Process(
+            target=target, args=(index, worker_socket_path(socket_dir, index)), name=f"bot-worker-{index}"
+        )
+        process.start()
+        processes.append(process)
+    logger.info(f"Запущено процессов-воркеров: {count}")
+    return processes
+
+
+def stop_workers(processes: list, timeout: float = 30.0) -> None:
+    """Посылает воркерам SIGTERM и ждёт их завершения."""
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout)
+        if process.is_alive():
+            logger.warning(f"Воркер {process.name} не завершился, принудительная остановка")
+            process.kill()
@@ -9,6 +9,9 @@ ZODIAC_SIGNS = [
     ("Козерог", (12, 31))  # Второй Козерог для правильного расчета
 ]
 
+# Уникальные названия знаков (в ZODIAC_SIGNS Козерог встречается дважды)
+ZODIAC_NAMES = list(dict.fromkeys(sign for sign, _ in ZODIAC_SIGNS))
+
 def get_zodiac_sign(birth_date: str) -> str:
     """Определяет знак зодиака по дате рождения (формат: ДД.ММ.ГГГГ)"""
     try: